@@ -0,0 +1,216 @@
+"""
+Standalone redirect server answering from a compiled snapshot.
+
+It imports nothing outside the standard library, so a worker starts in a few
+milliseconds and uses a few megabytes plus the page cache holding the
+snapshot. Configure it with environment variables:
+
+    EDGE_SNAPSHOT       path of the snapshot written by compile_redirect_snapshot
+    EDGE_FALLBACK_URL   origin of the main app, e.g. https://sho.rt, for misses
+    EDGE_RELOAD_SECONDS how often to check for a new snapshot file (default 1)
+
+Redirects use each link's own status (301, 302, 307 or 308). Short keys
+missing from the snapshot, expired entries and any other path are sent to
+the main app with a 307, which keeps the method and body. Clicks served
+here are not counted by the main app.
+
+    gunicorn edge.server:application
+    uvicorn edge.server:asgi_application
+    python -m edge.server --port 8080
+"""
+
+import os
+import threading
+import time
+
+from urllib.parse import quote
+
+from .snapshot import Snapshot
+
+
+STATUS_LINES = {
+    301: "301 Moved Permanently",
+    302: "302 Found",
+    307: "307 Temporary Redirect",
+    308: "308 Permanent Redirect",
+}
+
+
+class SnapshotHolder:
+    """
+    Keep the current snapshot mapped, switching to a new file once it is swapped in.
+
+    The path is stat-ed at most every ``reload_seconds``; when it names a new
+    file, that file is mapped and used for the next lookups. The previous
+    mapping is released once the requests still using it finish.
+
+    Attributes:
+        path (str): The snapshot path.
+        reload_seconds (float): Minimum interval between two checks for a new file.
+        snapshot (Snapshot): The mapped snapshot, or None while the file is missing.
+    """
+
+    def __init__(self, path, reload_seconds=1.0):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def current(self):
+        """
+        Returns the snapshot to answer the next request with.
+        """
+
+        if time.monotonic() - self._checked_at >= self.reload_seconds:
+            self.reload()
+        return self.snapshot
+
+    def reload(self):
+        """
+        Map the file at ``path`` if it is not the one already mapped.
+        """
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return
+            if self.snapshot is not None and self.snapshot.identity == (stat.st_dev, stat.st_ino):
+                return
+            try:
+                self.snapshot = Snapshot(self.path)
+            except (OSError, ValueError):
+                return
+
+
+class RedirectApp:
+    """
+    Redirect GET and HEAD requests for ``/<short_key>/`` from a snapshot.
+
+    Attributes:
+        holder (SnapshotHolder): Source of the current snapshot.
+        fallback_url (str): Origin of the main app, without a trailing slash.
+    """
+
+    def __init__(self, holder, fallback_url=""):
+        self.holder = holder
+        self.fallback_url = fallback_url.rstrip("/")
+
+    def resolve(self, method, path, query="", encoding="latin-1"):
+        """
+        Decide the response for a request.
+
+        Args:
+            method (str): The request method.
+            path (str): The request path.
+            query (str): The query string, kept when falling back to the main app.
+            encoding (str): Encoding recovering the raw path bytes from ``path``:
+                latin-1 for WSGI's PATH_INFO, utf-8 for ASGI's decoded path.
+
+        Returns:
+            tuple: (status line, Location header value) or (status line, None) for a 404.
+        """
+
+        if method in ("GET", "HEAD"):
+            key = path.strip("/")
+            snapshot = self.holder.current()
+            if key and "/" not in key and snapshot is not None:
+                try:
+                    entry = snapshot.lookup(key.encode(encoding))
+                except UnicodeEncodeError:
+                    # not a path a client could have sent; snapshot keys are never like this
+                    entry = None
+                if entry is not None:
+                    url, expires_at, status = entry
+                    if (not expires_at or time.time() < expires_at) and status in STATUS_LINES:
+                        return STATUS_LINES[status], str(url, "latin-1")
+        if self.fallback_url:
+            return "307 Temporary Redirect", self.fallback_location(path, query, encoding)
+        return "404 Not Found", None
+
+    def fallback_location(self, path, query, encoding="latin-1"):
+        try:
+            path = quote(path.encode(encoding), safe="/")
+        except UnicodeEncodeError:
+            path = "/"
+        return f"{self.fallback_url}{path}?{query}" if query else f"{self.fallback_url}{path}"
+
+    def __call__(self, environ, start_response):
+        status, location = self.resolve(environ["REQUEST_METHOD"], environ.get("PATH_INFO", "/"), environ.get("QUERY_STRING", ""))
+        headers = [("Content-Length", "0")]
+        if location is not None:
+            headers.append(("Location", location))
+        start_response(status, headers)
+        return [b""]
+
+
+class AsgiRedirectApp:
+    """
+    ASGI adapter of RedirectApp, for running under an asyncio server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        query = scope.get("query_string", b"").decode("latin-1")
+        status, location = self.app.resolve(scope["method"], scope["path"], query, encoding="utf-8")
+        headers = [(b"content-length", b"0")]
+        if location is not None:
+            headers.append((b"location", location.encode("latin-1")))
+        await send({"type": "http.response.start", "status": int(status[:3]), "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+
+def create_app(snapshot_path=None, fallback_url=None, reload_seconds=None):
+    """
+    Build the WSGI app from arguments or the EDGE_* environment variables.
+
+    Returns:
+        RedirectApp: The WSGI application.
+    """
+
+    holder = SnapshotHolder(
+        snapshot_path or os.environ.get("EDGE_SNAPSHOT", "redirects.snapshot"),
+        float(reload_seconds if reload_seconds is not None else os.environ.get("EDGE_RELOAD_SECONDS", 1)),
+    )
+    return RedirectApp(holder, fallback_url if fallback_url is not None else os.environ.get("EDGE_FALLBACK_URL", ""))
+
+
+application = create_app()
+asgi_application = AsgiRedirectApp(application)
+
+
+def main():
+    # only needed when run from the command line, so kept out of worker startup
+    import argparse
+    from wsgiref.simple_server import make_server
+
+    parser = argparse.ArgumentParser(description="Serve redirects from a compiled snapshot.")
+    parser.add_argument("--snapshot", help="Snapshot path; defaults to EDGE_SNAPSHOT.")
+    parser.add_argument("--fallback-url", help="Origin of the main app; defaults to EDGE_FALLBACK_URL.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    options = parser.parse_args()
+
+    app = create_app(options.snapshot, options.fallback_url)
+    with make_server(options.host, options.port, app) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Immutable on-disk hash table of short key -> (original URL, expiry, redirect status).
+
+Layout, all integers little endian::
+
+    header   64 bytes    magic, version, slot count, entry count, created at,
+                         table offset, data offset
+    data     records     expires_at u64 (unix seconds, 0 = never), redirect
+                         status u16, key length u8, URL length u32, key bytes,
+                         URL bytes
+    table    slots       slot count x (hash u64, record offset u64),
+                         record offset 0 marking an empty slot
+
+The table uses open addressing with linear probing and is at most half full,
+so a lookup reads one or two slots. This module only uses the standard
+library, so the edge server can load it without importing Django.
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+
+from array import array
+
+
+MAGIC = b"SURLSNP1"
+VERSION = 2
+
+HEADER = struct.Struct("<8sIIIQQQ")
+HEADER_SIZE = 64
+SLOT = struct.Struct("<QQ")
+RECORD = struct.Struct("<QHBI")
+
+
+def key_hash(key):
+    """
+    Returns the 64-bit hash of an encoded short key.
+
+    Args:
+        key (bytes): The UTF-8 encoded short key.
+
+    Returns:
+        int: The hash, never 0.
+    """
+
+    return (zlib.crc32(key) | zlib.crc32(key, 0x9E3779B9) << 32) or 1
+
+
+def table_size(count):
+    """
+    Returns the number of slots for ``count`` entries: a power of two at least twice as large.
+    """
+
+    size = 8
+    while size < count * 2:
+        size *= 2
+    return size
+
+
+class SnapshotWriter:
+    """
+    Write a snapshot to a temporary file and atomically move it into place.
+
+    Records are streamed to disk as they are added; only an 8-byte hash and
+    an 8-byte offset per entry are kept in memory until close(), which
+    writes the table and the header and then renames the file over ``path``.
+    Readers holding the previous file keep using it until they reopen.
+
+    Attributes:
+        path (str): The final snapshot path.
+        count (int): Number of entries written.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.count = 0
+        self._hashes = array("Q")
+        self._offsets = array("Q")
+        if self._hashes.itemsize != 8 or struct.pack("=H", 1) != struct.pack("<H", 1):
+            raise RuntimeError("Snapshots can only be written on little endian platforms.")
+        # tempfile pulls in random and shutil; readers never need it
+        import tempfile
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        descriptor, self._temporary = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+        self._file = os.fdopen(descriptor, "wb")
+        self._file.write(b"\0" * HEADER_SIZE)
+        self._position = HEADER_SIZE
+
+    def add(self, short_key, original_url, expires_at=None, status=302):
+        """
+        Add an entry. Short keys must be unique within a snapshot.
+
+        Args:
+            short_key (str): The short key.
+            original_url (str): The redirect target.
+            expires_at (float): Unix time at which the entry stops redirecting, or None.
+            status (int): The HTTP status of the redirect.
+        """
+
+        key = short_key.encode()
+        url = original_url.encode()
+        self._hashes.append(key_hash(key))
+        self._offsets.append(self._position)
+        record = RECORD.pack(int(expires_at or 0), status, len(key), len(url)) + key + url
+        self._file.write(record)
+        self._position += len(record)
+        self.count += 1
+
+    def close(self):
+        """
+        Write the table and header, then atomically replace the snapshot at ``path``.
+
+        Returns:
+            str: The snapshot path.
+        """
+
+        slots = table_size(self.count)
+        table = array("Q", bytes(slots * SLOT.size))
+        mask = slots - 1
+        for hash_value, offset in zip(self._hashes, self._offsets):
+            slot = hash_value & mask
+            while table[slot * 2 + 1]:
+                slot = (slot + 1) & mask
+            table[slot * 2] = hash_value
+            table[slot * 2 + 1] = offset
+
+        table_offset = self._position
+        self._file.write(table.tobytes())
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, slots, self.count, int(time.time()), table_offset, HEADER_SIZE))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._temporary, self.path)
+        return self.path
+
+    def abort(self):
+        """
+        Discard the partially written snapshot.
+        """
+
+        self._file.close()
+        os.unlink(self._temporary)
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot file through mmap.
+
+    Opening maps the file and checks its header, without reading the
+    table, so it takes well under a millisecond whatever the size. Lookups
+    unpack two fixed-size structs and compare the key in place; the URL is
+    returned as a memoryview into the mapping, not a copy.
+
+    Attributes:
+        path (str): The snapshot path.
+        count (int): Number of entries.
+        created_at (int): Unix time the snapshot was written.
+        identity (tuple): (device, inode) of the mapped file, to detect a swap.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, "rb") as snapshot_file:
+            stat = os.fstat(snapshot_file.fileno())
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_dev, stat.st_ino)
+        self._view = memoryview(self._map)
+
+        magic, version, slots, count, created_at, table_offset, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a redirect snapshot.")
+        if table_offset + slots * SLOT.size > len(self._map):
+            raise ValueError(f"{self.path} is truncated.")
+        self.count = count
+        self.created_at = created_at
+        self._mask = slots - 1
+        self._table_offset = table_offset
+
+    def lookup(self, key):
+        """
+        Find the entry of a short key.
+
+        Args:
+            key (bytes): The UTF-8 encoded short key.
+
+        Returns:
+            tuple: (URL as a memoryview of bytes, expires_at or 0, redirect status), or None if absent.
+        """
+
+        hash_value = key_hash(key)
+        slot = hash_value & self._mask
+        view = self._view
+        while True:
+            slot_hash, offset = SLOT.unpack_from(view, self._table_offset + slot * SLOT.size)
+            if not offset:
+                return None
+            if slot_hash == hash_value:
+                expires_at, status, key_length, url_length = RECORD.unpack_from(view, offset)
+                start = offset + RECORD.size
+                if key_length == len(key) and view[start:start + key_length] == key:
+                    start += key_length
+                    return view[start:start + url_length], expires_at, status
+            slot = (slot + 1) & self._mask
@@ -1,4 +1,4 @@
 from django.contrib import admin
-from .models import ShortenedURL
+from .models import ShortenedURL, QRCodeJob, ClickEvent, UserLinkStats
 
-admin.site.register([ShortenedURL])
\ No newline at end of file
+admin.site.register([ShortenedURL, QRCodeJob, ClickEvent, UserLinkStats])
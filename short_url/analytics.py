@@ -0,0 +1,227 @@
+import json
+import logging
+import logging.handlers
+import os
+import threading
+
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+from utils.background import PeriodicFlusher
+from utils.ratelimit import client_ip
+
+from .models import ClickEvent
+
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_LENGTH = 512
+
+
+class DatabaseSink:
+    """
+    Writes click events to the append-only ClickEvent table with bulk_create.
+    """
+
+    def write(self, events):
+        """
+        Insert a batch of events.
+
+        Args:
+            events (list): (short_key, occurred_at, referrer, user_agent, ip_address) tuples.
+        """
+
+        ClickEvent.objects.bulk_create(
+            [
+                ClickEvent(short_key=short_key, occurred_at=occurred_at, referrer=referrer, user_agent=user_agent, ip_address=ip_address)
+                for short_key, occurred_at, referrer, user_agent, ip_address in events
+            ]
+        )
+
+
+class StrictRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that raises write errors instead of printing them to stderr.
+
+    logging.Handler.emit() hands its errors to handleError(), which would
+    hide from FileSink's caller that a batch was lost.
+    """
+
+    def handleError(self, record):
+        # called from the except block of emit(), so this re-raises the write error
+        raise
+
+
+class FileSink:
+    """
+    Writes click events as JSON lines to a size-rotated local log file.
+
+    Attributes:
+        path (str): The log file path.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=10):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._handler = StrictRotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, events):
+        """
+        Append a batch of events to the log file.
+
+        Args:
+            events (list): (short_key, occurred_at, referrer, user_agent, ip_address) tuples.
+        """
+
+        for short_key, occurred_at, referrer, user_agent, ip_address in events:
+            line = json.dumps({
+                "short_key": short_key,
+                "occurred_at": occurred_at.isoformat(),
+                "referrer": referrer,
+                "user_agent": user_agent,
+                "ip_address": ip_address,
+            })
+            self._handler.emit(logging.makeLogRecord({"msg": line}))
+        self._handler.flush()
+
+
+class ClickEventBuffer:
+    """
+    Bounded in-memory buffer of click events, written to a sink in the background.
+
+    Recording an event only appends a tuple to a deque; a background thread
+    drains it every ``flush_interval`` seconds, or as soon as ``batch_size``
+    events are waiting, in batches of ``batch_size``. When the buffer holds
+    ``capacity`` events new ones are dropped and counted, so the redirect
+    never waits on the analytics write.
+
+    Attributes:
+        sink: The object whose write(events) stores a batch.
+        capacity (int): Maximum number of buffered events.
+        batch_size (int): Number of events written per sink call.
+        recorded (int): Number of events accepted into the buffer.
+        dropped (int): Number of events dropped because the buffer was full.
+        written (int): Number of events written to the sink.
+        failed (int): Number of events lost because the sink raised.
+        ip_header (str): request.META key holding the client address behind a proxy, or None for REMOTE_ADDR.
+        trusted_proxies (int): Number of proxies in front of the app that append to ip_header.
+    """
+
+    def __init__(self, sink, capacity=10000, flush_interval=5, batch_size=500, enabled=True, ip_header=None, trusted_proxies=1):
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.ip_header = ip_header
+        self.trusted_proxies = trusted_proxies
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._flusher = PeriodicFlusher(self.flush, flush_interval, "click-event-flusher")
+
+    def record(self, short_key, request):
+        """
+        Buffer a click event for a redirect request.
+
+        Args:
+            short_key (str): The short key that was followed.
+            request: The HTTP request object.
+        """
+
+        if not self.enabled:
+            return
+
+        meta = request.META
+        event = (
+            short_key,
+            timezone.now(),
+            meta.get("HTTP_REFERER", "")[:MAX_HEADER_LENGTH],
+            meta.get("HTTP_USER_AGENT", "")[:MAX_HEADER_LENGTH],
+            client_ip(request, self.ip_header, self.trusted_proxies) or None,
+        )
+
+        with self._lock:
+            if len(self._events) >= self.capacity:
+                self.dropped += 1
+                return
+            self._events.append(event)
+            self.recorded += 1
+            full = len(self._events) >= self.batch_size
+
+        self._flusher.start()
+        if full:
+            self._flusher.wake()
+
+    def flush(self):
+        """
+        Write every buffered event to the sink, a batch at a time.
+        """
+
+        while True:
+            with self._lock:
+                count = min(self.batch_size, len(self._events))
+                batch = [self._events.popleft() for _ in range(count)]
+            if not batch:
+                return
+            try:
+                self.sink.write(batch)
+            except Exception:
+                logger.exception("Could not write %s click events", len(batch))
+                with self._lock:
+                    self.failed += len(batch)
+                return
+            with self._lock:
+                self.written += len(batch)
+
+    def stats(self):
+        """
+        Returns the buffer counters.
+
+        Returns:
+            dict: buffered, capacity, recorded, dropped, written and failed event counts.
+        """
+
+        with self._lock:
+            return {
+                "buffered": len(self._events),
+                "capacity": self.capacity,
+                "recorded": self.recorded,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+            }
+
+
+def build_sink():
+    """
+    Build the sink selected by SHORT_URL_CLICK_EVENT_SINK.
+
+    Returns:
+        DatabaseSink or FileSink: The configured sink.
+    """
+
+    if getattr(settings, "SHORT_URL_CLICK_EVENT_SINK", "db") == "file":
+        return FileSink(
+            getattr(settings, "SHORT_URL_CLICK_EVENT_LOG", os.path.join(settings.BASE_DIR, "logs", "clicks.log")),
+            max_bytes=getattr(settings, "SHORT_URL_CLICK_EVENT_LOG_MAX_BYTES", 50 * 1024 * 1024),
+            backup_count=getattr(settings, "SHORT_URL_CLICK_EVENT_LOG_BACKUPS", 10),
+        )
+    return DatabaseSink()
+
+
+click_events = ClickEventBuffer(
+    build_sink(),
+    capacity=getattr(settings, "SHORT_URL_CLICK_EVENT_BUFFER_SIZE", 10000),
+    flush_interval=getattr(settings, "SHORT_URL_CLICK_EVENT_FLUSH_INTERVAL", 5),
+    batch_size=getattr(settings, "SHORT_URL_CLICK_EVENT_BATCH_SIZE", 500),
+    enabled=getattr(settings, "SHORT_URL_CLICK_EVENTS_ENABLED", True),
+    # the client address is read like the rate limiter reads it
+    ip_header=getattr(settings, "RATE_LIMIT_IP_HEADER", None),
+    trusted_proxies=getattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 1),
+)
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class ShortUrlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'short_url'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from utils.db import apply_sqlite_pragmas
+        from utils.metrics import request_metrics
+
+        from . import signals  # noqa: F401
+        from .metrics import collect_metrics
+
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid="utils.db.apply_sqlite_pragmas")
+        request_metrics.register_collector(collect_metrics)
@@ -0,0 +1,500 @@
+import asyncio
+import contextvars
+import math
+import platform
+import random
+import threading
+import time
+
+from datetime import timedelta
+
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.utils import timezone
+
+from user.models import User
+
+from .bloom import key_filter
+from .bulk import BulkShortener
+from .cache import resolve_cache
+from .keygen import key_allocator
+from .models import DEFAULT_EXPIRY_DAYS, ShortenedURL
+from .stats import rebuild_link_stats
+from .urlnorm import url_hash
+
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+# metrics compared against a baseline; True when a higher value is better
+COMPARED_METRICS = {
+    "throughput": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "queries_per_request": False,
+}
+
+
+def seed(users=10, urls=10000, batch_size=1000):
+    """
+    Fill the database with benchmark users and shortened URLs.
+
+    Users share one password hash, so seeding does not pay for one hash per
+    user. Short keys come from the key allocator, like real links.
+
+    Args:
+        users (int): Number of users to create.
+        urls (int): Number of shortened URLs, spread evenly over the users.
+        batch_size (int): Rows inserted per bulk_create.
+
+    Returns:
+        dict: User id -> list of the short keys owned by that user.
+    """
+
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create([
+        User(full_name=f"Benchmark {number}", email=f"bench{number}@example.com", password=password, is_active=True)
+        for number in range(users)
+    ])
+    user_ids = list(User.objects.filter(email__startswith="bench").order_by("id").values_list("id", flat=True))
+
+    expiry_date = timezone.localdate() + timedelta(days=DEFAULT_EXPIRY_DAYS)
+    keys = {user_id: [] for user_id in user_ids}
+    for start in range(0, urls, batch_size):
+        count = min(batch_size, urls - start)
+        objs = []
+        for offset, short_key in enumerate(key_allocator.next_keys(count)):
+            user_id = user_ids[(start + offset) % len(user_ids)]
+            keys[user_id].append(short_key)
+            original_url = f"https://example.com/page/{start + offset}"
+            objs.append(ShortenedURL(
+                original_url=original_url,
+                short_key=short_key,
+                user_id=user_id,
+                expiration_date=expiry_date,
+                url_hash=url_hash(original_url),
+            ))
+        ShortenedURL.objects.bulk_create(objs)
+
+    # bulk_create sends no signals, so rebuild the process-local state from the table
+    key_filter.rebuild()
+    resolve_cache.clear()
+    rebuild_link_stats(user_ids)
+    return keys
+
+
+class Worker:
+    """
+    One benchmark thread or task, with its own test client and user.
+
+    With AsyncClient every method returns an awaitable instead of the response.
+
+    Attributes:
+        user (User): The user the client is logged in as.
+        short_keys (list): Short keys owned by the user.
+        all_keys (list): Short keys of every user, followed by the redirect scenario.
+        client_class (type): Client (WSGI handler) or AsyncClient (ASGI handler).
+        client (Client): Client driving the full middleware stack in-process.
+    """
+
+    def __init__(self, user, short_keys, all_keys, seed_value, client_class=Client):
+        self.user = user
+        self.short_keys = short_keys
+        self.all_keys = all_keys
+        self.random = random.Random(seed_value)
+        self.client_class = client_class
+        self.client = client_class(raise_request_exception=False)
+        self.client.force_login(user)
+        self.anonymous = client_class(raise_request_exception=False)
+        self.created = 0
+
+    def redirect(self):
+        return self.anonymous.get(f"/{self.random.choice(self.all_keys)}/")
+
+    def create(self):
+        self.created += 1
+        return self.client.post("/create", {"long_url": f"https://example.com/new/{self.user.pk}/{self.created}"})
+
+    def list_urls(self):
+        return self.client.get("/list")
+
+    def update(self):
+        short_key = self.random.choice(self.short_keys)
+        return self.client.post(f"/update/{short_key}/", {"long_url": f"https://example.com/updated/{short_key}"})
+
+    def login(self):
+        # a fresh client each time, so every request performs a full login
+        return self.client_class(raise_request_exception=False).post("/", {"email": self.user.email, "password": BENCHMARK_PASSWORD})
+
+
+class BulkWriter:
+    """
+    Background thread creating links with the bulk shortener for as long as it runs.
+
+    Running it alongside a scenario measures how reads hold up while the
+    database is being written to.
+
+    Attributes:
+        user (User): The owner of the created links.
+        chunk_size (int): Rows per bulk insert.
+        rows (int): Number of links created so far.
+        errors (int): Number of chunks that failed with a database error.
+    """
+
+    def __init__(self, user, chunk_size=500):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self._batch = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self.rows, self.errors = 0, 0
+        self._thread = threading.Thread(target=self._run, name="benchmark-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the thread after its current chunk.
+
+        Returns:
+            dict: rows, errors and rows_per_second written while it ran.
+        """
+
+        self._stop.set()
+        self._thread.join()
+        return {
+            "rows": self.rows,
+            "errors": self.errors,
+            "rows_per_second": round(self.rows / self.seconds, 2) if self.seconds else 0.0,
+        }
+
+    def _run(self):
+        # every row is inserted; with dedupe the writer would measure lookups of its earlier rows
+        shortener = BulkShortener(self.user, "https://benchmark.example.com", chunk_size=self.chunk_size, dedupe=False)
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            # counted across runs, so each scenario writes new URLs
+            self._batch += 1
+            rows = [f"https://example.com/bulk/{self._batch}/{number}" for number in range(self.chunk_size)]
+            try:
+                self.rows += sum(1 for result in shortener.run(rows) if result["status"] == "created")
+            except DatabaseError:
+                self.errors += 1
+        self.seconds = time.perf_counter() - started
+        connection.close()
+
+
+# scenario name -> Worker method issuing one request
+SCENARIOS = {
+    "redirect": Worker.redirect,
+    "create": Worker.create,
+    "list": Worker.list_urls,
+    "update": Worker.update,
+    "login": Worker.login,
+}
+
+
+def percentile(values, fraction):
+    """
+    Returns a nearest-rank percentile.
+
+    Args:
+        values (list): Sorted values.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The value at that rank, or 0 for no values.
+    """
+
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def run_scenario(workers, scenario, requests, warmup=10, writer=None):
+    """
+    Issue ``requests`` requests of one scenario spread over the workers' threads.
+
+    Args:
+        workers (list): The Worker instances, one per thread.
+        scenario (str): A key of SCENARIOS.
+        requests (int): Total number of timed requests.
+        warmup (int): Untimed requests issued by each worker first.
+        writer (BulkWriter): Writer kept running during the timed requests, or None.
+
+    Returns:
+        dict: requests, errors, seconds, throughput, latency percentiles and
+        queries per request, plus the writer's results when one ran.
+    """
+
+    action = SCENARIOS[scenario]
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    start_line = threading.Barrier(len(workers) + 1)
+
+    def work(worker, share):
+        counter = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            counter[0] += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(warmup):
+            action(worker)
+        mine_latency, mine_queries, mine_errors = [], [], 0
+        start_line.wait()
+        with connection.execute_wrapper(count_queries):
+            for _ in range(share):
+                counter[0] = 0
+                started = time.perf_counter()
+                response = action(worker)
+                mine_latency.append((time.perf_counter() - started) * 1000)
+                mine_queries.append(counter[0])
+                if response.status_code >= 400:
+                    mine_errors += 1
+        with lock:
+            latencies.extend(mine_latency)
+            queries.extend(mine_queries)
+            errors.append(mine_errors)
+        connection.close()
+
+    shares = [requests // len(workers) + (1 if number < requests % len(workers) else 0) for number in range(len(workers))]
+    threads = [threading.Thread(target=work, args=(worker, share)) for worker, share in zip(workers, shares)]
+    for thread in threads:
+        thread.start()
+    if writer is not None:
+        writer.start()
+    start_line.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    written = writer.stop() if writer is not None else None
+    return summarize(latencies, sum(queries), sum(errors), seconds, written)
+
+
+def run_scenario_async(workers, scenario, requests, warmup=10, writer=None):
+    """
+    Issue ``requests`` requests of one scenario as concurrent tasks on one event loop.
+
+    Each worker is a task sending its requests one after the other through
+    AsyncClient, i.e. Django's ASGI handler. Like ASGIHandler, every request
+    runs in its own ThreadSensitiveContext, so its sync parts get their own
+    thread and database connection, which is closed once the request is
+    done. Queries are counted on the connections opened by the timed
+    requests.
+
+    Args:
+        workers (list): The Worker instances, created with AsyncClient.
+        scenario (str): A key of SCENARIOS.
+        requests (int): Total number of timed requests.
+        warmup (int): Untimed requests issued by each worker first.
+        writer (BulkWriter): Writer kept running during the timed requests, or None.
+
+    Returns:
+        dict: The same results as run_scenario.
+    """
+
+    action = SCENARIOS[scenario]
+    latencies = []
+    errors = [0]
+    queries = [0]
+    lock = threading.Lock()
+    # set inside the timed requests; sync_to_async carries it into their threads
+    timed_request = contextvars.ContextVar("timed_request", default=False)
+
+    def count_queries(execute, sql, params, many, context):
+        with lock:
+            queries[0] += 1
+        return execute(sql, params, many, context)
+
+    def add_counter(sender, connection, **kwargs):
+        # connections of the writer and the click flushers are not the scenario's
+        if timed_request.get() and count_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.append(count_queries)
+
+    async def request(worker, timed):
+        timed_request.set(timed)
+        async with ThreadSensitiveContext():
+            started = time.perf_counter()
+            response = await action(worker)
+            latency = (time.perf_counter() - started) * 1000
+            await sync_to_async(connections.close_all)()
+        return response, latency
+
+    async def work(worker, share, timed):
+        for _ in range(share):
+            # a task per request, as an ASGI server does, so no connection outlives its request
+            response, latency = await asyncio.create_task(request(worker, timed))
+            if timed:
+                latencies.append(latency)
+                errors[0] += response.status_code >= 400
+
+    async def run():
+        await asyncio.gather(*(work(worker, warmup, False) for worker in workers))
+        connection_created.connect(add_counter)
+        if writer is not None:
+            writer.start()
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(work(worker, share, True) for worker, share in zip(workers, shares)))
+        finally:
+            connection_created.disconnect(add_counter)
+        return time.perf_counter() - started
+
+    shares = [requests // len(workers) + (1 if number < requests % len(workers) else 0) for number in range(len(workers))]
+    seconds = asyncio.run(run())
+    written = writer.stop() if writer is not None else None
+    return summarize(latencies, queries[0], errors[0], seconds, written)
+
+
+def summarize(latencies, queries, errors, seconds, written=None):
+    """
+    Turn the measurements of one scenario into its results.
+
+    Args:
+        latencies (list): Latency of each timed request in milliseconds.
+        queries (int): Number of queries made by the timed requests.
+        errors (int): Number of timed requests answered with a 4xx or 5xx.
+        seconds (float): Wall time of the timed requests.
+        written (dict): Results of the writer, or None.
+
+    Returns:
+        dict: requests, errors, seconds, throughput, latency percentiles and
+        queries per request, plus the writer's results when one ran.
+    """
+
+    latencies = sorted(latencies)
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "throughput": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "queries_per_request": round(queries / len(latencies), 2) if latencies else 0.0,
+    }
+    if written is not None:
+        result["writer"] = written
+    return result
+
+
+def run_benchmark(scenarios, concurrency=4, requests=500, users=10, urls=10000, warmup=10, writer_chunk_size=0, interface="wsgi"):
+    """
+    Seed the current database and run the scenarios one after the other.
+
+    Args:
+        scenarios (list): Scenario names, keys of SCENARIOS.
+        concurrency (int): Number of client threads, or of tasks with the ASGI interface.
+        requests (int): Timed requests per scenario.
+        users (int): Number of seeded users.
+        urls (int): Number of seeded shortened URLs.
+        warmup (int): Untimed requests per thread before each scenario.
+        writer_chunk_size (int): When set, a BulkWriter inserting chunks of this
+            size runs during every scenario.
+        interface (str): "wsgi" to send requests from threads through Django's
+            WSGI handler, "asgi" to send them from tasks on one event loop
+            through its ASGI handler.
+
+    Returns:
+        dict: ``meta`` describing the run and ``scenarios`` with the results of each scenario.
+    """
+
+    keys = seed(users=users, urls=urls)
+    all_keys = [short_key for user_keys in keys.values() for short_key in user_keys]
+    users_by_id = User.objects.in_bulk(list(keys))
+    user_ids = list(keys)
+    workers = [
+        Worker(
+            users_by_id[user_ids[number % len(user_ids)]], keys[user_ids[number % len(user_ids)]], all_keys, number,
+            client_class=AsyncClient if interface == "asgi" else Client,
+        )
+        for number in range(concurrency)
+    ]
+    run = run_scenario_async if interface == "asgi" else run_scenario
+
+    writer = BulkWriter(users_by_id[user_ids[0]], writer_chunk_size) if writer_chunk_size else None
+    results = {}
+    for scenario in scenarios:
+        results[scenario] = run(workers, scenario, requests, warmup=warmup, writer=writer)
+
+    return {
+        "meta": {
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "interface": interface,
+            "async_redirect": settings.SHORT_URL_ASYNC_REDIRECT,
+            "concurrency": concurrency,
+            "requests": requests,
+            "users": users,
+            "urls": urls,
+            "writer_chunk_size": writer_chunk_size,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "journal_mode": journal_mode(),
+        },
+        "scenarios": results,
+    }
+
+
+def journal_mode():
+    """
+    Returns the SQLite journal mode of the default database, or None on other databases.
+    """
+
+    if connection.vendor != "sqlite":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        return cursor.fetchone()[0]
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare a run against a baseline run.
+
+    Args:
+        results (dict): The run returned by run_benchmark.
+        baseline (dict): A previous run loaded from its JSON file.
+        threshold (float): Relative change counted as a regression, 0.2 being 20%.
+
+    Returns:
+        list: One dict per compared metric, with scenario, metric, baseline,
+        current, change and regression.
+    """
+
+    rows = []
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else (0.0 if after == before else math.inf)
+            worse = -change if higher_is_better else change
+            rows.append({
+                "scenario": scenario,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change": change,
+                "regression": worse > threshold,
+            })
+    return rows
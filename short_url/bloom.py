@@ -0,0 +1,323 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .models import ShortenedURL
+
+
+logger = logging.getLogger(__name__)
+
+
+class CountingBloomFilter:
+    """
+    Bloom filter with one 8-bit counter per slot, so keys can also be removed.
+
+    The number of slots and hash functions are derived from the expected
+    number of keys and the target false positive rate. Counters saturate at
+    255 and are never decremented past that point, which can only cause extra
+    false positives, never false negatives.
+
+    Attributes:
+        capacity (int): Number of keys the filter is sized for.
+        error_rate (float): Target false positive rate at capacity.
+        size (int): Number of counters.
+        hash_count (int): Number of counters touched per key.
+        count (int): Number of keys currently in the filter.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._counters = bytearray(self.size)
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * step) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        """
+        Add a key to the filter.
+
+        Args:
+            key (str): The key to add.
+        """
+
+        for index in self._indexes(key):
+            if self._counters[index] < 255:
+                self._counters[index] += 1
+        self.count += 1
+
+    def discard(self, key):
+        """
+        Remove a key that was previously added.
+
+        Args:
+            key (str): The key to remove.
+        """
+
+        indexes = self._indexes(key)
+        if not all(self._counters[index] for index in indexes):
+            return
+        for index in indexes:
+            if self._counters[index] < 255:
+                self._counters[index] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, key):
+        counters = self._counters
+        return all(counters[index] for index in self._indexes(key))
+
+    def false_positive_rate(self):
+        """
+        Estimate the current false positive rate from the number of keys held.
+
+        Returns:
+            float: The estimated probability that an absent key is reported present.
+        """
+
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class ShortKeyFilter:
+    """
+    Process-local Bloom filter over every short key in the database.
+
+    A key reported absent by the filter definitely does not exist, so redirect
+    lookups and custom key checks can skip the database for it. The filter is
+    built from the table with a streaming scan, updated through signals as this
+    process creates and deletes rows, and caught up with rows created by other
+    processes (``id`` greater than the last one seen) before answering
+    "absent" if it has not synced for ``sync_interval`` seconds.
+
+    A process forked from one holding a filter, e.g. a worker of
+    ``gunicorn --preload``, starts over with an empty one and a new lock: the
+    parent's warm thread may have held the lock, or left a scan halfway, at
+    the time of the fork.
+
+    Attributes:
+        error_rate (float): Target false positive rate.
+        sync_interval (float): Seconds a negative answer may rely on without catching up.
+        min_capacity (int): Smallest number of keys the filter is sized for.
+    """
+
+    scan_chunk_size = 2000
+
+    def __init__(self, error_rate=0.01, sync_interval=1.0, min_capacity=100000, enabled=True):
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.min_capacity = min_capacity
+        self.enabled = enabled
+        self._bloom = None
+        self._last_id = 0
+        self._last_sync = 0.0
+        self._lock = threading.RLock()
+        self._pid = os.getpid()
+
+    def might_exist(self, short_key):
+        """
+        Check whether a short key may exist.
+
+        Args:
+            short_key (str): The short key to check.
+
+        Returns:
+            bool: False only if the short key definitely does not exist.
+        """
+
+        if not self.enabled:
+            return True
+
+        self._check_fork()
+        bloom = self._bloom
+        if bloom is not None:
+            if short_key in bloom:
+                return True
+            if time.monotonic() - self._last_sync < self.sync_interval:
+                return False
+
+        try:
+            self.sync()
+        except DatabaseError:
+            logger.exception("Could not sync the short key filter")
+            return True
+        return short_key in self._bloom
+
+    async def amight_exist(self, short_key):
+        """
+        Async counterpart of might_exist; only a catch-up scan leaves the event loop.
+
+        Args:
+            short_key (str): The short key to check.
+
+        Returns:
+            bool: False only if the short key definitely does not exist.
+        """
+
+        if not self.enabled:
+            return True
+        self._check_fork()
+        bloom = self._bloom
+        if bloom is not None and short_key in bloom:
+            return True
+        if bloom is not None and time.monotonic() - self._last_sync < self.sync_interval:
+            return False
+        return await sync_to_async(self.might_exist)(short_key)
+
+    def add(self, short_key):
+        """
+        Record a newly created short key.
+
+        Args:
+            short_key (str): The short key to add.
+        """
+
+        self._check_fork()
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(short_key)
+
+    def discard(self, short_key, pk):
+        """
+        Forget a deleted short key.
+
+        Only rows already covered by a scan are removed: removing a key that
+        was never added would decrement counters owned by other keys and turn
+        them into false negatives. Keys skipped here stay as false positives
+        until the next rebuild.
+
+        Args:
+            short_key (str): The short key to remove.
+            pk (int): The primary key of the deleted row.
+        """
+
+        self._check_fork()
+        with self._lock:
+            if self._bloom is not None and pk <= self._last_id:
+                self._bloom.discard(short_key)
+
+    def warm(self):
+        """
+        Build the filter now rather than on the first lookup.
+
+        Errors are logged, not raised, so an unmigrated database does not stop
+        the process from starting; the filter is then built lazily.
+        """
+
+        if not self.enabled:
+            return
+        try:
+            self.sync()
+        except DatabaseError:
+            logger.warning("Could not build the short key filter, deferring to first use", exc_info=True)
+
+    def warm_in_background(self):
+        """
+        Start warm() in a daemon thread and return at once.
+
+        Safe to call while an event loop is running, e.g. when an ASGI server
+        imports the application, where querying directly would raise
+        SynchronousOnlyOperation. Lookups made before the scan finishes wait
+        for it on the filter's lock.
+
+        Returns:
+            threading.Thread: The started thread, or None if the filter is disabled.
+        """
+
+        if not self.enabled:
+            return None
+        thread = threading.Thread(target=self._warm_and_close, name="short-key-filter-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_and_close(self):
+        try:
+            self.warm()
+        finally:
+            # the thread's connection is never reused
+            connections.close_all()
+
+    def sync(self):
+        """
+        Build the filter if needed, otherwise add rows created since the last sync.
+
+        The filter is rebuilt with twice the capacity once it holds more keys
+        than it was sized for, so its false positive rate stays near target.
+        """
+
+        self._check_fork()
+        with self._lock:
+            if self._bloom is None or self._bloom.count > self._bloom.capacity:
+                self.rebuild()
+                return
+            self._scan(self._bloom, ShortenedURL.objects.filter(id__gt=self._last_id))
+
+    def rebuild(self):
+        """
+        Rebuild the filter from a streaming scan of the whole table.
+        """
+
+        self._check_fork()
+        with self._lock:
+            capacity = max(self.min_capacity, 2 * ShortenedURL.objects.count())
+            bloom = CountingBloomFilter(capacity, self.error_rate)
+            self._last_id = 0
+            self._scan(bloom, ShortenedURL.objects.all())
+            self._bloom = bloom
+
+    def stats(self):
+        """
+        Returns the filter statistics.
+
+        Returns:
+            dict: keys held, capacity, memory in bytes, hash count, target and estimated false positive rates.
+        """
+
+        self._check_fork()
+        bloom = self._bloom
+        if bloom is None:
+            return {"built": False}
+        return {
+            "built": True,
+            "keys": bloom.count,
+            "capacity": bloom.capacity,
+            "memory_bytes": bloom.size,
+            "hash_count": bloom.hash_count,
+            "target_error_rate": bloom.error_rate,
+            "estimated_error_rate": bloom.false_positive_rate(),
+        }
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # the parent's lock may be held by a thread that does not exist in this process
+            self._lock = threading.RLock()
+            self._bloom = None
+            self._last_id = 0
+            self._last_sync = 0.0
+            self._pid = os.getpid()
+
+    def _scan(self, bloom, queryset):
+        rows = queryset.order_by().values_list("id", "short_key").iterator(chunk_size=self.scan_chunk_size)
+        for pk, short_key in rows:
+            bloom.add(short_key)
+            self._last_id = max(self._last_id, pk)
+        self._last_sync = time.monotonic()
+
+
+key_filter = ShortKeyFilter(
+    error_rate=getattr(settings, "SHORT_URL_BLOOM_ERROR_RATE", 0.01),
+    sync_interval=getattr(settings, "SHORT_URL_BLOOM_SYNC_INTERVAL", 1.0),
+    min_capacity=getattr(settings, "SHORT_URL_BLOOM_MIN_CAPACITY", 100000),
+    enabled=getattr(settings, "SHORT_URL_BLOOM_ENABLED", True),
+)
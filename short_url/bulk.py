@@ -0,0 +1,389 @@
+import codecs
+import csv
+import json
+
+from collections import Counter
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from utils.routers import replica_reads
+
+from .bloom import key_filter
+from .expiry import extend_expiry
+from .keygen import GENERATED_KEY_ATTEMPTS, key_allocator
+from .models import DEFAULT_EXPIRY_DAYS, ShortenedURL
+from .stats import update_link_stats
+from .tasks import enqueue_qr_codes
+from .urlnorm import url_hash
+
+
+MAX_KEY_LENGTH = ShortenedURL._meta.get_field("short_key").max_length
+
+# characters that can continue a JSON number
+NUMBER_CHARS = set("0123456789.eE+-")
+
+
+def iter_json_array(stream, read_size=65536):
+    """
+    Yield the elements of a JSON array read incrementally from a text stream.
+
+    Only the element being decoded is kept in memory, so arbitrarily large
+    arrays can be processed in constant memory.
+
+    Args:
+        stream: A file-like object returning str from read().
+        read_size (int): Number of characters read at a time.
+
+    Yields:
+        The decoded array elements.
+
+    Raises:
+        ValueError: If the input is not a JSON array.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = stream.read(read_size)
+    position = 0
+    expected = "["
+
+    while True:
+        # skip whitespace, refilling the buffer when it runs out
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position < len(buffer):
+                break
+            buffer, position = stream.read(read_size), 0
+            if not buffer:
+                raise ValueError("Expected a JSON array." if expected == "[" else "Unterminated JSON array.")
+
+        char = buffer[position]
+        if expected == "[":
+            if char != "[":
+                raise ValueError("Expected a JSON array.")
+            expected = "value or ]"
+            position += 1
+            continue
+
+        if char == "]" and expected != "value":
+            return
+
+        if expected == ", or ]":
+            if char != ",":
+                raise ValueError("Expected , or ] in JSON array.")
+            expected = "value"
+            position += 1
+            continue
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            more = stream.read(read_size)
+            if not more:
+                raise ValueError("Invalid JSON array.")
+            buffer, position = buffer[position:] + more, 0
+            continue
+
+        if isinstance(element, (int, float)) and not isinstance(element, bool) and set(buffer[end:]) <= NUMBER_CHARS:
+            # a number cut by the end of the buffer decodes as its first digits
+            more = stream.read(read_size)
+            if more:
+                buffer, position = buffer[position:] + more, 0
+                continue
+
+        position = end
+        expected = ", or ]"
+        yield element
+
+
+def iter_csv_rows(stream):
+    """
+    Yield dict rows from a CSV text stream with a header line.
+
+    Args:
+        stream: A file-like object returning str lines.
+
+    Yields:
+        dict: One row per CSV record, keyed by header.
+    """
+
+    yield from csv.DictReader(stream)
+
+
+def parse_rows(stream, content_type):
+    """
+    Yield input rows from a binary stream holding a JSON array or CSV.
+
+    Args:
+        stream: A binary file-like object, such as the request.
+        content_type (str): "application/json" or "text/csv".
+
+    Yields:
+        The raw input rows.
+    """
+
+    text = codecs.getreader("utf-8")(stream)
+    if content_type == "application/json":
+        return iter_json_array(text)
+    return iter_csv_rows(text)
+
+
+class BulkShortener:
+    """
+    Create shortened URLs from a stream of rows, a chunk at a time.
+
+    Each chunk costs one IN query to find the user's existing links to the
+    same URLs, which are returned instead of creating duplicates (unless
+    ``dedupe`` is off or the row has a custom key) with their expiry
+    extended to that of a new link, one IN query to check
+    custom keys, short keys allocated
+    in bulk from the key allocator, one bulk_create, and one bulk insert of
+    QR code jobs that are rendered afterwards. Only the current chunk is held
+    in memory, so input of any size is processed in constant memory.
+
+    Rows are JSON strings or objects / CSV records with a ``long_url`` and an
+    optional ``custom_url`` column.
+
+    Attributes:
+        user (User): The owner of the created shortened URLs.
+        base_url (str): Scheme and domain used to build the QR code payloads.
+        chunk_size (int): Number of rows inserted per bulk_create.
+        dedupe (bool): Whether URLs the user already shortened return their existing link.
+    """
+
+    def __init__(self, user, base_url, chunk_size=500, dedupe=True):
+        self.user = user
+        self.base_url = base_url.rstrip("/")
+        self.chunk_size = chunk_size
+        self.dedupe = dedupe
+        self.validate_url = URLValidator()
+
+    def run(self, rows):
+        """
+        Shorten every row, yielding one result per input row in order.
+
+        Args:
+            rows: An iterable of input rows.
+
+        Yields:
+            dict: ``row``, ``status`` ("created", "existing" or "error") and
+            either ``short_key`` and ``long_url`` or ``error``.
+        """
+
+        chunk = []
+        for number, row in enumerate(rows, start=1):
+            chunk.append((number, row))
+            if len(chunk) >= self.chunk_size:
+                yield from self.create_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self.create_chunk(chunk)
+
+    def create_chunk(self, chunk):
+        """
+        Validate and insert one chunk of rows.
+
+        Args:
+            chunk (list): (row number, raw row) pairs.
+
+        Returns:
+            list: The per-row results.
+        """
+
+        results = {}
+        valid = []
+        custom_keys = set()
+        for number, row in chunk:
+            try:
+                original_url, custom_url = self.clean_row(row)
+            except ValidationError as error:
+                results[number] = {"row": number, "status": "error", "error": error.messages[0]}
+                continue
+            if custom_url and custom_url in custom_keys:
+                results[number] = {"row": number, "status": "error", "error": "Custom URL is repeated in the input."}
+                continue
+            if custom_url:
+                custom_keys.add(custom_url)
+            valid.append((number, original_url, custom_url))
+
+        candidates = [key for key in custom_keys if key_filter.might_exist(key)]
+        taken = set()
+        if candidates:
+            # a key missed by a lagging replica still fails the insert, which is retried row by row
+            with replica_reads():
+                taken = set(ShortenedURL.objects.filter(short_key__in=candidates).values_list("short_key", flat=True))
+
+        hashes = {number: url_hash(original_url) for number, original_url, _ in valid}
+        expiry_date = timezone.localdate() + timedelta(days=DEFAULT_EXPIRY_DAYS)
+        existing = {}
+        if self.dedupe:
+            existing = ShortenedURL.find_reusable(self.user, list({hashes[number] for number, _, custom_url in valid if not custom_url}))
+            stale = [short_key for short_key, expiration_date in existing.values() if expiration_date is not None and expiration_date < expiry_date]
+            if stale:
+                extend_expiry(self.user, stale, expiry_date)
+
+        pending = []
+        # rows repeating a URL of an earlier row in the chunk -> that row's number
+        repeats = {}
+        first_rows = {}
+        for number, original_url, custom_url in valid:
+            if custom_url in taken:
+                results[number] = {"row": number, "status": "error", "error": "Custom URL is already in use."}
+            elif self.dedupe and not custom_url and hashes[number] in existing:
+                results[number] = {"row": number, "status": "existing", "short_key": existing[hashes[number]][0], "long_url": original_url}
+            elif self.dedupe and not custom_url and hashes[number] in first_rows:
+                repeats[number] = first_rows[hashes[number]]
+            else:
+                if not custom_url:
+                    first_rows[hashes[number]] = number
+                pending.append((number, original_url, custom_url))
+
+        generated = iter(key_allocator.next_keys(sum(1 for _, _, custom_url in pending if not custom_url)))
+        objs = {}
+        for number, original_url, custom_url in pending:
+            objs[number] = ShortenedURL(
+                original_url=original_url,
+                short_key=custom_url or next(generated),
+                user=self.user,
+                custom_url_key=custom_url,
+                expiration_date=expiry_date,
+                url_hash=hashes[number],
+            )
+
+        created = self.insert(objs, results)
+        for number, obj in created.items():
+            results[number] = {"row": number, "status": "created", "short_key": obj.short_key, "long_url": obj.original_url}
+        for number, first in repeats.items():
+            results[number] = {**results[first], "row": number}
+            if results[first]["status"] == "created":
+                results[number]["status"] = "existing"
+        enqueue_qr_codes(list(created.values()), [f"{self.base_url}/{obj.short_key}" for obj in created.values()])
+
+        return [results[number] for number, _ in chunk]
+
+    def insert(self, objs, results):
+        """
+        Insert the chunk with bulk_create, falling back to row by row on a conflict.
+
+        A custom key taken by a concurrent request makes the whole bulk insert
+        fail; the chunk is then retried one row at a time so only the
+        conflicting rows are reported as errors.
+
+        bulk_create sends no post_save, so rows it inserts are added to the key
+        filter and the owner's UserLinkStats here. Rows saved one by one are
+        handled by the post_save receivers instead, and must not be counted twice.
+
+        Args:
+            objs (dict): Row number -> unsaved ShortenedURL.
+            results (dict): Row number -> result, updated with conflicts.
+
+        Returns:
+            dict: Row number -> saved ShortenedURL with its primary key set.
+        """
+
+        if not objs:
+            return {}
+
+        try:
+            with transaction.atomic():
+                ShortenedURL.objects.bulk_create(objs.values())
+        except IntegrityError:
+            created = {}
+            for number, obj in objs.items():
+                if self.save_row(obj):
+                    created[number] = obj
+                else:
+                    results[number] = {"row": number, "status": "error", "error": "Custom URL is already in use."}
+            return created
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = dict(ShortenedURL.objects.filter(short_key__in=[obj.short_key for obj in objs.values()]).values_list("short_key", "id"))
+            for obj in objs.values():
+                obj.pk = ids[obj.short_key]
+
+        for obj in objs.values():
+            key_filter.add(obj.short_key)
+        update_link_stats(self.user.pk, links=len(objs), expiry=Counter(obj.expiration_date for obj in objs.values()))
+        return objs
+
+    def save_row(self, obj):
+        """
+        Save one row, moving a generated key taken as someone's custom key to the next key.
+
+        Args:
+            obj (ShortenedURL): The unsaved row.
+
+        Returns:
+            bool: False if the row's custom key is taken.
+        """
+
+        for attempt in range(GENERATED_KEY_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    obj.save()
+                return True
+            except IntegrityError:
+                if obj.custom_url_key or attempt == GENERATED_KEY_ATTEMPTS - 1:
+                    break
+                obj.short_key = key_allocator.next_key()
+        if not obj.custom_url_key:
+            raise IntegrityError(f"No free generated key after {GENERATED_KEY_ATTEMPTS} attempts.")
+        return False
+
+    def clean_row(self, row):
+        """
+        Extract and validate the long URL and custom key of a row.
+
+        Args:
+            row: A JSON string, JSON object or CSV dict row.
+
+        Returns:
+            tuple: (original_url, custom_url or None).
+
+        Raises:
+            ValidationError: If the row is not usable.
+        """
+
+        if isinstance(row, str):
+            row = {"long_url": row}
+        if not isinstance(row, dict):
+            raise ValidationError("Row must be a URL or an object with a long_url.")
+
+        original_url = (row.get("long_url") or "").strip()
+        custom_url = (row.get("custom_url") or "").strip() or None
+        if not original_url:
+            raise ValidationError("long_url is required.")
+
+        if not original_url.startswith('http://') and not original_url.startswith('https://'):
+            original_url = 'http://' + original_url
+        self.validate_url(original_url)
+
+        if custom_url and (len(custom_url) > MAX_KEY_LENGTH or not custom_url.isalnum()):
+            raise ValidationError(f"custom_url must be at most {MAX_KEY_LENGTH} letters or digits.")
+
+        return original_url, custom_url
+
+
+def iter_ndjson(shortener, rows):
+    """
+    Yield the results of a bulk run as NDJSON lines.
+
+    Input that stops parsing halfway is reported as a final error line.
+
+    Args:
+        shortener (BulkShortener): The shortener to run.
+        rows: An iterable of input rows.
+
+    Yields:
+        str: One JSON document per line.
+    """
+
+    try:
+        for result in shortener.run(rows):
+            yield json.dumps(result) + "\n"
+    except ValueError as error:
+        yield json.dumps({"status": "error", "error": str(error)}) + "\n"
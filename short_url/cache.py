@@ -0,0 +1,254 @@
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from utils.routers import replica_aliases, replica_reads
+
+from .bloom import key_filter
+from .models import ShortenedURL
+
+
+class ResolvedURL(namedtuple(
+    "ResolvedURL",
+    ["original_url", "expiration_date", "owner_only", "user_id", "redirect_type", "updated_at"],
+    defaults=[ShortenedURL.FOUND, None],
+)):
+    """
+    The part of a shortened URL needed to serve a redirect.
+
+    Attributes:
+        original_url (str): The URL the short key redirects to.
+        expiration_date (date): The last day the short key is valid, or None.
+        owner_only (bool): Whether only the owner may follow the short key.
+        user_id (int): The id of the owner.
+        redirect_type (int): The HTTP status of the redirect.
+        updated_at (datetime): When the shortened URL was last saved, used to validate cached redirects.
+    """
+
+    __slots__ = ()
+
+    @property
+    def is_expired(self):
+        """
+        Returns True once the expiration date has passed.
+
+        Returns:
+            bool: Whether the shortened URL has expired.
+        """
+
+        return self.expiration_date is not None and self.expiration_date < timezone.localdate()
+
+    def expires_at(self):
+        """
+        Returns the moment the shortened URL stops being valid.
+
+        Returns:
+            float: A unix timestamp, or None if the URL never expires.
+        """
+
+        if self.expiration_date is None:
+            return None
+        next_day = datetime.combine(self.expiration_date + timedelta(days=1), datetime.min.time())
+        return timezone.make_aware(next_day).timestamp()
+
+    @property
+    def is_permanent(self):
+        return self.redirect_type in ShortenedURL.PERMANENT_REDIRECT_TYPES
+
+
+class ResolveCache:
+    """
+    Bounded in-process LRU cache of short key -> ResolvedURL.
+
+    Entries live for at most ``ttl`` seconds and never outlive the expiration
+    date of the link they describe. The cache is per process: other workers
+    only see an update once their own entry times out, so ``ttl`` bounds how
+    stale a redirect can be after an edit made elsewhere.
+
+    Attributes:
+        max_size (int): Maximum number of entries kept before evicting the least recently used.
+        ttl (int): Maximum lifetime of an entry in seconds.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that had to go to the database.
+        evictions (int): Number of entries dropped to stay within max_size.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, short_key):
+        """
+        Return the cached ResolvedURL for a short key.
+
+        Args:
+            short_key (str): The short key to look up.
+
+        Returns:
+            ResolvedURL: The cached entry, or None on a miss.
+        """
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(short_key)
+            if entry is not None:
+                resolved, deadline = entry
+                if deadline > now:
+                    self._entries.move_to_end(short_key)
+                    self.hits += 1
+                    return resolved
+                del self._entries[short_key]
+            self.misses += 1
+            return None
+
+    def set(self, short_key, resolved):
+        """
+        Store a ResolvedURL, evicting the least recently used entry if full.
+
+        Args:
+            short_key (str): The short key being cached.
+            resolved (ResolvedURL): The value to cache.
+        """
+
+        if self.max_size <= 0:
+            return
+
+        now = time.time()
+        deadline = now + self.ttl
+        expires_at = resolved.expires_at()
+        if expires_at is not None and expires_at > now:
+            deadline = min(deadline, expires_at)
+
+        with self._lock:
+            self._entries[short_key] = (resolved, deadline)
+            self._entries.move_to_end(short_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, short_key):
+        """
+        Drop the entry for a short key, if any.
+
+        Args:
+            short_key (str): The short key to forget.
+        """
+
+        with self._lock:
+            self._entries.pop(short_key, None)
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: size, max_size, hits, misses, evictions and hit_ratio.
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+resolve_cache = ResolveCache(
+    max_size=getattr(settings, "SHORT_URL_RESOLVE_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "SHORT_URL_RESOLVE_CACHE_TTL", 60),
+)
+
+
+def resolve_short_key(short_key):
+    """
+    Resolve a short key through the cache, falling back to the database.
+
+    Keys the key filter reports as absent are answered without a query.
+
+    Args:
+        short_key (str): The short key to resolve.
+
+    Returns:
+        ResolvedURL: The resolved target, or None if the short key does not exist.
+    """
+
+    resolved = resolve_cache.get(short_key)
+    if resolved is not None:
+        return resolved
+
+    if not key_filter.might_exist(short_key):
+        return None
+
+    try:
+        with replica_reads():
+            row = ShortenedURL.objects.values_list(*ResolvedURL._fields).get(short_key=short_key)
+    except ShortenedURL.DoesNotExist:
+        if not replica_aliases():
+            return None
+        # the replica may not have caught up with a link created moments ago
+        try:
+            row = ShortenedURL.objects.using(DEFAULT_DB_ALIAS).values_list(*ResolvedURL._fields).get(short_key=short_key)
+        except ShortenedURL.DoesNotExist:
+            return None
+
+    resolved = ResolvedURL(*row)
+    resolve_cache.set(short_key, resolved)
+    return resolved
+
+
+async def aresolve_short_key(short_key):
+    """
+    Async counterpart of resolve_short_key, using the async ORM on a cache miss.
+
+    Args:
+        short_key (str): The short key to resolve.
+
+    Returns:
+        ResolvedURL: The resolved target, or None if the short key does not exist.
+    """
+
+    resolved = resolve_cache.get(short_key)
+    if resolved is not None:
+        return resolved
+
+    if not await key_filter.amight_exist(short_key):
+        return None
+
+    try:
+        with replica_reads():
+            row = await ShortenedURL.objects.values_list(*ResolvedURL._fields).aget(short_key=short_key)
+    except ShortenedURL.DoesNotExist:
+        if not replica_aliases():
+            return None
+        try:
+            row = await ShortenedURL.objects.using(DEFAULT_DB_ALIAS).values_list(*ResolvedURL._fields).aget(short_key=short_key)
+        except ShortenedURL.DoesNotExist:
+            return None
+
+    resolved = ResolvedURL(*row)
+    resolve_cache.set(short_key, resolved)
+    return resolved
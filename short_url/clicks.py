@@ -0,0 +1,140 @@
+import threading
+
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from utils.background import PeriodicFlusher
+
+from .models import ShortenedURL
+from .stats import update_link_stats
+
+
+# keeps the IN (...) of the owner lookup under SQLite's parameter limit
+OWNER_CHUNK_SIZE = 500
+
+
+class ClickBuffer:
+    """
+    Write-behind buffer of click counts, keyed by short key.
+
+    Redirects only bump an in-memory counter. A background thread flushes the
+    accumulated counts every ``flush_interval`` seconds, or as soon as
+    ``flush_threshold`` clicks are pending, issuing a single
+    ``UPDATE ... SET click_count = click_count + n`` per short key, plus one
+    update of each owner's UserLinkStats row. An interval of 0 disables
+    buffering and writes each click straight through.
+
+    Attributes:
+        flush_interval (float): Seconds between two flushes.
+        flush_threshold (int): Number of pending clicks that triggers an early flush.
+        flushed (int): Number of clicks written to the database so far.
+    """
+
+    def __init__(self, flush_interval=5, flush_threshold=1000):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.flushed = 0
+        self._counts = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flusher = PeriodicFlusher(self.flush, flush_interval, "click-buffer-flusher")
+
+    def add(self, short_key, count=1):
+        """
+        Record clicks for a short key.
+
+        Args:
+            short_key (str): The short key that was clicked.
+            count (int): The number of clicks to record.
+        """
+
+        if self.flush_interval <= 0:
+            self._write({short_key: count})
+            return
+
+        with self._lock:
+            self._counts[short_key] = self._counts.get(short_key, 0) + count
+            self._pending += count
+            full = self._pending >= self.flush_threshold
+
+        self._flusher.start()
+        if full:
+            self._flusher.wake()
+
+    async def aadd(self, short_key, count=1):
+        """
+        Async counterpart of add, safe to call from an event loop.
+
+        Args:
+            short_key (str): The short key that was clicked.
+            count (int): The number of clicks to record.
+        """
+
+        if self.flush_interval <= 0:
+            await sync_to_async(self._write)({short_key: count})
+            return
+        self.add(short_key, count)
+
+    def flush(self):
+        """
+        Write every pending count to the database.
+
+        Counts are put back into the buffer if the write fails, so a
+        transient database error delays clicks instead of losing them.
+        """
+
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self._pending = 0
+
+        if not counts:
+            return
+
+        try:
+            self._write(counts)
+        except Exception:
+            with self._lock:
+                for short_key, count in counts.items():
+                    self._counts[short_key] = self._counts.get(short_key, 0) + count
+                    self._pending += count
+            raise
+
+    def stats(self):
+        """
+        Returns the buffer counters.
+
+        Returns:
+            dict: pending clicks, distinct pending keys and clicks flushed so far.
+        """
+
+        with self._lock:
+            return {"pending": self._pending, "keys": len(self._counts), "flushed": self.flushed}
+
+    def _write(self, counts):
+        keys = list(counts)
+        owners = {}
+        for start in range(0, len(keys), OWNER_CHUNK_SIZE):
+            chunk = keys[start:start + OWNER_CHUNK_SIZE]
+            owners.update(ShortenedURL.objects.filter(short_key__in=chunk).values_list("short_key", "user_id"))
+
+        clicks_by_user = Counter()
+        with transaction.atomic():
+            for short_key, count in counts.items():
+                if ShortenedURL.objects.filter(short_key=short_key).update(click_count=F("click_count") + count):
+                    clicks_by_user[owners.get(short_key)] += count
+            # links deleted since their owner was looked up have no owner to credit
+            clicks_by_user.pop(None, None)
+            for user_id, clicks in clicks_by_user.items():
+                update_link_stats(user_id, clicks=clicks)
+        with self._lock:
+            self.flushed += sum(counts.values())
+
+
+click_buffer = ClickBuffer(
+    flush_interval=getattr(settings, "SHORT_URL_CLICK_FLUSH_INTERVAL", 5),
+    flush_threshold=getattr(settings, "SHORT_URL_CLICK_FLUSH_THRESHOLD", 1000),
+)
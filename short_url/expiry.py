@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import time
+
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import resolve_cache
+from .models import QRCodeJob, ShortenedURL
+from .stats import batched_link_stats, update_link_stats
+from .tasks import enqueue_qr_code
+
+
+logger = logging.getLogger(__name__)
+
+# every column, so fields added to the model later are archived too
+ARCHIVE_FIELDS = [field.attname for field in ShortenedURL._meta.concrete_fields]
+
+
+class ExpirySweeper:
+    """
+    Remove expired shortened URLs in small batches, optionally archiving them first.
+
+    Each batch selects up to ``batch_size`` expired rows through the
+    expiration_date index and deletes them in its own short transaction, so
+    the database is never write-locked for long and the sweep can run while
+    the site is serving traffic. Deleting goes through the ORM, so the resolve
+    cache and key filter signals fire and the rows' QR jobs are removed with
+    them. QR images are deleted afterwards, unless another row still uses
+    the same content-addressed file.
+
+    Attributes:
+        cutoff (date): Rows whose expiration date is before this day are removed.
+        batch_size (int): Number of rows deleted per transaction.
+        pause (float): Seconds to sleep between batches.
+        archive (file): Text stream receiving one JSON line per removed row, or None.
+        storage (Storage): The storage holding the QR images.
+        deleted (int): Number of rows removed so far.
+        files_deleted (int): Number of QR images removed so far.
+    """
+
+    def __init__(self, cutoff=None, batch_size=500, pause=0.0, archive=None, storage=default_storage):
+        self.cutoff = cutoff or timezone.localdate()
+        self.batch_size = batch_size
+        self.pause = pause
+        self.archive = archive
+        self.storage = storage
+        self.deleted = 0
+        self.files_deleted = 0
+
+    def expired(self):
+        """
+        Returns the expired rows, oldest expiry first.
+
+        Returns:
+            QuerySet: The expired shortened URLs.
+        """
+
+        return ShortenedURL.objects.filter(expiration_date__lt=self.cutoff).order_by("expiration_date", "id")
+
+    def run(self, max_batches=None):
+        """
+        Sweep batches until no expired row is left or ``max_batches`` have run.
+
+        Args:
+            max_batches (int): The maximum number of batches, or None for no limit.
+
+        Returns:
+            int: The number of rows removed.
+        """
+
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            if not self.sweep_batch():
+                break
+            batches += 1
+            if self.pause:
+                time.sleep(self.pause)
+        return self.deleted
+
+    def sweep_batch(self):
+        """
+        Archive and delete one batch of expired rows, then their unused QR images.
+
+        Returns:
+            int: The number of rows removed by this batch.
+        """
+
+        rows = list(self.expired().values(*ARCHIVE_FIELDS)[:self.batch_size])
+        if not rows:
+            return 0
+
+        if self.archive is not None:
+            for row in rows:
+                self.archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+            self.archive.flush()
+            if hasattr(self.archive, "fileno"):
+                os.fsync(self.archive.fileno())
+
+        ids = [row["id"] for row in rows]
+        with transaction.atomic():
+            # re-check the expiry so a link renewed since the select is kept
+            with batched_link_stats():
+                _, per_model = ShortenedURL.objects.filter(pk__in=ids, expiration_date__lt=self.cutoff).delete()
+        count = per_model.get(ShortenedURL._meta.label, 0)
+        self.deleted += count
+
+        self.delete_files({row["qr_code"] for row in rows if row["qr_code"]})
+        return len(rows)
+
+    def delete_files(self, names):
+        """
+        Delete QR images that no remaining row refers to.
+
+        A row created after the reference check can pick up a content-addressed
+        image just before it is deleted; such rows are re-queued for rendering.
+
+        Args:
+            names (set): Storage names of the QR images of the removed rows.
+        """
+
+        if not names:
+            return
+
+        in_use = set(ShortenedURL.objects.filter(qr_code__in=names).values_list("qr_code", flat=True))
+        removed = []
+        for name in names - in_use:
+            try:
+                self.storage.delete(name)
+            except OSError:
+                logger.exception("Could not delete QR image %s", name)
+                continue
+            removed.append(name)
+        self.files_deleted += len(removed)
+
+        for shortened_url in ShortenedURL.objects.filter(qr_code__in=removed):
+            job = QRCodeJob.objects.filter(shortened_url=shortened_url).order_by("-id").first()
+            if job is not None:
+                enqueue_qr_code(shortened_url, job.data)
+
+
+def extend_expiry(user, short_keys, expiration_date):
+    """
+    Push the expiration date of some of a user's links out to ``expiration_date``.
+
+    Used when an existing link is returned instead of creating a new one, so
+    the user gets at least the expiry a new link would have had. Links that
+    expire later, or never, are left alone. The rows are updated with one
+    query, which sends no signals, so the owner's UserLinkStats and the
+    resolve cache are updated here.
+
+    Args:
+        user (User): The owner of the links.
+        short_keys (list): Short keys of the reused links.
+        expiration_date (date): The expiration date a new link would have had.
+
+    Returns:
+        int: The number of links extended.
+    """
+
+    with transaction.atomic():
+        links = ShortenedURL.objects.filter(user=user, short_key__in=short_keys, expiration_date__lt=expiration_date)
+        rows = list(links.values_list("short_key", "expiration_date"))
+        if not rows:
+            return 0
+        links.update(expiration_date=expiration_date, updated_at=timezone.now())
+
+        changes = Counter({expiration_date: len(rows)})
+        changes.subtract(day for _, day in rows)
+        update_link_stats(user.pk, expiry=changes)
+
+    for short_key, _ in rows:
+        resolve_cache.invalidate(short_key)
+    return len(rows)
+
+
+def expiry_cutoff(grace_days=0):
+    """
+    Returns the first expiration date that is kept.
+
+    Args:
+        grace_days (int): Number of days expired links are kept before removal.
+
+    Returns:
+        date: Links expiring before this day are removed.
+    """
+
+    return timezone.localdate() - timedelta(days=grace_days)
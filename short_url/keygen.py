@@ -0,0 +1,207 @@
+import os
+import string
+import threading
+
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .bloom import key_filter
+from .models import KeySequence, ShortenedURL
+
+
+ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+BASE = len(ALPHABET)
+
+# affine permutation of [0, BASE ** length); the multiplier is coprime with 62
+PERMUTATION_MULTIPLIER = 0x9E3779B97F4A7C15
+PERMUTATION_OFFSET = 0x2545F4914F6CDD1D
+
+# keeps the IN (...) of the collision probe under SQLite's parameter limit
+PROBE_CHUNK_SIZE = 500
+
+# generated keys tried for one row before giving up; each may have been taken as a custom key
+GENERATED_KEY_ATTEMPTS = 5
+
+MAX_KEY_LENGTH = ShortenedURL._meta.get_field("short_key").max_length
+
+
+def key_length(value, min_length):
+    """
+    Returns the number of base62 digits used to encode a sequence value.
+
+    Args:
+        value (int): The sequence value.
+        min_length (int): The shortest key length to use.
+
+    Returns:
+        int: The key length, growing by one each time the space of the previous length is used up.
+    """
+
+    length = min_length
+    while value >= BASE ** length:
+        length += 1
+    return length
+
+
+def encode(value, length):
+    """
+    Encode a non-negative integer as a base62 string of a fixed length.
+
+    Args:
+        value (int): The value to encode, below BASE ** length.
+        length (int): The number of digits to produce.
+
+    Returns:
+        str: The zero-padded base62 representation.
+    """
+
+    digits = []
+    for _ in range(length):
+        value, digit = divmod(value, BASE)
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def decode(key):
+    """
+    Decode a base62 string back to an integer.
+
+    Args:
+        key (str): The base62 string.
+
+    Returns:
+        int: The decoded value.
+    """
+
+    value = 0
+    for char in key:
+        value = value * BASE + ALPHABET.index(char)
+    return value
+
+
+def sequence_to_key(value, min_length=6, permute=True):
+    """
+    Map a sequence value to its short key.
+
+    Distinct values always give distinct keys. With ``permute`` the value is
+    scrambled by an affine permutation of the key space of its length, so
+    consecutive values give random-looking keys; key_to_sequence reverses it.
+
+    Args:
+        value (int): The sequence value.
+        min_length (int): The shortest key length to use.
+        permute (bool): Whether to scramble the value before encoding it.
+
+    Returns:
+        str: The short key.
+    """
+
+    length = key_length(value, min_length)
+    if length > MAX_KEY_LENGTH:
+        raise ValueError("Short key space exhausted.")
+    if permute:
+        value = (value * PERMUTATION_MULTIPLIER + PERMUTATION_OFFSET) % BASE ** length
+    return encode(value, length)
+
+
+def key_to_sequence(key, permute=True):
+    """
+    Map a generated short key back to its sequence value.
+
+    Args:
+        key (str): A short key produced by sequence_to_key.
+        permute (bool): Whether the key was produced with ``permute``.
+
+    Returns:
+        int: The sequence value.
+    """
+
+    value = decode(key)
+    if permute:
+        space = BASE ** len(key)
+        value = (value - PERMUTATION_OFFSET) * pow(PERMUTATION_MULTIPLIER, -1, space) % space
+    return value
+
+
+class KeyAllocator:
+    """
+    Hands out collision-free short keys from blocks reserved in the database.
+
+    Each process reserves ``block_size`` consecutive values of the short_key
+    KeySequence with a single atomic increment, then turns them into keys in
+    memory. Values are never handed out twice, so generated keys never collide
+    with each other; the few that clash with custom or legacy random keys are
+    dropped with one lookup per block, restricted to the keys the key filter
+    cannot rule out. No retry loop is needed.
+
+    Attributes:
+        block_size (int): Number of sequence values reserved per round trip.
+        min_length (int): The shortest key length to generate.
+        permute (bool): Whether keys are scrambled to look random.
+    """
+
+    sequence_name = "short_key"
+
+    def __init__(self, block_size=100, min_length=6, permute=True):
+        self.block_size = block_size
+        self.min_length = min_length
+        self.permute = permute
+        self._keys = deque()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def next_key(self):
+        """
+        Return an unused short key.
+
+        Returns:
+            str: The short key.
+        """
+
+        return self.next_keys(1)[0]
+
+    def next_keys(self, count):
+        """
+        Return several unused short keys, reserving as many blocks as needed.
+
+        Args:
+            count (int): The number of keys wanted.
+
+        Returns:
+            list: The short keys.
+        """
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # a block reserved before a fork would be shared with the parent
+                self._keys.clear()
+                self._pid = os.getpid()
+
+            while len(self._keys) < count:
+                self._keys.extend(self._reserve_block(max(self.block_size, count - len(self._keys))))
+            return [self._keys.popleft() for _ in range(count)]
+
+    def _reserve_block(self, size):
+        with transaction.atomic():
+            sequence = KeySequence.objects.filter(name=self.sequence_name)
+            if not sequence.update(next_value=F("next_value") + size):
+                KeySequence.objects.create(name=self.sequence_name, next_value=size)
+            end = sequence.values_list("next_value", flat=True).get()
+
+        keys = [sequence_to_key(value, self.min_length, self.permute) for value in range(end - size, end)]
+        candidates = [key for key in keys if key_filter.might_exist(key)]
+        taken = set()
+        for start in range(0, len(candidates), PROBE_CHUNK_SIZE):
+            chunk = candidates[start:start + PROBE_CHUNK_SIZE]
+            taken.update(ShortenedURL.objects.filter(short_key__in=chunk).values_list("short_key", flat=True))
+        return [key for key in keys if key not in taken]
+
+
+key_allocator = KeyAllocator(
+    block_size=getattr(settings, "SHORT_URL_KEY_BLOCK_SIZE", 100),
+    min_length=getattr(settings, "SHORT_URL_KEY_MIN_LENGTH", 6),
+    permute=getattr(settings, "SHORT_URL_KEY_PERMUTE", True),
+)
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from short_url.analytics import click_events
+from short_url.benchmark import SCENARIOS, compare, run_benchmark
+from short_url.clicks import click_buffer
+
+
+class Command(BaseCommand):
+    """
+    Management command measuring the core views under concurrent load.
+
+    The run uses a scratch database created and destroyed by the command, so
+    it never touches the configured one. Requests go through the full
+    middleware stack in-process, without a network or server in between.
+    QR codes are queued but not rendered during the run.
+    """
+
+    help = "Benchmark the redirect, create, list, update and login views."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma separated scenarios, from: {', '.join(SCENARIOS)}.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Number of client threads, or tasks with --interface asgi.")
+        parser.add_argument(
+            "--interface", choices=["wsgi", "asgi"], default="wsgi",
+            help="Send requests through Django's WSGI handler from threads, or its ASGI handler from one event loop.",
+        )
+        parser.add_argument("--requests", type=int, default=500, help="Timed requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=10, help="Untimed requests per thread before each scenario.")
+        parser.add_argument("--users", type=int, default=10, help="Number of seeded users.")
+        parser.add_argument("--urls", type=int, default=10000, help="Number of seeded shortened URLs.")
+        parser.add_argument("--writer-chunk-size", type=int, default=0, help="Run a bulk create writer with this chunk size during every scenario.")
+        parser.add_argument("--output", metavar="PATH", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", metavar="PATH", help="Compare against the results stored in this JSON file.")
+        parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression.")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(unknown)}.")
+        if options["concurrency"] < 1 or options["users"] < 1:
+            raise CommandError("--concurrency and --users must be at least 1.")
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+
+        results = self.run(scenarios, options)
+        self.report(results)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output_file:
+                json.dump(results, output_file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if baseline is not None:
+            rows = compare(results, baseline, options["threshold"])
+            self.report_comparison(rows)
+            regressions = [row for row in rows if row["regression"]]
+            if regressions:
+                raise CommandError(f"{len(regressions)} metric(s) regressed by more than {options['threshold']:.0%}.")
+
+    def run(self, scenarios, options):
+        scratch_dir = None
+        if connection.vendor == "sqlite":
+            # a file, not the shared in-memory test database, so client threads can write concurrently
+            scratch_dir = tempfile.mkdtemp(prefix="benchmark-")
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(scratch_dir, "benchmark.sqlite3")
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # every client thread shares one address and a handful of users, so rate limits are off
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                SHORT_URL_QR_WORKER="command",
+                RATE_LIMIT_ENABLED=False,
+            ):
+                return run_benchmark(
+                    scenarios,
+                    concurrency=options["concurrency"],
+                    requests=options["requests"],
+                    users=options["users"],
+                    urls=options["urls"],
+                    warmup=options["warmup"],
+                    writer_chunk_size=options["writer_chunk_size"],
+                    interface=options["interface"],
+                )
+        finally:
+            # write the buffered clicks now; the flusher threads would find the scratch database gone
+            click_buffer.flush()
+            click_events.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if scratch_dir is not None:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def report(self, results):
+        meta = results["meta"]
+        clients = "tasks" if meta["interface"] == "asgi" else "threads"
+        self.stdout.write(
+            f"{meta['interface'].upper()} (async redirect view {'on' if meta['async_redirect'] else 'off'}), "
+            f"{meta['requests']} requests per scenario, {meta['concurrency']} {clients}, "
+            f"{meta['urls']} URLs, {meta['database']} (journal {meta['journal_mode']}, CONN_MAX_AGE {meta['conn_max_age']})"
+        )
+        self.stdout.write(f"{'scenario':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>7}")
+        for name, result in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<10} {result['throughput']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['p99_ms']:>9.2f} {result['queries_per_request']:>8.2f} {result['errors']:>7}"
+            )
+            if "writer" in result:
+                writer = result["writer"]
+                self.stdout.write(f"{'':<10} writer: {writer['rows_per_second']:.1f} rows/s, {writer['errors']} failed chunk(s)")
+
+    def report_comparison(self, rows):
+        for row in rows:
+            line = (
+                f"{row['scenario']:<10} {row['metric']:<20} {row['baseline']:>10} -> {row['current']:<10} "
+                f"{row['change']:+.1%}"
+            )
+            self.stdout.write(self.style.ERROR(line + "  REGRESSION") if row["regression"] else line)
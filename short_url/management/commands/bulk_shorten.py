@@ -0,0 +1,47 @@
+import json
+import sys
+
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+
+from short_url.bulk import BulkShortener, iter_csv_rows, iter_json_array
+from user.models import User
+
+
+class Command(BaseCommand):
+    """
+    Management command shortening the URLs listed in a JSON array or CSV file.
+
+    Results are written to stdout as NDJSON, one line per input row.
+    """
+
+    help = "Shorten URLs in bulk from a JSON array or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin.")
+        parser.add_argument("--user", required=True, help="Email of the user owning the links.")
+        parser.add_argument("--format", choices=["csv", "json"], help="Input format; guessed from the file extension by default.")
+        parser.add_argument("--scheme", default="https", help="Scheme used in the QR code payloads.")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows inserted per bulk_create.")
+        parser.add_argument("--no-dedupe", action="store_true", help="Create new links for URLs the user already shortened.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}.")
+
+        input_format = options["format"] or ("json" if options["path"].endswith(".json") else "csv")
+        base_url = f"{options['scheme']}://{Site.objects.get_current().domain}"
+        shortener = BulkShortener(user, base_url, chunk_size=options["chunk_size"], dedupe=not options["no_dedupe"])
+
+        stream = sys.stdin if options["path"] == "-" else open(options["path"], newline="", encoding="utf-8")
+        try:
+            rows = iter_json_array(stream) if input_format == "json" else iter_csv_rows(stream)
+            for result in shortener.run(rows):
+                self.stdout.write(json.dumps(result))
+        except ValueError as error:
+            raise CommandError(str(error))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
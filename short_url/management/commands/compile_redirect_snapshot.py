@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import iri_to_uri
+
+from edge.snapshot import SnapshotWriter
+from short_url.cache import ResolvedURL
+from short_url.models import ShortenedURL
+
+
+class Command(BaseCommand):
+    """
+    Management command compiling the live public links into a redirect snapshot.
+
+    The snapshot is served by the standalone edge server (edge/server.py).
+    It is written next to its destination and renamed over it, so running
+    servers pick it up atomically. Each entry keeps the link's redirect
+    status. Owner-only and expired links are left out; the edge server
+    hands those to the main app.
+    """
+
+    help = "Compile live shortened URLs into a memory-mapped redirect snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="Snapshot path; defaults to SHORT_URL_SNAPSHOT_PATH.")
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.SHORT_URL_SNAPSHOT_PATH
+        started = time.monotonic()
+
+        rows = (
+            ShortenedURL.objects.filter(owner_only=False)
+            .filter(Q(expiration_date__isnull=True) | Q(expiration_date__gte=timezone.localdate()))
+            .values_list("short_key", "original_url", "expiration_date", "redirect_type")
+            .iterator(chunk_size=2000)
+        )
+        writer = SnapshotWriter(path)
+        try:
+            for short_key, original_url, expiration_date, redirect_type in rows:
+                expires_at = ResolvedURL(original_url, expiration_date, False, None).expires_at()
+                writer.add(short_key, iri_to_uri(original_url), expires_at, redirect_type)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+        self.stdout.write(f"Wrote {writer.count} redirect(s) to {path} in {time.monotonic() - started:.2f}s.")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from short_url.tasks import process_jobs
+
+
+class Command(BaseCommand):
+    """
+    Management command running the persistent QR code job queue.
+
+    By default it polls forever; use --once to drain the queue and exit,
+    for example from cron.
+    """
+
+    help = "Render queued QR codes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the runnable jobs and exit.")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--max-jobs", type=int, default=None, help="Stop after this many jobs.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            remaining = None if options["max_jobs"] is None else options["max_jobs"] - total
+            processed = process_jobs(max_jobs=remaining)
+            total += processed
+            if processed:
+                self.stdout.write(f"Processed {processed} QR code job(s).")
+
+            if options["once"] or (options["max_jobs"] is not None and total >= options["max_jobs"]):
+                break
+            if not processed:
+                close_old_connections()
+                time.sleep(options["poll_interval"])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from short_url.stats import rebuild_link_stats
+from user.models import User
+
+
+class Command(BaseCommand):
+    """
+    Management command recomputing UserLinkStats rows from the links.
+
+    Run it after changing links outside the ORM's save() and delete(), e.g.
+    with queryset.update(), or to repair drifted totals.
+    """
+
+    help = "Recompute the per-user link totals shown on the list page."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", default=[], help="Email of a user to recompute; repeatable. All users by default.")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["user"]:
+            users = dict(User.objects.filter(email__in=options["user"]).values_list("email", "pk"))
+            missing = sorted(set(options["user"]) - set(users))
+            if missing:
+                raise CommandError(f"No user with email {', '.join(missing)}.")
+            user_ids = list(users.values())
+
+        written = rebuild_link_stats(user_ids)
+        self.stdout.write(f"Rebuilt link stats of {written} users.")
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# modules the redirect-only profile is meant to keep out of a worker
+HEAVY_MODULES = ("qrcode", "PIL", "crispy_forms", "django.contrib.admin", "django.contrib.messages")
+
+# run in a fresh interpreter, so every import is paid for again
+PROBE = f"""
+import json, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({{
+    "startup_ms": (time.perf_counter() - started) * 1000,
+    "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy_modules": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(output):
+    """
+    Parse the report written by ``python -X importtime``.
+
+    Args:
+        output (str): The interpreter's standard error.
+
+    Returns:
+        list: (module, cumulative microseconds) of the top-level imports, slowest first.
+    """
+
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        # nested imports are indented below the module that triggered them
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        imports.append((name.strip(), int(cumulative)))
+    return sorted(imports, key=lambda item: item[1], reverse=True)
+
+
+class Command(BaseCommand):
+    """
+    Management command measuring how long a worker takes to become ready under each settings module.
+
+    Each settings module is loaded in a new interpreter that builds the WSGI
+    application and the URL resolver, as a worker does before its first
+    request. The report shows the wall time, peak memory, which heavy
+    modules got imported and the slowest top-level imports.
+    """
+
+    help = "Compare worker startup time and memory between settings modules."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--settings-modules",
+            default="url_shorter.settings_production,url_shorter.settings_redirect",
+            help="Comma separated settings modules to compare.",
+        )
+        parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        reports = {}
+        for module in filter(None, options["settings_modules"].split(",")):
+            reports[module] = self.measure(module, options["top"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(reports, indent=2))
+            return
+
+        for module, report in reports.items():
+            self.stdout.write(
+                f"{module}: {report['startup_ms']:.0f} ms, {report['max_rss_kib'] / 1024:.1f} MiB, "
+                f"{report['modules']} modules"
+            )
+            self.stdout.write(f"  heavy modules: {', '.join(report['heavy_modules']) or 'none'}")
+            for name, microseconds in report["slowest_imports"]:
+                self.stdout.write(f"  {microseconds / 1000:8.1f} ms  {name}")
+
+    def measure(self, module, top):
+        """
+        Start a worker interpreter under a settings module and collect its report.
+
+        Args:
+            module (str): The settings module.
+            top (int): Number of slowest imports to keep.
+
+        Returns:
+            dict: The probe's measurements plus ``slowest_imports``.
+        """
+
+        environment = {**os.environ, "DJANGO_SETTINGS_MODULE": module}
+        # production-style settings refuse to load without a secret key; nothing is signed here
+        environment.setdefault("DJANGO_SECRET_KEY", "startup-report")
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE],
+            capture_output=True,
+            text=True,
+            env=environment,
+        )
+        if process.returncode:
+            raise CommandError(f"{module} failed to start:\n{process.stderr[-2000:]}")
+
+        report = json.loads(process.stdout.strip().splitlines()[-1])
+        report["slowest_imports"] = parse_importtime(process.stderr)[:top]
+        return report
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from short_url.expiry import ExpirySweeper, expiry_cutoff
+
+
+class Command(BaseCommand):
+    """
+    Management command removing expired shortened URLs and their QR images.
+
+    Rows are deleted in small transactions, so it is safe to run from cron
+    while the site is live. With --archive the removed rows are first
+    appended to a JSON-lines file.
+    """
+
+    help = "Delete or archive expired shortened URLs in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches.")
+        parser.add_argument("--grace-days", type=int, default=0, help="Keep links for this many days after they expire.")
+        parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument("--archive", metavar="PATH", help="Append the removed rows to this JSON-lines file.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many links would be removed.")
+
+    def handle(self, *args, **options):
+        cutoff = expiry_cutoff(options["grace_days"])
+
+        if options["dry_run"]:
+            count = ExpirySweeper(cutoff).expired().count()
+            self.stdout.write(f"{count} shortened URL(s) expired before {cutoff}.")
+            return
+
+        archive = open(options["archive"], "a", encoding="utf-8") if options["archive"] else None
+        try:
+            sweeper = ExpirySweeper(cutoff, batch_size=options["batch_size"], pause=options["pause"], archive=archive)
+            sweeper.run(max_batches=options["max_batches"])
+        finally:
+            if archive is not None:
+                archive.close()
+
+        self.stdout.write(f"Removed {sweeper.deleted} expired shortened URL(s) and {sweeper.files_deleted} QR image(s).")
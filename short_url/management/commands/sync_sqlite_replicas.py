@@ -0,0 +1,45 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from utils.db import database_path
+
+
+class Command(BaseCommand):
+    """
+    Management command copying the SQLite primary database into its replicas.
+
+    Each replica listed in DATABASE_REPLICAS is overwritten in place with the
+    online backup API, so readers connected to it see the new copy on their
+    next query. The copies use a rollback journal, which read-only
+    connections can open without write access to the directory.
+    """
+
+    help = "Copy the primary SQLite database into the SQLite read replicas."
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != "sqlite":
+            raise CommandError("The primary database is not SQLite.")
+
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if connections[alias].vendor == "sqlite"]
+        if not replicas:
+            self.stdout.write("No SQLite replicas are configured.")
+            return
+
+        source = sqlite3.connect(database_path(primary.settings_dict["NAME"]))
+        try:
+            for alias in replicas:
+                path = database_path(connections[alias].settings_dict["NAME"])
+                target = sqlite3.connect(path)
+                try:
+                    source.backup(target)
+                    target.execute("PRAGMA journal_mode = DELETE")
+                finally:
+                    target.close()
+                self.stdout.write(f"Copied the primary database to {alias} ({path}).")
+        finally:
+            source.close()
+
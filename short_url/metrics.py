@@ -0,0 +1,52 @@
+import os
+import socket
+
+from utils.metrics import sample
+
+from .analytics import click_events
+from .bloom import key_filter
+from .cache import resolve_cache
+from .clicks import click_buffer
+
+
+def collect_metrics():
+    """
+    Returns the resolve cache, key filter and click buffer counters as metric samples.
+
+    Registered with utils.metrics.request_metrics in ShortUrlConfig.ready().
+
+    Returns:
+        list: (name, type, help, value) tuples.
+    """
+
+    cache = resolve_cache.stats()
+    clicks = click_buffer.stats()
+    events = click_events.stats()
+    samples = [
+        ("short_url_resolve_cache_hits_total", "counter", "Resolve cache hits.", cache["hits"]),
+        ("short_url_resolve_cache_misses_total", "counter", "Resolve cache misses.", cache["misses"]),
+        ("short_url_resolve_cache_evictions_total", "counter", "Resolve cache evictions.", cache["evictions"]),
+        ("short_url_resolve_cache_entries", "gauge", "Entries held in the resolve cache.", cache["size"]),
+        ("short_url_clicks_pending", "gauge", "Clicks buffered but not yet written.", clicks["pending"]),
+        ("short_url_clicks_flushed_total", "counter", "Clicks written to click_count.", clicks["flushed"]),
+        ("short_url_click_events_buffered", "gauge", "Click events waiting to be written.", events["buffered"]),
+        ("short_url_click_events_written_total", "counter", "Click events written to the sink.", events["written"]),
+        ("short_url_click_events_dropped_total", "counter", "Click events dropped because the buffer was full.", events["dropped"]),
+        ("short_url_click_events_failed_total", "counter", "Click events lost to sink errors.", events["failed"]),
+    ]
+
+    bloom = key_filter.stats()
+    if bloom["built"]:
+        samples += [
+            ("short_url_key_filter_keys", "gauge", "Short keys held in the key filter.", bloom["keys"]),
+            ("short_url_key_filter_memory_bytes", "gauge", "Memory used by the key filter.", bloom["memory_bytes"]),
+            ("short_url_key_filter_capacity", "gauge", "Short keys the key filter is sized for.", bloom["capacity"]),
+            # a rate is not summed across workers, so each worker reports its own
+            (
+                sample("short_url_key_filter_estimated_error_rate", worker=f"{socket.gethostname()}-{os.getpid()}"),
+                "gauge",
+                "Estimated false positive rate of the key filter.",
+                bloom["estimated_error_rate"],
+            ),
+        ]
+    return samples
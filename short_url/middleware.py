@@ -0,0 +1,80 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.urls import Resolver404, resolve
+
+from .cache import aresolve_short_key, resolve_short_key
+
+
+REDIRECT_VIEW_NAME = "short_url:redirect_original_url"
+
+
+class PublicRedirectMiddleware:
+    """
+    Serve public short key redirects before the rest of the middleware stack.
+
+    Placed right after SecurityMiddleware, this middleware resolves the request
+    path and, when it targets the redirect view for a link that is not
+    owner_only, calls the view directly. The session, CSRF, authentication and
+    message middleware never run for those requests, so a redirect costs the
+    short key lookup only (no query at all on a resolve cache hit).
+
+    Owner-only links, and every other URL, continue down the normal stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        match = self.match_redirect(request)
+        if match is None:
+            return self.get_response(request)
+
+        resolved = resolve_short_key(match.kwargs["short_key"])
+        if resolved is not None and resolved.owner_only:
+            return self.get_response(request)
+
+        request.resolver_match = match
+        return match.func(request, *match.args, **match.kwargs)
+
+    async def __acall__(self, request):
+        match = self.match_redirect(request)
+        if match is None:
+            return await self.get_response(request)
+
+        resolved = await aresolve_short_key(match.kwargs["short_key"])
+        if resolved is not None and resolved.owner_only:
+            return await self.get_response(request)
+
+        request.resolver_match = match
+        view = match.func
+        if not iscoroutinefunction(view):
+            view = sync_to_async(view)
+        return await view(request, *match.args, **match.kwargs)
+
+    def match_redirect(self, request):
+        """
+        Resolve the request path if it targets the redirect view.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            ResolverMatch: The match for a GET or HEAD redirect request, or None.
+        """
+
+        if request.method not in ("GET", "HEAD"):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.view_name != REDIRECT_VIEW_NAME:
+            return None
+        return match
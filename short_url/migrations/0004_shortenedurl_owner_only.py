@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0003_shortenedurl_expiration_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shortenedurl',
+            name='owner_only',
+            field=models.BooleanField(default=False),
+        ),
+    ]
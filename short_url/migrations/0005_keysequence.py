@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+def create_short_key_sequence(apps, schema_editor):
+    KeySequence = apps.get_model('short_url', 'KeySequence')
+    KeySequence.objects.using(schema_editor.connection.alias).get_or_create(name='short_key')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0004_shortenedurl_owner_only'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeySequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_short_key_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 05:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0005_keysequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRCodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('data', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('shortened_url', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='qr_jobs', to='short_url.shortenedurl')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='qrcodejob',
+            index=models.Index(fields=['status', 'run_after'], name='short_url_q_status_8979e0_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0006_qrcodejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shortenedurl',
+            index=models.Index(fields=['user', 'created_at'], name='short_url_s_user_id_577df6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shortenedurl',
+            index=models.Index(fields=['user', 'click_count'], name='short_url_s_user_id_f825ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shortenedurl',
+            index=models.Index(fields=['user', 'expiration_date'], name='short_url_s_user_id_aea6eb_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0007_shortenedurl_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('short_key', models.CharField(max_length=10)),
+                ('occurred_at', models.DateTimeField()),
+                ('referrer', models.CharField(blank=True, max_length=512)),
+                ('user_agent', models.CharField(blank=True, max_length=512)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='clickevent',
+            index=models.Index(fields=['short_key', 'occurred_at'], name='short_url_c_short_k_420b39_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0008_clickevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shortenedurl',
+            index=models.Index(fields=['expiration_date'], name='short_url_s_expirat_8e10b8_idx'),
+        ),
+    ]
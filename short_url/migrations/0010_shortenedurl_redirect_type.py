@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0009_shortenedurl_expiration_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shortenedurl',
+            name='redirect_type',
+            field=models.PositiveSmallIntegerField(choices=[(302, 'Temporary (302)'), (307, 'Temporary, keeping the method (307)'), (301, 'Permanent (301)'), (308, 'Permanent, keeping the method (308)')], default=302),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+from short_url.urlnorm import url_hash
+
+
+def fill_url_hashes(apps, schema_editor):
+    ShortenedURL = apps.get_model('short_url', 'ShortenedURL')
+    rows = ShortenedURL.objects.using(schema_editor.connection.alias).only('id', 'original_url').order_by('pk')
+    last_pk = 0
+    while batch := list(rows.filter(pk__gt=last_pk)[:2000]):
+        for shortened_url in batch:
+            shortened_url.url_hash = url_hash(shortened_url.original_url)
+        ShortenedURL.objects.using(schema_editor.connection.alias).bulk_update(batch, ['url_hash'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('short_url', '0010_shortenedurl_redirect_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shortenedurl',
+            name='url_hash',
+            field=models.CharField(default='', editable=False, max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='shortenedurl',
+            index=models.Index(fields=['user', 'url_hash'], name='short_url_s_user_id_c273ac_idx'),
+        ),
+        migrations.RunPython(fill_url_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 06:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+        ('short_url', '0011_shortenedurl_url_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLinkStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='link_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('link_count', models.BigIntegerField(default=0)),
+                ('click_count', models.BigIntegerField(default=0)),
+                ('expiry_counts', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
@@ -1,8 +1,16 @@
 from django.db import models
+from django.templatetags.static import static
+from django.utils import timezone
 
 from user.models import User
 from utils.models import DateTimeAbstract
 
+from .urlnorm import url_hash
+
+QR_PLACEHOLDER_IMAGE = "img/qr-placeholder.svg"
+
+# number of days a new shortened URL stays valid
+DEFAULT_EXPIRY_DAYS = 5
 
 
 class ShortenedURL(DateTimeAbstract):
@@ -21,16 +29,32 @@ class ShortenedURL(DateTimeAbstract):
         click_count (int): The number of times the shortened URL has been clicked.
         qr_code (ImageField): The QR code image associated with the shortened URL.
         expiration_date (DateField): The expiration date of the shortened URL.
+        owner_only (bool): Whether only the owner may follow the shortened URL; other links redirect anyone without a session.
+        redirect_type (int): HTTP status of the redirect. Permanent redirects (301, 308) may be cached by browsers and proxies for long.
+        url_hash (str): Hash of the normalized original URL, kept up to date by save(), to find a user's existing link to a URL.
 
     Methods:
         __str__(): Returns a string representation of the shortened URL instance.
         increase_click_count(): Increases the click count of the shortened URL.
         get_qr_image: Returns the URL of the QR code image associated with the shortened URL.
+        find_reusable(): Returns a user's live links to the given URL hashes.
 
     Inherits:
         DateTimeAbstract: Abstract model containing created_at and updated_at fields.
     """
 
+    FOUND = 302
+    TEMPORARY_REDIRECT = 307
+    MOVED_PERMANENTLY = 301
+    PERMANENT_REDIRECT = 308
+    REDIRECT_TYPE_CHOICES = [
+        (FOUND, "Temporary (302)"),
+        (TEMPORARY_REDIRECT, "Temporary, keeping the method (307)"),
+        (MOVED_PERMANENTLY, "Permanent (301)"),
+        (PERMANENT_REDIRECT, "Permanent, keeping the method (308)"),
+    ]
+    PERMANENT_REDIRECT_TYPES = (MOVED_PERMANENTLY, PERMANENT_REDIRECT)
+
     original_url = models.URLField()
     short_key = models.CharField(max_length=10, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -38,7 +62,21 @@ class ShortenedURL(DateTimeAbstract):
     click_count = models.PositiveIntegerField(default=0)
     qr_code = models.ImageField(upload_to="shorted_url/qr/", blank=True, null=True)
     expiration_date = models.DateField(blank=True, null=True)
+    owner_only = models.BooleanField(default=False)
+    redirect_type = models.PositiveSmallIntegerField(choices=REDIRECT_TYPE_CHOICES, default=FOUND)
+    url_hash = models.CharField(max_length=32, default="", editable=False)
 
+    class Meta:
+        # serve the keyset-paginated list of a user's URLs for each sort order
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "click_count"]),
+            models.Index(fields=["user", "expiration_date"]),
+            # find expired URLs across all users for the expiry sweeper
+            models.Index(fields=["expiration_date"]),
+            # find a user's existing link to a URL instead of creating a duplicate
+            models.Index(fields=["user", "url_hash"]),
+        ]
 
     def __str__(self):
         """
@@ -49,28 +87,242 @@ class ShortenedURL(DateTimeAbstract):
         """
 
         return self.short_key
-    
+
+    def save(self, *args, **kwargs):
+        """
+        Save the shortened URL, refreshing url_hash from original_url.
+
+        bulk_create does not call save(), so callers creating links in bulk
+        set url_hash themselves.
+        """
+
+        self.url_hash = url_hash(self.original_url)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "original_url" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "url_hash"}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def find_reusable(cls, user, url_hashes, owner_only=False, redirect_type=FOUND):
+        """
+        Find the user's live links to any of the given URLs with the same visibility and redirect type.
+
+        Served by the (user, url_hash) index.
+
+        Args:
+            user (User): The owner.
+            url_hashes (list): url_hash values of the URLs being shortened.
+            owner_only (bool): The visibility the new link would have.
+            redirect_type (int): The redirect status the new link would have.
+
+        Returns:
+            dict: url_hash -> (short key, expiration date) of the most recent matching link.
+        """
+
+        rows = (
+            cls.objects.filter(user=user, url_hash__in=url_hashes, owner_only=owner_only, redirect_type=redirect_type)
+            .filter(models.Q(expiration_date__isnull=True) | models.Q(expiration_date__gte=timezone.localdate()))
+            .order_by("pk")
+            .values_list("url_hash", "short_key", "expiration_date")
+        )
+        return {row_hash: (short_key, expiration_date) for row_hash, short_key, expiration_date in rows}
+
     def increase_click_count(self):
         """
         Increases the click count of the shortened URL.
+
+        The increment is done in the database so concurrent clicks are not lost
+        and the other columns, including updated_at, are left untouched.
         """
 
+        ShortenedURL.objects.filter(pk=self.pk).update(click_count=models.F("click_count") + 1)
         self.click_count += 1
-        self.save()
 
     @property
     def get_qr_image(self):
         """
         Returns the URL of the QR code image associated with the shortened URL.
 
+        QR codes are rendered in the background, so a placeholder image is
+        returned until the QR code job has finished.
+
         Returns:
             str: The URL of the QR code image.
         """
 
         url = None
         if not self.qr_code:
-            url = None
+            url = static(QR_PLACEHOLDER_IMAGE)
         else:
             url = self.qr_code.url
         return url
 
+
+class KeySequence(models.Model):
+    """
+    Model holding a named, monotonically increasing counter.
+
+    Worker processes reserve blocks of values from the counter to build short
+    keys without coordinating with each other (see short_url.keygen).
+
+    Attributes:
+        name (str): The name of the sequence.
+        next_value (int): The first value that has not been handed out yet.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """
+        Returns a string representation of the sequence.
+
+        Returns:
+            str: The name of the sequence.
+        """
+
+        return self.name
+
+
+class QRCodeJob(DateTimeAbstract):
+    """
+    Model representing a pending or finished QR code rendering job.
+
+    Jobs are persisted so they survive restarts. A worker claims a job by
+    moving it to RUNNING; a job whose worker died is claimed again once its
+    lease (locked_at) has gone stale. Failed attempts are retried with backoff.
+
+    Attributes:
+        shortened_url (ShortenedURL): The shortened URL the QR code is rendered for.
+        data (str): The text encoded in the QR code.
+        status (str): One of PENDING, RUNNING, DONE or FAILED.
+        attempts (int): The number of times the job has been claimed.
+        run_after (datetime): The job is not claimed before this moment.
+        locked_at (datetime): When the job was last claimed, or None.
+        last_error (str): The error raised by the last failed attempt.
+
+    Inherits:
+        DateTimeAbstract: Abstract model containing created_at and updated_at fields.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    shortened_url = models.ForeignKey(ShortenedURL, on_delete=models.CASCADE, related_name="qr_jobs")
+    data = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        """
+        Returns a string representation of the job.
+
+        Returns:
+            str: The id of the shortened URL and the job status.
+        """
+
+        return f"QR code for {self.shortened_url_id} ({self.status})"
+
+
+class ClickEvent(models.Model):
+    """
+    Model representing a single redirect, recorded for analytics.
+
+    Rows are only ever appended, in batches, by short_url.analytics. The short
+    key is stored as text rather than a foreign key so events outlive the
+    shortened URL and inserting them never touches the ShortenedURL table.
+
+    Attributes:
+        short_key (str): The short key that was followed.
+        occurred_at (datetime): When the redirect happened.
+        referrer (str): The Referer header, truncated.
+        user_agent (str): The User-Agent header, truncated.
+        ip_address (str): The client address, or None.
+    """
+
+    short_key = models.CharField(max_length=10)
+    occurred_at = models.DateTimeField()
+    referrer = models.CharField(max_length=512, blank=True)
+    user_agent = models.CharField(max_length=512, blank=True)
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["short_key", "occurred_at"])]
+
+    def __str__(self):
+        """
+        Returns a string representation of the click event.
+
+        Returns:
+            str: The short key and the time of the click.
+        """
+
+        return f"{self.short_key} at {self.occurred_at}"
+
+
+class UserLinkStats(models.Model):
+    """
+    Model holding a user's link totals, maintained incrementally by short_url.stats.
+
+    The totals change with each link created or deleted and with each click
+    flush, so the list page reads them with one primary key lookup instead
+    of aggregating the user's links. Expiry is tracked as a count of links
+    per expiration date, from which the active and expired totals are
+    derived at read time. `manage.py rebuild_link_stats` recomputes rows
+    from the links.
+
+    Attributes:
+        user (User): The owner of the links, also the primary key.
+        link_count (int): Number of links the user owns.
+        click_count (int): Sum of the click counts of those links.
+        expiry_counts (dict): ISO expiration date -> number of links expiring that day.
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="link_stats")
+    link_count = models.BigIntegerField(default=0)
+    click_count = models.BigIntegerField(default=0)
+    expiry_counts = models.JSONField(default=dict)
+
+    def __str__(self):
+        """
+        Returns a string representation of the stats.
+
+        Returns:
+            str: The owner and link count.
+        """
+
+        return f"{self.user_id}: {self.link_count} links"
+
+    def summary(self, today=None):
+        """
+        Returns the totals shown on the list page.
+
+        Args:
+            today (date): The day links are judged expired against, defaults to today.
+
+        Returns:
+            dict: links, clicks, active and expired.
+        """
+
+        today = (today or timezone.localdate()).isoformat()
+        expired = sum(count for day, count in self.expiry_counts.items() if day < today)
+        return {
+            "links": self.link_count,
+            "clicks": self.click_count,
+            "active": self.link_count - expired,
+            "expired": expired,
+        }
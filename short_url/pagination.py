@@ -0,0 +1,141 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a queryset, ordered by one field and the primary key.
+
+    Each page is fetched with ``WHERE (field, id) past the cursor ORDER BY
+    field, id LIMIT n``, which an index on the sort field serves directly,
+    so every page costs the same no matter how deep it is. Cursors are
+    opaque, URL-safe strings encoding the sort value and id of the last row
+    of the previous page.
+
+    Attributes:
+        sorts (dict): Sort name -> (field name, "asc" or "desc").
+        queryset (QuerySet): The rows to paginate.
+        sort (str): The active sort name.
+        per_page (int): Number of rows per page.
+    """
+
+    sorts = {
+        "created": ("created_at", "desc"),
+        "clicks": ("click_count", "desc"),
+        "expiry": ("expiration_date", "asc"),
+    }
+
+    def __init__(self, queryset, sort="created", per_page=50):
+        self.queryset = queryset
+        self.sort = sort if sort in self.sorts else "created"
+        self.per_page = per_page
+        self.field, self.direction = self.sorts[self.sort]
+        self.nullable = queryset.model._meta.get_field(self.field).null
+
+    def page(self, cursor=None):
+        """
+        Fetch the page following a cursor.
+
+        Args:
+            cursor (str): The cursor returned with the previous page, or None for the first page.
+
+        Returns:
+            tuple: (list of rows, cursor of the next page or None).
+        """
+
+        queryset = self.order(self.queryset)
+        position = self.decode(cursor)
+        if position is not None:
+            queryset = queryset.filter(self.after(*position))
+
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            last = rows[-1]
+            next_cursor = self.encode(getattr(last, self.field), last.pk)
+        return rows, next_cursor
+
+    def order(self, queryset):
+        """
+        Apply the sort order, with the primary key as tie breaker and nulls last.
+
+        Args:
+            queryset (QuerySet): The queryset to order.
+
+        Returns:
+            QuerySet: The ordered queryset.
+        """
+
+        nulls_last = True if self.nullable else None
+        if self.direction == "desc":
+            return queryset.order_by(F(self.field).desc(nulls_last=nulls_last), "-pk")
+        return queryset.order_by(F(self.field).asc(nulls_last=nulls_last), "pk")
+
+    def after(self, value, pk):
+        """
+        Build the filter selecting the rows that come after a position.
+
+        Args:
+            value: The sort value of the last row seen.
+            pk (int): The primary key of the last row seen.
+
+        Returns:
+            Q: The filter.
+        """
+
+        field = self.field
+        if value is None:
+            pk_lookup = "pk__lt" if self.direction == "desc" else "pk__gt"
+            return Q(**{f"{field}__isnull": True, pk_lookup: pk})
+
+        value_lookup, pk_lookup = ("lt", "pk__lt") if self.direction == "desc" else ("gt", "pk__gt")
+        # the redundant bound lets the database seek to the cursor instead of scanning up to it
+        bound = Q(**{f"{field}__{value_lookup}e": value})
+        condition = bound & (Q(**{f"{field}__{value_lookup}": value}) | Q(**{field: value, pk_lookup: pk}))
+        if self.nullable:
+            condition |= Q(**{f"{field}__isnull": True})
+        return condition
+
+    def encode(self, value, pk):
+        """
+        Encode a position as a cursor.
+
+        Args:
+            value: The sort value of the last row of the page.
+            pk (int): The primary key of the last row of the page.
+
+        Returns:
+            str: The cursor.
+        """
+
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        payload = json.dumps([self.sort, value, pk], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    def decode(self, cursor):
+        """
+        Decode a cursor produced by encode for the same sort.
+
+        Args:
+            cursor (str): The cursor.
+
+        Returns:
+            tuple: (sort value, primary key), or None for a missing or invalid cursor.
+        """
+
+        if not cursor:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            sort, value, pk = json.loads(payload)
+            if sort != self.sort:
+                return None
+            field = self.queryset.model._meta.get_field(self.field)
+            return (None if value is None else field.to_python(value)), int(pk)
+        except (ValueError, TypeError, ValidationError):
+            return None
@@ -0,0 +1,121 @@
+import math
+import time
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.http.response import HttpResponseRedirectBase
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from .models import ShortenedURL
+
+
+class ShortURLRedirect(HttpResponseRedirectBase):
+    """
+    Redirect response with the status chosen per shortened URL (301, 302, 307 or 308).
+    """
+
+    def __init__(self, redirect_to, status=302, *args, **kwargs):
+        super().__init__(redirect_to, *args, **kwargs)
+        self.status_code = status
+
+
+def parse_redirect_type(value, default=ShortenedURL.FOUND):
+    """
+    Returns the redirect status submitted in a form, or ``default`` if it is missing or not allowed.
+    """
+
+    try:
+        redirect_type = int(value)
+    except (TypeError, ValueError):
+        return default
+    return redirect_type if redirect_type in dict(ShortenedURL.REDIRECT_TYPE_CHOICES) else default
+
+
+def redirect_max_age(resolved, now=None):
+    """
+    Returns how long browsers and proxies may reuse a redirect without asking again.
+
+    Permanent redirects may be cached for SHORT_URL_PERMANENT_REDIRECT_MAX_AGE
+    seconds, temporary ones for SHORT_URL_REDIRECT_MAX_AGE, which also bounds
+    how long an edit of the target takes to reach clients. Neither outlives
+    the expiration date of the link.
+
+    Args:
+        resolved (ResolvedURL): The link being followed.
+        now (float): The current unix time, defaults to time.time().
+
+    Returns:
+        int: The max-age in seconds, 0 when the redirect must be revalidated.
+    """
+
+    if resolved.is_permanent:
+        max_age = getattr(settings, "SHORT_URL_PERMANENT_REDIRECT_MAX_AGE", 31536000)
+    else:
+        max_age = getattr(settings, "SHORT_URL_REDIRECT_MAX_AGE", 300)
+    expires_at = resolved.expires_at()
+    if expires_at is not None:
+        max_age = min(max_age, math.floor(expires_at - (now or time.time())))
+    return max(0, max_age)
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Returns whether a conditional GET matches the current version of a redirect.
+
+    Django's own conditional handling only applies to 2xx responses, so the
+    If-None-Match (weak comparison) and If-Modified-Since checks are done
+    here. If-None-Match takes precedence, as in RFC 9110.
+
+    Args:
+        request: The HTTP request object.
+        etag (str): The quoted ETag of the redirect.
+        last_modified (int): The unix time the link was last saved.
+
+    Returns:
+        bool: True if the client's cached redirect is still current.
+    """
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return "*" in etags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in etags)
+    if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def redirect_response(request, resolved):
+    """
+    Build the redirect for a live shortened URL, or a 304 if the client's copy is still current.
+
+    The response carries an ETag and Last-Modified derived from updated_at,
+    so once max-age runs out a client or proxy revalidates with a
+    conditional GET and gets a body-less 304 when the link is unchanged.
+    Owner-only links are only cached by the owner's browser.
+
+    Args:
+        request: The HTTP request object.
+        resolved (ResolvedURL): The link being followed.
+
+    Returns:
+        HttpResponse: The redirect or a 304 Not Modified.
+    """
+
+    response = ShortURLRedirect(resolved.original_url, resolved.redirect_type)
+    if resolved.owner_only:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=redirect_max_age(resolved))
+    if resolved.updated_at is None:
+        return response
+
+    etag = quote_etag(f"{resolved.redirect_type}-{resolved.updated_at.timestamp():.6f}")
+    last_modified = int(resolved.updated_at.timestamp())
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    if request.method in ("GET", "HEAD") and is_not_modified(request, etag, last_modified):
+        not_modified = HttpResponseNotModified()
+        for header in ("Cache-Control", "ETag", "Last-Modified"):
+            not_modified.headers[header] = response.headers[header]
+        return not_modified
+    return response
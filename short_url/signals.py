@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .bloom import key_filter
+from .cache import resolve_cache
+from .models import ShortenedURL
+from .stats import update_link_stats
+
+
+@receiver(post_save, sender=ShortenedURL)
+@receiver(post_delete, sender=ShortenedURL)
+def invalidate_resolve_cache(sender, instance, **kwargs):
+    """
+    Drop the cached redirect target whenever a shortened URL is saved or deleted.
+    """
+
+    resolve_cache.invalidate(instance.short_key)
+
+
+@receiver(post_save, sender=ShortenedURL)
+def add_to_key_filter(sender, instance, created, **kwargs):
+    """
+    Record newly created short keys in the process-local key filter.
+    """
+
+    if created:
+        key_filter.add(instance.short_key)
+
+
+@receiver(post_delete, sender=ShortenedURL)
+def discard_from_key_filter(sender, instance, **kwargs):
+    """
+    Forget deleted short keys in the process-local key filter.
+    """
+
+    key_filter.discard(instance.short_key, instance.pk)
+
+
+@receiver(post_save, sender=ShortenedURL)
+def count_created_link(sender, instance, created, **kwargs):
+    """
+    Add a newly created link to its owner's UserLinkStats.
+    """
+
+    if created:
+        update_link_stats(instance.user_id, links=1, clicks=instance.click_count, expiry={instance.expiration_date: 1})
+
+
+@receiver(post_delete, sender=ShortenedURL)
+def count_deleted_link(sender, instance, **kwargs):
+    """
+    Remove a deleted link, and its clicks, from its owner's UserLinkStats.
+    """
+
+    update_link_stats(
+        instance.user_id,
+        links=-1,
+        clicks=-instance.click_count,
+        expiry={instance.expiration_date: -1},
+        create=False,
+    )
@@ -0,0 +1,160 @@
+import threading
+
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from user.models import User
+
+from .models import ShortenedURL, UserLinkStats
+
+
+# users recomputed per transaction by rebuild_link_stats
+REBUILD_BATCH_SIZE = 500
+
+_batch = threading.local()
+
+
+def update_link_stats(user_id, links=0, clicks=0, expiry=None, create=True):
+    """
+    Add changes to a user's stats row, in the caller's transaction.
+
+    Call it after the change has been written to ShortenedURL. A user
+    without a stats row yet gets one rebuilt from their links, which
+    already include the change, so links created before stats were kept
+    are counted too. With ``create`` off, a missing row is left missing,
+    which is what a deletion wants: the owner may be being deleted too.
+
+    The counters are updated with a single UPDATE first, so the row is
+    write-locked before the expiry counts are read and written back.
+
+    Args:
+        user_id (int): The owner of the changed links.
+        links (int): Change of the link count.
+        clicks (int): Change of the click count.
+        expiry (dict): Expiration date -> change of the number of links expiring that day.
+        create (bool): Whether to create a missing row.
+    """
+
+    # str() of a date is its ISO form; views may also hold the date as an ISO string
+    expiry = {str(day): change for day, change in (expiry or {}).items() if day is not None and change}
+    pending = getattr(_batch, "changes", None)
+    if pending is not None:
+        change = pending.setdefault((user_id, create), [0, 0, Counter()])
+        change[0] += links
+        change[1] += clicks
+        change[2].update(expiry)
+        return
+
+    with transaction.atomic():
+        updated = UserLinkStats.objects.filter(pk=user_id).update(
+            link_count=F("link_count") + links,
+            click_count=F("click_count") + clicks,
+        )
+        if not updated:
+            if create:
+                rebuild_link_stats([user_id])
+            return
+        if not expiry:
+            return
+
+        stats = UserLinkStats.objects.only("expiry_counts").get(pk=user_id)
+        counts = Counter(stats.expiry_counts)
+        counts.update(expiry)
+        stats.expiry_counts = {day: count for day, count in sorted(counts.items()) if count > 0}
+        stats.save(update_fields=["expiry_counts"])
+
+
+@contextmanager
+def batched_link_stats():
+    """
+    Context manager collecting the update_link_stats() calls made inside it
+    and applying them once per user on exit, e.g. for the post_delete
+    signals of a queryset delete. Use it inside the transaction making the
+    changes. Nothing is applied if the block raises.
+    """
+
+    if getattr(_batch, "changes", None) is not None:
+        yield
+        return
+
+    _batch.changes = {}
+    try:
+        yield
+        changes = _batch.changes
+    finally:
+        _batch.changes = None
+    for (user_id, create), (links, clicks, expiry) in changes.items():
+        update_link_stats(user_id, links, clicks, expiry, create)
+
+
+def rebuild_link_stats(user_ids=None):
+    """
+    Recompute stats rows from the links, for some users or all of them.
+
+    Users are processed in batches, each in its own transaction.
+
+    Args:
+        user_ids (list): The users to recompute, or None for every user.
+
+    Returns:
+        int: Number of rows written.
+    """
+
+    if user_ids is None:
+        user_ids = User.objects.order_by("pk").values_list("pk", flat=True).iterator()
+
+    written = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            written += _rebuild_batch(batch)
+            batch = []
+    if batch:
+        written += _rebuild_batch(batch)
+    return written
+
+
+def _rebuild_batch(user_ids):
+    with transaction.atomic():
+        links = ShortenedURL.objects.filter(user_id__in=user_ids)
+        totals = {
+            row["user_id"]: row
+            for row in links.values("user_id").annotate(links=Count("pk"), clicks=Sum("click_count"))
+        }
+        expiry = {}
+        for row in links.filter(expiration_date__isnull=False).values("user_id", "expiration_date").annotate(links=Count("pk")):
+            expiry.setdefault(row["user_id"], {})[row["expiration_date"].isoformat()] = row["links"]
+
+        for user_id in user_ids:
+            total = totals.get(user_id, {})
+            UserLinkStats.objects.update_or_create(
+                user_id=user_id,
+                defaults={
+                    "link_count": total.get("links", 0),
+                    "click_count": total.get("clicks") or 0,
+                    "expiry_counts": dict(sorted(expiry.get(user_id, {}).items())),
+                },
+            )
+    return len(user_ids)
+
+
+def link_stats_for(user):
+    """
+    Returns the list page totals of a user: one primary key read, or a rebuild the first time.
+
+    Args:
+        user (User): The user.
+
+    Returns:
+        dict: links, clicks, active and expired.
+    """
+
+    stats = UserLinkStats.objects.filter(pk=user.pk).first()
+    if stats is None:
+        rebuild_link_stats([user.pk])
+        stats = UserLinkStats.objects.get(pk=user.pk)
+    return stats.summary()
@@ -0,0 +1,173 @@
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import QRCodeJob, ShortenedURL
+from .utils import GenerateQR
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def qr_settings():
+    """
+    Returns the QR job settings with their defaults.
+
+    Returns:
+        dict: worker, max_attempts, retry_delay, lease and format.
+    """
+
+    return {
+        "worker": getattr(settings, "SHORT_URL_QR_WORKER", "thread"),
+        "max_attempts": getattr(settings, "SHORT_URL_QR_MAX_ATTEMPTS", 5),
+        "retry_delay": getattr(settings, "SHORT_URL_QR_RETRY_DELAY", 30),
+        "lease": getattr(settings, "SHORT_URL_QR_LEASE", 300),
+        "format": getattr(settings, "SHORT_URL_QR_FORMAT", "png"),
+    }
+
+
+def enqueue_qr_code(shortened_url, data):
+    """
+    Queue the rendering of a QR code for a shortened URL.
+
+    The job is stored in the database. With SHORT_URL_QR_WORKER set to
+    "thread" it is also handed to an in-process thread pool once the current
+    transaction commits; with "command" it waits for ``manage.py process_qr_jobs``.
+
+    Args:
+        shortened_url (ShortenedURL): The shortened URL to render a QR code for.
+        data (str): The text to encode in the QR code.
+
+    Returns:
+        QRCodeJob: The queued job.
+    """
+
+    job = QRCodeJob.objects.create(shortened_url=shortened_url, data=data)
+    if qr_settings()["worker"] == "thread":
+        transaction.on_commit(_submit_to_pool)
+    return job
+
+
+def enqueue_qr_codes(shortened_urls, data):
+    """
+    Queue the QR codes of many shortened URLs with a single bulk insert.
+
+    Args:
+        shortened_urls (list): Saved ShortenedURL instances.
+        data (list): The text to encode for each shortened URL, in the same order.
+
+    Returns:
+        list: The queued jobs.
+    """
+
+    jobs = QRCodeJob.objects.bulk_create(
+        [QRCodeJob(shortened_url=shortened_url, data=text) for shortened_url, text in zip(shortened_urls, data)]
+    )
+    if jobs and qr_settings()["worker"] == "thread":
+        transaction.on_commit(_submit_to_pool)
+    return jobs
+
+
+def _submit_to_pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-worker")
+    _executor.submit(_drain_in_thread)
+
+
+def _drain_in_thread():
+    try:
+        process_jobs()
+    except Exception:
+        logger.exception("QR code worker failed")
+    finally:
+        close_old_connections()
+
+
+def claim_next_job():
+    """
+    Claim the next runnable job, or a job whose lease has expired.
+
+    The claim is a conditional UPDATE, so concurrent workers never run the
+    same job twice.
+
+    Returns:
+        QRCodeJob: The claimed job, or None if nothing is runnable.
+    """
+
+    now = timezone.now()
+    stale = now - timedelta(seconds=qr_settings()["lease"])
+    runnable = QRCodeJob.objects.filter(
+        Q(status=QRCodeJob.PENDING, run_after__lte=now) | Q(status=QRCodeJob.RUNNING, locked_at__lt=stale)
+    )
+
+    for job in runnable.order_by("run_after")[:10]:
+        claimed = QRCodeJob.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+            status=QRCodeJob.RUNNING, locked_at=now, attempts=F("attempts") + 1
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job):
+    """
+    Render and store the QR code of a claimed job, recording the outcome.
+
+    Failed jobs are retried with exponential backoff until
+    SHORT_URL_QR_MAX_ATTEMPTS is reached, then marked FAILED.
+
+    Args:
+        job (QRCodeJob): A job claimed with claim_next_job.
+
+    Returns:
+        bool: True if the QR code was stored.
+    """
+
+    options = qr_settings()
+    try:
+        generator = GenerateQR()
+        name = generator.store(job.data, fmt=options["format"])[generator.box_size]
+        ShortenedURL.objects.filter(pk=job.shortened_url_id).update(qr_code=name, updated_at=timezone.now())
+    except Exception as error:
+        logger.exception("QR code job %s failed", job.pk)
+        if job.attempts >= options["max_attempts"]:
+            status, run_after = QRCodeJob.FAILED, job.run_after
+        else:
+            status = QRCodeJob.PENDING
+            run_after = timezone.now() + timedelta(seconds=options["retry_delay"] * 2 ** (job.attempts - 1))
+        QRCodeJob.objects.filter(pk=job.pk).update(status=status, run_after=run_after, locked_at=None, last_error=repr(error))
+        return False
+
+    QRCodeJob.objects.filter(pk=job.pk).update(status=QRCodeJob.DONE, locked_at=None, last_error="")
+    return True
+
+
+def process_jobs(max_jobs=None):
+    """
+    Run jobs until none is runnable or ``max_jobs`` have been processed.
+
+    Args:
+        max_jobs (int): The maximum number of jobs to run, or None for no limit.
+
+    Returns:
+        int: The number of jobs processed.
+    """
+
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
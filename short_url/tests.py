@@ -1,3 +1,782 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from user.models import User
+from utils.routers import PIN_COOKIE, ReplicaRouter, replica_reads
+
+from .analytics import ClickEventBuffer, FileSink, click_events
+from .bloom import CountingBloomFilter, ShortKeyFilter, key_filter
+from .bulk import BulkShortener, iter_json_array
+from .cache import resolve_cache, resolve_short_key
+from .expiry import ExpirySweeper, extend_expiry
+from .export import LinkExport
+from .clicks import click_buffer
+from .metrics import collect_metrics
+from .models import ShortenedURL, UserLinkStats
+from .pagination import KeysetPaginator
+from .redirects import redirect_max_age
+from .stats import batched_link_stats, rebuild_link_stats
+
+
+REPLICA = "test_replica"
+
+
+def make_user(email="owner@example.com"):
+    user = User.objects.create_user("Owner", email, "pw-Owner-123")
+    user.is_active = True
+    user.save()
+    return user
+
+
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA],
+    SHORT_URL_QR_WORKER="command",
+    RATE_LIMIT_ENABLED=False,
+    ALLOWED_HOSTS=["testserver"],
+)
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    ReplicaRouter against a file copy of the test database, standing in for a lagging replica.
+
+    The replica is registered after the test case has set up its databases,
+    so Django does not create, flush or guard it. Rows created after the
+    copy exist only on the primary.
+    """
+
+    databases = {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        resolve_cache.clear()
+        self.user = make_user()
+        ShortenedURL.objects.create(original_url="http://example.com/copied", short_key="copied", user=self.user)
+
+        self.directory = tempfile.mkdtemp()
+        self.replica_path = os.path.join(self.directory, "replica.sqlite3")
+        self.copy_primary()
+        connections.settings[REPLICA] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            REPLICA: {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": f"file:{self.replica_path}?mode=ro",
+                "OPTIONS": {"uri": True},
+            },
+        })[REPLICA]
+
+        ShortenedURL.objects.create(original_url="http://example.com/late", short_key="late", user=self.user)
+        key_filter.rebuild()
+        self.router = ReplicaRouter()
+
+    def tearDown(self):
+        # write buffered clicks while the test database still exists
+        click_buffer.flush()
+        click_events.flush()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(self.directory)
+        resolve_cache.clear()
+
+    def copy_primary(self):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        target = sqlite3.connect(self.replica_path)
+        try:
+            primary.connection.backup(target)
+            target.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            target.close()
+
+    def test_reads_outside_replica_reads_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(ShortenedURL))
+        self.assertTrue(ShortenedURL.objects.filter(short_key="late").exists())
+
+    def test_replica_reads_are_served_by_the_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(ShortenedURL), REPLICA)
+            with CaptureQueriesContext(connections[REPLICA]) as queries:
+                keys = set(ShortenedURL.objects.values_list("short_key", flat=True))
+        self.assertEqual(keys, {"copied"})
+        self.assertEqual(len(queries), 1)
+
+    def test_write_pins_later_reads_to_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(ShortenedURL), DEFAULT_DB_ALIAS)
+            self.assertIsNone(self.router.db_for_read(ShortenedURL))
+            ShortenedURL.objects.create(original_url="http://example.com/new", short_key="new", user=self.user)
+            self.assertTrue(ShortenedURL.objects.filter(short_key="new").exists())
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        os.remove(self.replica_path)
+        self.router.health.check_interval = 0
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(ShortenedURL))
+
+    def test_write_sets_pin_cookie_and_pinned_client_reads_primary(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.post("/create", {"long_url": "http://example.com/fresh-link", "custom_url": "freshkey"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        self.assertContains(client.get("/list"), "fresh-link")
+
+        other = Client()
+        other.force_login(self.user)
+        other.cookies.pop(PIN_COOKIE, None)
+        self.assertNotContains(other.get("/list"), "fresh-link")
+
+    def test_redirect_missing_on_replica_falls_back_to_primary(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            response = Client().get("/late/")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "http://example.com/late")
+        self.assertEqual(len(replica_queries), 1)
+
+        response = Client().get("/copied/")
+        self.assertEqual(response["Location"], "http://example.com/copied")
+
+
+@override_settings(
+    SHORT_URL_QR_WORKER="command",
+    RATE_LIMIT_ENABLED=False,
+    ALLOWED_HOSTS=["testserver"],
+    SHORT_URL_REDIRECT_MAX_AGE=300,
+    SHORT_URL_PERMANENT_REDIRECT_MAX_AGE=365 * 24 * 3600,
+)
+class RedirectCachingTests(TransactionTestCase):
+    """
+    Status, Cache-Control and validators of the redirects served for short keys.
+    """
+
+    databases = {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        resolve_cache.clear()
+        self.user = make_user()
+
+    def tearDown(self):
+        click_buffer.flush()
+        click_events.flush()
+        resolve_cache.clear()
+
+    def create(self, short_key, redirect_type=ShortenedURL.FOUND, expiration_date=None, **kwargs):
+        return ShortenedURL.objects.create(
+            original_url=f"http://example.com/{short_key}",
+            short_key=short_key,
+            user=self.user,
+            redirect_type=redirect_type,
+            expiration_date=expiration_date,
+            **kwargs,
+        )
+
+    def max_age(self, response):
+        return int(re.search(r"max-age=(\d+)", response["Cache-Control"]).group(1))
+
+    def test_status_follows_the_redirect_type_of_each_link(self):
+        for redirect_type, _ in ShortenedURL.REDIRECT_TYPE_CHOICES:
+            self.create(f"type{redirect_type}", redirect_type)
+
+        for redirect_type, _ in ShortenedURL.REDIRECT_TYPE_CHOICES:
+            response = Client().get(f"/type{redirect_type}/")
+            self.assertEqual(response.status_code, redirect_type)
+            self.assertEqual(response["Location"], f"http://example.com/type{redirect_type}")
+
+    def test_permanent_redirects_are_cached_longer(self):
+        self.create("temporary", ShortenedURL.FOUND)
+        self.create("permanent", ShortenedURL.MOVED_PERMANENTLY)
+
+        temporary = Client().get("/temporary/")
+        permanent = Client().get("/permanent/")
+        self.assertIn("public", temporary["Cache-Control"])
+        self.assertEqual(self.max_age(temporary), 300)
+        self.assertEqual(self.max_age(permanent), 365 * 24 * 3600)
+
+    def test_max_age_is_capped_at_the_expiration_date(self):
+        self.create("soon", ShortenedURL.PERMANENT_REDIRECT, expiration_date=timezone.localdate())
+
+        before = time.time()
+        response = Client().get("/soon/")
+        expires_at = resolve_cache.get("soon").expires_at()
+        self.assertEqual(response.status_code, 308)
+        self.assertGreater(self.max_age(response), 0)
+        self.assertLessEqual(self.max_age(response), expires_at - before)
+
+    def test_max_age_is_zero_for_a_resolved_link_past_its_expiry(self):
+        self.create("late", ShortenedURL.MOVED_PERMANENTLY, expiration_date=timezone.localdate())
+        resolved = resolve_short_key("late")
+        self.assertEqual(redirect_max_age(resolved, now=resolved.expires_at() + 1), 0)
+
+    def test_owner_only_redirects_are_private(self):
+        self.create("mine", ShortenedURL.MOVED_PERMANENTLY, owner_only=True)
+        client = Client()
+        client.force_login(self.user)
+
+        response = client.get("/mine/")
+        self.assertEqual(response.status_code, 301)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertNotIn("public", response["Cache-Control"])
+
+    def test_etag_changes_with_the_redirect_type_and_updated_at(self):
+        link = self.create("edited")
+        first = Client().get("/edited/")["ETag"]
+        self.assertEqual(Client().get("/edited/")["ETag"], first)
+
+        link.redirect_type = ShortenedURL.TEMPORARY_REDIRECT
+        link.save()
+        second = Client().get("/edited/")["ETag"]
+        self.assertNotEqual(second, first)
+
+        link.original_url = "http://example.com/elsewhere"
+        link.save()
+        self.assertNotIn(Client().get("/edited/")["ETag"], (first, second))
+
+    def test_if_none_match_gets_a_304(self):
+        link = self.create("cached", ShortenedURL.MOVED_PERMANENTLY)
+        response = Client().get("/cached/")
+        etag = response["ETag"]
+
+        not_modified = Client().get("/cached/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], etag)
+        self.assertEqual(not_modified["Cache-Control"], response["Cache-Control"])
+        self.assertEqual(not_modified.content, b"")
+        self.assertEqual(Client().get("/cached/", HTTP_IF_NONE_MATCH=f"W/{etag}").status_code, 304)
+
+        link.original_url = "http://example.com/moved"
+        link.save()
+        changed = Client().get("/cached/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 301)
+        self.assertEqual(changed["Location"], "http://example.com/moved")
+
+    def test_if_modified_since_gets_a_304(self):
+        self.create("dated")
+        last_modified = Client().get("/dated/")["Last-Modified"]
+
+        self.assertEqual(Client().get("/dated/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        earlier = http_date(time.time() - 3600)
+        self.assertEqual(Client().get("/dated/", HTTP_IF_MODIFIED_SINCE=earlier).status_code, 302)
+
+
+class CachingProxy:
+    """
+    Stand-in for a shared HTTP cache in front of the origin.
+
+    Stores public responses for their max-age, measured on a clock the test
+    advances, and revalidates stale ones with If-None-Match.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.now = 0
+        self.store = {}
+        self.origin_requests = 0
+        self.revalidations = 0
+
+    def get(self, path):
+        entry = self.store.get(path)
+        if entry and self.now < entry["fresh_until"]:
+            return entry["response"]
+
+        headers = {"HTTP_IF_NONE_MATCH": entry["response"]["ETag"]} if entry else {}
+        response = self.client.get(path, **headers)
+        self.origin_requests += 1
+        if response.status_code == 304:
+            self.revalidations += 1
+            response = entry["response"]
+
+        max_age = re.search(r"max-age=(\d+)", response["Cache-Control"])
+        if "public" in response["Cache-Control"] and max_age:
+            self.store[path] = {"response": response, "fresh_until": self.now + int(max_age.group(1))}
+        return response
+
+
+@override_settings(
+    SHORT_URL_QR_WORKER="command",
+    RATE_LIMIT_ENABLED=False,
+    ALLOWED_HOSTS=["testserver"],
+    SHORT_URL_REDIRECT_MAX_AGE=300,
+)
+class RedirectProxyTests(TransactionTestCase):
+    """
+    Redirects served through a stand-in caching proxy.
+    """
+
+    databases = {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        resolve_cache.clear()
+        self.user = make_user()
+        self.link = ShortenedURL.objects.create(original_url="http://example.com/proxied", short_key="proxied", user=self.user)
+        self.proxy = CachingProxy(Client())
+
+    def tearDown(self):
+        click_buffer.flush()
+        click_events.flush()
+        resolve_cache.clear()
+
+    def test_fresh_redirects_never_reach_the_origin(self):
+        for _ in range(10):
+            self.assertEqual(self.proxy.get("/proxied/")["Location"], "http://example.com/proxied")
+        self.assertEqual(self.proxy.origin_requests, 1)
+
+    def test_stale_redirects_are_revalidated_with_a_304(self):
+        self.proxy.get("/proxied/")
+        self.proxy.now += 301
+        response = self.proxy.get("/proxied/")
+        self.proxy.get("/proxied/")
+
+        self.assertEqual(response["Location"], "http://example.com/proxied")
+        self.assertEqual(self.proxy.origin_requests, 2)
+        self.assertEqual(self.proxy.revalidations, 1)
+
+    def test_edits_reach_the_proxy_after_max_age(self):
+        self.proxy.get("/proxied/")
+        self.link.original_url = "http://example.com/edited"
+        self.link.save()
+
+        self.assertEqual(self.proxy.get("/proxied/")["Location"], "http://example.com/proxied")
+        self.proxy.now += 301
+        self.assertEqual(self.proxy.get("/proxied/")["Location"], "http://example.com/edited")
+        self.assertEqual(self.proxy.revalidations, 0)
+
+    def test_owner_only_redirects_are_not_stored(self):
+        self.link.owner_only = True
+        self.link.save()
+        client = Client()
+        client.force_login(self.user)
+        proxy = CachingProxy(client)
+
+        proxy.get("/proxied/")
+        proxy.get("/proxied/")
+        self.assertEqual(proxy.origin_requests, 2)
+        self.assertEqual(proxy.store, {})
+
+
+@override_settings(SHORT_URL_QR_WORKER="command", RATE_LIMIT_ENABLED=False, ALLOWED_HOSTS=["testserver"])
+class CreateDedupeTests(TestCase):
+    """
+    Shortening a URL the user already has a live link to.
+    """
+
+    def setUp(self):
+        self.user = make_user()
+        self.client.force_login(self.user)
+        self.client.post("/create", {"long_url": "http://example.com/again"})
+        self.link = ShortenedURL.objects.get()
+
+    def test_hit_is_a_single_lookup_without_writes(self):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.post("/create", {"long_url": "http://example.com/again"})
+
+        self.assertContains(response, f"/{self.link.short_key}")
+        self.assertContains(response, "valid until")
+        link_queries = [query["sql"] for query in queries if "short_url_" in query["sql"]]
+        self.assertEqual(len(link_queries), 1)
+        self.assertTrue(link_queries[0].startswith("SELECT"))
+        self.assertEqual(ShortenedURL.objects.count(), 1)
+
+    def test_hit_extends_an_earlier_expiry(self):
+        ShortenedURL.objects.filter(pk=self.link.pk).update(expiration_date=timezone.localdate())
+
+        self.client.post("/create", {"long_url": "http://example.com/again"})
+        self.link.refresh_from_db()
+        self.assertGreater(self.link.expiration_date, timezone.localdate())
+
+    def test_dedupe_off_creates_a_new_link(self):
+        self.client.post("/create", {"long_url": "http://example.com/again", "dedupe": "0"})
+        self.assertEqual(ShortenedURL.objects.count(), 2)
+
+
+class IterJsonArrayTests(SimpleTestCase):
+    """
+    Incremental parsing of JSON arrays split across reads.
+    """
+
+    document = '[12345678, "http://example.com/a b", 1.5e10, -0.25E-3, true, {"long_url": "x", "n": [1, 2]}, null, 9]'
+
+    def parse(self, text, read_size):
+        return list(iter_json_array(io.StringIO(text), read_size))
+
+    def test_every_read_size_gives_the_same_elements(self):
+        expected = [12345678, "http://example.com/a b", 1.5e10, -0.25e-3, True, {"long_url": "x", "n": [1, 2]}, None, 9]
+        for read_size in range(1, len(self.document) + 2):
+            with self.subTest(read_size=read_size):
+                self.assertEqual(self.parse(self.document, read_size), expected)
+
+    def test_whitespace_and_empty_array(self):
+        self.assertEqual(self.parse(" \n[ ]\n", 1), [])
+        self.assertEqual(self.parse("[\n 1 ,\n 2 \n]", 2), [1, 2])
+
+    def test_invalid_input_is_reported(self):
+        for text, message in [
+            ("{}", "Expected a JSON array."),
+            ("", "Expected a JSON array."),
+            ("[1, 2", "Unterminated JSON array."),
+            ("[1 2]", "Expected , or ] in JSON array."),
+            ("[1-2]", "Expected , or ] in JSON array."),
+            ('["open', "Invalid JSON array."),
+        ]:
+            for read_size in (1, 3, 65536):
+                with self.subTest(text=text, read_size=read_size):
+                    with self.assertRaisesMessage(ValueError, message):
+                        self.parse(text, read_size)
+
+
+class CountingBloomFilterTests(SimpleTestCase):
+    """
+    Adding, removing and saturating the counters of the Bloom filter.
+    """
+
+    def test_added_keys_are_found_and_discarded_keys_are_not(self):
+        bloom = CountingBloomFilter(1000)
+        keys = [f"key{number}" for number in range(500)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertEqual(bloom.count, 500)
+
+        for key in keys[:250]:
+            bloom.discard(key)
+        self.assertTrue(all(key in bloom for key in keys[250:]))
+        self.assertLess(sum(key in bloom for key in keys[:250]), 25)
+        self.assertEqual(bloom.count, 250)
+
+    def test_discarding_an_absent_key_changes_nothing(self):
+        bloom = CountingBloomFilter(100)
+        bloom.add("present")
+        counters = bytes(bloom._counters)
+
+        bloom.discard("absent")
+        self.assertEqual(bytes(bloom._counters), counters)
+        self.assertEqual(bloom.count, 1)
+
+    def test_saturated_counters_never_give_false_negatives(self):
+        bloom = CountingBloomFilter(100)
+        for _ in range(300):
+            bloom.add("hot")
+        bloom.add("other")
+        self.assertTrue(all(bloom._counters[index] == 255 for index in bloom._indexes("hot")))
+
+        for _ in range(300):
+            bloom.discard("hot")
+        # counters stuck at 255 are never decremented, so keys sharing them stay present
+        self.assertIn("hot", bloom)
+        self.assertIn("other", bloom)
+
+    def test_false_positive_rate_stays_near_target_at_capacity(self):
+        bloom = CountingBloomFilter(2000, error_rate=0.01)
+        for number in range(2000):
+            bloom.add(f"in{number}")
+        false_positives = sum(f"out{number}" in bloom for number in range(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+        self.assertAlmostEqual(bloom.false_positive_rate(), 0.01, delta=0.005)
+
+
+class ShortKeyFilterForkTests(SimpleTestCase):
+    """
+    A process forked while the parent's filter lock is held.
+    """
+
+    def test_child_gets_a_new_lock_and_an_empty_filter(self):
+        short_key_filter = ShortKeyFilter(min_capacity=10)
+        short_key_filter._bloom = CountingBloomFilter(10)
+        short_key_filter._last_id = 42
+        held, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with short_key_filter._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        held.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                # would block forever on the inherited lock without the fork check
+                short_key_filter.add("child")
+                ok = short_key_filter.stats() == {"built": False} and short_key_filter._last_id == 0
+                os._exit(0 if ok else 1)
+
+            deadline = time.monotonic() + 10
+            while True:
+                done, status = os.waitpid(pid, os.WNOHANG)
+                if done or time.monotonic() > deadline:
+                    break
+                time.sleep(0.01)
+            if not done:
+                os.kill(pid, 9)
+                os.waitpid(pid, 0)
+                self.fail("The forked child deadlocked on the filter lock.")
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(short_key_filter._last_id, 42)
+
+
+class KeyFilterMetricsTests(SimpleTestCase):
+    """
+    Key filter samples exported on /metrics.
+    """
+
+    def test_capacity_and_per_worker_error_rate_are_exported(self):
+        stats = {
+            "built": True, "keys": 10, "capacity": 100, "memory_bytes": 959, "hash_count": 7,
+            "target_error_rate": 0.01, "estimated_error_rate": 0.002,
+        }
+        with mock.patch.object(key_filter, "stats", return_value=stats):
+            samples = {name: (kind, value) for name, kind, _, value in collect_metrics()}
+
+        self.assertEqual(samples["short_url_key_filter_capacity"], ("gauge", 100))
+        rate = [name for name in samples if name.startswith("short_url_key_filter_estimated_error_rate{worker=")]
+        self.assertEqual(len(rate), 1)
+        self.assertEqual(samples[rate[0]], ("gauge", 0.002))
+
+
+class ClickEventBufferTests(SimpleTestCase):
+    """
+    Recording click events and counting the ones the sink loses.
+    """
+
+    class ListSink:
+        def __init__(self):
+            self.events = []
+
+        def write(self, events):
+            self.events.extend(events)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def request(self, **meta):
+        return RequestFactory().get("/key/", REMOTE_ADDR="10.0.0.1", HTTP_USER_AGENT="agent", **meta)
+
+    def test_client_address_is_read_like_the_rate_limiter(self):
+        sink = self.ListSink()
+        events = ClickEventBuffer(sink, flush_interval=3600, ip_header="HTTP_X_FORWARDED_FOR", trusted_proxies=1)
+        events.record("key", self.request(HTTP_X_FORWARDED_FOR="6.6.6.6, 203.0.113.7"))
+        events.record("key", self.request())
+        events.flush()
+
+        self.assertEqual([event[4] for event in sink.events], ["203.0.113.7", "10.0.0.1"])
+        self.assertEqual(sink.events[0][3], "agent")
+
+    def test_file_sink_writes_json_lines(self):
+        path = os.path.join(self.directory, "clicks.log")
+        events = ClickEventBuffer(FileSink(path), flush_interval=3600)
+        events.record("key", self.request())
+        events.flush()
+
+        with open(path, encoding="utf-8") as log:
+            self.assertIn('"ip_address": "10.0.0.1"', log.read())
+        self.assertEqual((events.written, events.failed), (1, 0))
+
+    def test_file_sink_errors_are_counted_as_failed(self):
+        # the log path is a directory, so opening it for writing fails
+        events = ClickEventBuffer(FileSink(self.directory), flush_interval=3600)
+        events.record("key", self.request())
+        events.record("key", self.request())
+        with self.assertLogs("short_url.analytics", "ERROR"):
+            events.flush()
+
+        self.assertEqual((events.written, events.failed), (0, 2))
+
+
+class LinkExportTests(TestCase):
+    """
+    Chunking of streamed exports.
+    """
+
+    def setUp(self):
+        self.user = make_user()
+        ShortenedURL.objects.bulk_create([
+            ShortenedURL(original_url=f"http://example.com/{number}", short_key=f"exp{number}", user=self.user, url_hash=str(number))
+            for number in range(5)
+        ])
+        self.queryset = ShortenedURL.objects.filter(user=self.user)
+
+    def test_first_row_is_sent_before_the_first_batch(self):
+        for format, first_lines in (("csv", 1), ("ndjson", 1)):
+            with self.subTest(format=format):
+                chunks = list(LinkExport(self.queryset, format=format, rows_per_write=200))
+                self.assertEqual(chunks[0].count("\n"), first_lines)
+                self.assertEqual(len(chunks), 2)
+                self.assertEqual("".join(chunks).count("\n"), 6 if format == "csv" else 5)
+
+    def test_ndjson_rows_are_batched_after_the_first(self):
+        chunks = list(LinkExport(self.queryset, format="ndjson", rows_per_write=2))
+        self.assertEqual([chunk.count("\n") for chunk in chunks], [1, 2, 2])
+        self.assertEqual(json.loads(chunks[0].splitlines()[0])["short_key"], "exp0")
+
+    def test_empty_ndjson_export_is_empty(self):
+        self.assertEqual(list(LinkExport(ShortenedURL.objects.none(), format="ndjson")), [])
+
+
+@override_settings(SHORT_URL_QR_WORKER="command")
+class ExpirySweeperTests(TestCase):
+    """
+    Archiving and deleting expired links.
+    """
+
+    def test_archive_holds_every_column_of_the_removed_rows(self):
+        user = make_user()
+        yesterday = timezone.localdate() - timedelta(days=1)
+        ShortenedURL.objects.create(
+            original_url="http://example.com/old", short_key="old", user=user,
+            expiration_date=yesterday, redirect_type=ShortenedURL.PERMANENT_REDIRECT,
+        )
+        ShortenedURL.objects.create(original_url="http://example.com/live", short_key="live", user=user)
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as archive:
+            self.assertEqual(ExpirySweeper(archive=archive).run(), 1)
+            archive.seek(0)
+            rows = [json.loads(line) for line in archive]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(set(rows[0]), {field.attname for field in ShortenedURL._meta.concrete_fields})
+        self.assertEqual(rows[0]["redirect_type"], 308)
+        self.assertTrue(rows[0]["url_hash"])
+        self.assertEqual(list(ShortenedURL.objects.values_list("short_key", flat=True)), ["live"])
+
+
+class DescendingExpiryPaginator(KeysetPaginator):
+    sorts = {**KeysetPaginator.sorts, "expiry": ("expiration_date", "desc")}
+
+
+class KeysetPaginatorTests(TestCase):
+    """
+    Walking every sort page by page, across ties and NULL expiration dates.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = make_user()
+        today = timezone.localdate()
+        days = [today, today + timedelta(days=1), None, today + timedelta(days=2)]
+        ShortenedURL.objects.bulk_create(
+            ShortenedURL(
+                original_url=f"http://example.com/{number}",
+                short_key=f"page{number}",
+                user=user,
+                expiration_date=days[number % len(days)],
+                click_count=number % 3,
+            )
+            for number in range(22)
+        )
+
+    def walk(self, paginator):
+        keys = []
+        cursor = None
+        while True:
+            rows, cursor = paginator.page(cursor)
+            keys.extend(row.short_key for row in rows)
+            if cursor is None:
+                return keys
+
+    def assert_walks_in_order(self, paginator_class, sort):
+        expected = list(paginator_class(ShortenedURL.objects.all(), sort).order(ShortenedURL.objects.all()).values_list("short_key", flat=True))
+        self.assertEqual(len(expected), 22)
+        for per_page in range(1, 8):
+            with self.subTest(sort=sort, per_page=per_page):
+                self.assertEqual(self.walk(paginator_class(ShortenedURL.objects.all(), sort, per_page)), expected)
+
+    def test_every_sort_visits_each_row_once_in_order(self):
+        for sort in KeysetPaginator.sorts:
+            self.assert_walks_in_order(KeysetPaginator, sort)
+
+    def test_null_expiry_comes_last_in_both_directions(self):
+        for paginator_class in (KeysetPaginator, DescendingExpiryPaginator):
+            self.assert_walks_in_order(paginator_class, "expiry")
+            keys = self.walk(paginator_class(ShortenedURL.objects.all(), "expiry", 4))
+            dates = dict(ShortenedURL.objects.values_list("short_key", "expiration_date"))
+            values = [dates[key] for key in keys]
+            self.assertEqual(values[-5:], [None] * 5)
+            known = values[:-5]
+            self.assertEqual(known, sorted(known, reverse=paginator_class is DescendingExpiryPaginator))
+
+    def test_foreign_or_invalid_cursor_starts_over(self):
+        paginator = KeysetPaginator(ShortenedURL.objects.all(), "expiry", 5)
+        first, _ = paginator.page()
+        _, clicks_cursor = KeysetPaginator(ShortenedURL.objects.all(), "clicks", 5).page()
+
+        for cursor in (clicks_cursor, "not-a-cursor", "W10"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(paginator.page(cursor)[0], first)
+
+
+@override_settings(SHORT_URL_QR_WORKER="command", RATE_LIMIT_ENABLED=False, ALLOWED_HOSTS=["testserver"])
+class UserLinkStatsTests(TestCase):
+    """
+    Incrementally maintained UserLinkStats against a rebuild from the links.
+    """
+
+    def setUp(self):
+        self.user = make_user()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        click_buffer.flush()
+
+    def assert_matches_rebuild(self):
+        kept = UserLinkStats.objects.get(pk=self.user.pk)
+        rebuild_link_stats([self.user.pk])
+        rebuilt = UserLinkStats.objects.get(pk=self.user.pk)
+        self.assertEqual(
+            (kept.link_count, kept.click_count, kept.expiry_counts),
+            (rebuilt.link_count, rebuilt.click_count, rebuilt.expiry_counts),
+        )
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertEqual(kept.summary(tomorrow), rebuilt.summary(tomorrow))
+
+    def test_writes_keep_the_stats_in_step(self):
+        self.client.post("/create", {"long_url": "http://example.com/view"})
+        self.client.post("/create", {"long_url": "http://example.com/view", "dedupe": "0"})
+        ShortenedURL.objects.create(original_url="http://example.com/orm", short_key="orm", user=self.user, expiration_date=None)
+        ShortenedURL.objects.create(original_url="http://example.com/taken", short_key="taken", user=make_user("other@example.com"))
+        self.assert_matches_rebuild()
+
+        shortener = BulkShortener(self.user, "http://testserver")
+        results = list(shortener.run(["http://example.com/bulk/1", "http://example.com/bulk/2", "http://example.com/view"]))
+        self.assertEqual([result["status"] for result in results], ["created", "created", "existing"])
+        # the filter misses the taken key, so the bulk insert conflicts and falls back to row by row
+        with mock.patch.object(key_filter, "might_exist", return_value=False):
+            results = list(shortener.run([{"long_url": "http://example.com/bulk/3", "custom_url": "taken"}, "http://example.com/bulk/4"]))
+        self.assertEqual([result["status"] for result in results], ["error", "created"])
+        self.assert_matches_rebuild()
+
+        ShortenedURL.objects.filter(user=self.user).exclude(expiration_date=None).update(expiration_date=timezone.localdate())
+        rebuild_link_stats([self.user.pk])
+        keys = list(ShortenedURL.objects.filter(user=self.user, expiration_date__isnull=False).values_list("short_key", flat=True))
+        self.assertEqual(extend_expiry(self.user, keys[:3], timezone.localdate() + timedelta(days=30)), 3)
+        self.assert_matches_rebuild()
+
+        for short_key in keys[:4]:
+            click_buffer.add(short_key, 2)
+        click_buffer.add("orm", 5)
+        click_buffer.flush()
+        self.assert_matches_rebuild()
+
+        self.client.get(f"/delete/{keys[0]}/")
+        ShortenedURL.objects.get(short_key="orm").delete()
+        with batched_link_stats():
+            ShortenedURL.objects.filter(short_key__in=keys[1:3]).delete()
+        self.assert_matches_rebuild()
+        self.assertEqual(UserLinkStats.objects.get(pk=self.user.pk).link_count, 2)
@@ -0,0 +1,57 @@
+import hashlib
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """
+    Returns a canonical form of a URL, so equivalent spellings compare equal.
+
+    The scheme and host are lowercased, the scheme's default port is dropped,
+    an empty path becomes "/" and other paths lose their trailing slashes,
+    and query parameters are sorted. The fragment is kept.
+
+    Args:
+        url (str): An absolute URL.
+
+    Returns:
+        str: The normalized URL.
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    netloc = parts.netloc.lower()
+    try:
+        port = parts.port
+        valid_port = True
+    except ValueError:
+        # malformed port: only lowercase the netloc
+        valid_port = False
+    if parts.hostname is not None and valid_port:
+        host = f"[{parts.hostname}]" if ":" in parts.hostname else parts.hostname
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{port}"
+        userinfo = parts.netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{host}" if userinfo else host
+
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, parts.fragment))
+
+
+def url_hash(url):
+    """
+    Returns the fixed-width hash of a URL's normalized form.
+
+    Args:
+        url (str): An absolute URL.
+
+    Returns:
+        str: 32 hexadecimal characters.
+    """
+
+    return hashlib.blake2b(normalize_url(url).encode(), digest_size=16).hexdigest()
@@ -1,12 +1,18 @@
+from django.conf import settings
 from django.urls import path
-from .views import ListURLSView, URLShortenView, RedirectOriginalURLView, DeleteShortedURLView, UpdateShortenedURLView
+from .views import ListURLSView, URLShortenView, BulkShortenView, ExportURLsView, RedirectOriginalURLView, AsyncRedirectOriginalURLView, DeleteShortedURLView, UpdateShortenedURLView
 
 app_name = "short_url"
 
+# ASGI workers serve redirects from the event loop, WSGI workers from a plain sync view
+redirect_view = AsyncRedirectOriginalURLView if settings.SHORT_URL_ASYNC_REDIRECT else RedirectOriginalURLView
+
 urlpatterns = [
     path("list", ListURLSView.as_view(),  name="url_lists"),
     path("create", URLShortenView.as_view(),  name="url_create"),
-    path('<str:short_key>/', RedirectOriginalURLView.as_view(), name='redirect_original_url'),
+    path("bulk", BulkShortenView.as_view(),  name="bulk_create"),
+    path("export", ExportURLsView.as_view(),  name="url_export"),
+    path('<str:short_key>/', redirect_view.as_view(), name='redirect_original_url'),
     path('delete/<str:short_key>/', DeleteShortedURLView.as_view(), name='delete_shorted_url'),
     path('update/<str:short_key>/', UpdateShortenedURLView.as_view(), name='update_shorted_url'),
 ]
@@ -1,41 +1,188 @@
-import qrcode
+import hashlib
 from io import BytesIO
-import base64
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+# qrcode and PIL are imported on first render, so processes that never draw a QR code
+# (redirect-only workers, management commands) do not pay for loading them
+ERROR_CORRECTION_LEVELS = {
+    "L": "ERROR_CORRECT_L",
+    "M": "ERROR_CORRECT_M",
+    "Q": "ERROR_CORRECT_Q",
+    "H": "ERROR_CORRECT_H",
+}
+
+# content-addressed QR images live next to the ones ShortenedURL.qr_code used to upload
+QR_STORAGE_DIR = "shorted_url/qr"
+
 
 class GenerateQR:
     """
     Class to generate QR code images.
 
+    The QR matrix is computed once per payload and can then be rendered at
+    several sizes, as PNG or compact SVG, straight to bytes. Stored images are
+    content addressed by a hash of (data, size, border, error correction,
+    format), so an identical payload is never encoded twice.
+
     Attributes:
-        None
+        box_size (int): Pixels per QR module for the default size.
+        border (int): Width of the quiet zone, in modules.
+        error_correction (str): Error correction level, one of L, M, Q or H.
     """
 
-    def generate_qr_code(self, data, *args, **kwargs):
+    def __init__(self, box_size=10, border=4, error_correction="L"):
+        self.box_size = box_size
+        self.border = border
+        self.error_correction = error_correction
+
+    def matrix(self, data):
         """
-        Generate a QR code image in base64 format from the provided data.
+        Compute the QR module matrix for the provided data, quiet zone included.
 
         Args:
             data (str): The data to be encoded into the QR code.
 
         Returns:
-            str: The base64 encoded image data of the generated QR code.
+            list: Rows of booleans, True for a dark module.
         """
 
+        import qrcode
+
         qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
+            error_correction=getattr(qrcode.constants, ERROR_CORRECTION_LEVELS[self.error_correction]),
+            border=self.border,
         )
-
         qr.add_data(data)
         qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
+        return qr.get_matrix()
+
+    def render_png(self, matrix, box_size):
+        """
+        Render a module matrix as PNG bytes.
+
+        Args:
+            matrix (list): The matrix returned by matrix().
+            box_size (int): Pixels per module.
+
+        Returns:
+            bytes: The PNG image.
+        """
+
+        from PIL import Image
+
+        modules = len(matrix)
+        img = Image.new("1", (modules, modules), 1)
+        img.putdata([0 if dark else 1 for row in matrix for dark in row])
+        img = img.resize((modules * box_size, modules * box_size), Image.NEAREST)
 
         img_buffer = BytesIO()
-        img.save(img_buffer, format="PNG")
-        img_buffer.seek(0)
+        img.save(img_buffer, format="PNG", optimize=True)
+        return img_buffer.getvalue()
+
+    def render_svg(self, matrix, box_size):
+        """
+        Render a module matrix as a compact SVG, one path of horizontal runs.
+
+        Args:
+            matrix (list): The matrix returned by matrix().
+            box_size (int): Pixels per module.
+
+        Returns:
+            bytes: The SVG document.
+        """
+
+        modules = len(matrix)
+        runs = []
+        for y, row in enumerate(matrix):
+            x = 0
+            while x < modules:
+                if not row[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < modules and row[x]:
+                    x += 1
+                runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+
+        size = modules * box_size
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+            f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+            f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+            f'<path fill="#000" d="{"".join(runs)}"/></svg>'
+        ).encode()
 
-        base64_image = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+    def render(self, data, sizes=None, fmt="png"):
+        """
+        Render the QR code for the provided data at one or more sizes.
+
+        Args:
+            data (str): The data to be encoded into the QR code.
+            sizes (list): Box sizes to render; defaults to [box_size].
+            fmt (str): "png" or "svg".
+
+        Returns:
+            dict: Box size -> image bytes, all rendered from a single matrix.
+        """
+
+        matrix = self.matrix(data)
+        render = self.render_svg if fmt == "svg" else self.render_png
+        return {size: render(matrix, size) for size in sizes or [self.box_size]}
+
+    def generate_qr_code(self, data, *args, **kwargs):
+        """
+        Generate a PNG QR code image from the provided data.
+
+        Args:
+            data (str): The data to be encoded into the QR code.
+
+        Returns:
+            bytes: The raw PNG image data of the generated QR code.
+        """
+
+        return self.render(data)[self.box_size]
+
+    def storage_name(self, data, box_size, fmt="png"):
+        """
+        Returns the content-addressed storage name of a QR image.
+
+        Args:
+            data (str): The data encoded into the QR code.
+            box_size (int): Pixels per module.
+            fmt (str): "png" or "svg".
+
+        Returns:
+            str: The storage name, unique for the rendering inputs.
+        """
+
+        digest = hashlib.sha256(
+            f"{data}\0{box_size}\0{self.border}\0{self.error_correction}\0{fmt}".encode()
+        ).hexdigest()
+        return f"{QR_STORAGE_DIR}/{digest[:2]}/{digest}.{fmt}"
+
+    def store(self, data, sizes=None, fmt="png", storage=default_storage):
+        """
+        Render the QR code into storage, reusing images rendered before.
+
+        The matrix is only computed if at least one size is missing.
+
+        Args:
+            data (str): The data to be encoded into the QR code.
+            sizes (list): Box sizes to store; defaults to [box_size].
+            fmt (str): "png" or "svg".
+            storage (Storage): The storage to write to.
+
+        Returns:
+            dict: Box size -> storage name.
+        """
 
-        return base64_image
+        sizes = sizes or [self.box_size]
+        names = {size: self.storage_name(data, size, fmt) for size in sizes}
+        missing = [size for size, name in names.items() if not storage.exists(name)]
+        if missing:
+            for size, image in self.render(data, missing, fmt).items():
+                names[size] = storage.save(names[size], ContentFile(image))
+        return names
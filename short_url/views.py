@@ -1,27 +1,101 @@
-import string
-import random
-import base64
-
 from datetime import datetime, timedelta
+from time import perf_counter
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.sites.models import Site
-from django.core.files.base import ContentFile
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import IntegrityError, router, transaction
 from django.shortcuts import render, redirect
-from django.http import HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, StreamingHttpResponse
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from .models import ShortenedURL
-from .utils import GenerateQR
+from utils.routers import replica_reads
+from utils.streaming import streaming_content
+
+from .analytics import click_events
+from .bloom import key_filter
+from .bulk import BulkShortener, iter_ndjson, parse_rows
+from .cache import aresolve_short_key, resolve_short_key
+from .expiry import extend_expiry
+from .export import LinkExport
+from .clicks import click_buffer
+from .keygen import GENERATED_KEY_ATTEMPTS, key_allocator
+from .models import DEFAULT_EXPIRY_DAYS, ShortenedURL
+from .pagination import KeysetPaginator
+from .redirects import parse_redirect_type, redirect_response
+from .stats import link_stats_for
+from .tasks import enqueue_qr_code
+from .urlnorm import url_hash
+
+
+def dedupe_requested(request):
+    """
+    Returns False when the client opted out of reusing its existing links with ``dedupe=0``.
+
+    The flag is read from the POST data or the query string.
+    """
+
+    value = request.POST.get("dedupe", request.GET.get("dedupe", "1"))
+    return value.lower() not in ("0", "false", "off", "no")
+
+
+def row_fragment_key(url):
+    """
+    Returns the cache key of a row of the URL list, as built by its {% cache %} tag.
+
+    Args:
+        url (ShortenedURL): The listed URL.
+
+    Returns:
+        str: The template fragment cache key.
+    """
+
+    return make_template_fragment_key("url_row", [url.id, url.updated_at, url.click_count])
+
+
+def add_list_profile(response, timings, rows, cached_rows):
+    """
+    Attach the timing breakdown of a list page: a Server-Timing header and an HTML comment.
+
+    Args:
+        response (HttpResponse): The rendered list page.
+        timings (dict): Phase name -> seconds.
+        rows (int): Number of rows on the page.
+        cached_rows (int): Number of those rows served from the fragment cache.
+    """
+
+    response["Server-Timing"] = ", ".join(f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timings.items())
+    phases = ", ".join(f"{phase} {seconds * 1000:.2f} ms" for phase, seconds in timings.items())
+    response.content += f"\n<!-- list profile: {phases}; {rows} rows, {cached_rows} from the fragment cache -->\n".encode()
 
 
 class ListURLSView(LoginRequiredMixin, View):
     """
     View for listing URLs created by the authenticated user.
 
+    URLs are shown a page at a time with keyset pagination: the ``sort``
+    query parameter picks the order (created, clicks or expiry) and ``after``
+    carries the cursor of the previous page. Only the columns the template
+    displays are loaded. The totals above the list come from the user's
+    UserLinkStats row rather than an aggregate over their links.
+
+    Each rendered row is cached, keyed on its id, updated_at and click
+    count, so only rows that changed are rendered again. With DEBUG on, the
+    page carries the time spent querying, reading the totals and rendering.
+
     Attributes:
         model: The model to query for shortened URLs.
+        paginate_by: Number of URLs shown per page.
+        list_fields: Columns loaded for each URL.
     """
+
+    paginate_by = 50
+    list_fields = ["id", "original_url", "short_key", "click_count", "expiration_date", "created_at", "updated_at", "qr_code"]
+
     def get(self, request, *args, **kwargs):
         """
         Handle GET requests to retrieve and display a list of URLs created by the authenticated user.
@@ -34,14 +108,57 @@ class ListURLSView(LoginRequiredMixin, View):
         Returns:
             HttpResponse: The rendered HTML template displaying the list of URLs.
         """
-        urls = ShortenedURL.objects.filter(user=request.user)
-        return render(request, "short_url/list.html", {"urls":urls})
+        timings = {}
+        started = perf_counter()
+        queryset = ShortenedURL.objects.filter(user=request.user).only(*self.list_fields)
+        paginator = KeysetPaginator(queryset, sort=request.GET.get("sort", "created"), per_page=self.paginate_by)
+        with replica_reads():
+            urls, next_cursor = paginator.page(request.GET.get("after"))
+        timings["query"] = perf_counter() - started
+
+        started = perf_counter()
+        stats = link_stats_for(request.user)
+        timings["stats"] = perf_counter() - started
+
+        cached_rows = 0
+        if settings.DEBUG:
+            cache = caches["template_fragments" if "template_fragments" in settings.CACHES else "default"]
+            cached_rows = len(cache.get_many([row_fragment_key(url) for url in urls]))
+
+        # number of rows on the previous pages, carried by the Next link to number the rows
+        try:
+            offset = max(0, int(request.GET.get("offset", 0)))
+        except ValueError:
+            offset = 0
+
+        context = {
+            "urls": urls,
+            "sort": paginator.sort,
+            "next_cursor": next_cursor,
+            "offset": offset,
+            "next_offset": offset + len(urls),
+            "stats": stats,
+            "row_cache_ttl": getattr(settings, "SHORT_URL_ROW_CACHE_TTL", 24 * 3600),
+        }
+        started = perf_counter()
+        response = render(request, "short_url/list.html", context)
+        timings["render"] = perf_counter() - started
+
+        if settings.DEBUG:
+            add_list_profile(response, timings, len(urls), cached_rows)
+        return response
     
 
 class URLShortenView(LoginRequiredMixin, View):
     """
     View for shortening URLs.
 
+    Shortening a URL the user already has a live link to, with the same
+    visibility and redirect type, shows that link instead of creating a
+    new row and QR code, unless a custom key is requested or the form sends
+    ``dedupe=0``. URLs are compared by the hash of their normalized form.
+    The reused link's expiry is extended to what a new link would get.
+
     Attributes:
         model: The model representing a shortened URL.
     """
@@ -57,7 +174,7 @@ class URLShortenView(LoginRequiredMixin, View):
             HttpResponse: The rendered HTML template for creating a shortened URL.
         """
 
-        return render(request, 'short_url/create.html')
+        return render(request, 'short_url/create.html', {"redirect_types": ShortenedURL.REDIRECT_TYPE_CHOICES})
 
     def post(self, request):
         """
@@ -73,51 +190,174 @@ class URLShortenView(LoginRequiredMixin, View):
 
         original_url = request.POST.get('long_url')
         custom_url = request.POST.get('custom_url')
-        expiry_date = (datetime.now() + timedelta(days=5)).strftime('%Y-%m-%d')
-
-        if custom_url and ShortenedURL.objects.filter(custom_url_key=custom_url).exists():
+        owner_only = request.POST.get('owner_only') == 'on'
+        redirect_type = parse_redirect_type(request.POST.get('redirect_type'))
+        expiry_date = (datetime.now() + timedelta(days=DEFAULT_EXPIRY_DAYS)).date()
+
+        custom_url_taken = False
+        if custom_url and key_filter.might_exist(custom_url):
+            with replica_reads():
+                custom_url_taken = ShortenedURL.objects.filter(short_key=custom_url).exists()
+        if custom_url_taken:
             error_message = "Custom URL is already in use. Please choose a different one."
-            return render(request, 'short_url/create.html', {"error_message":error_message})
+            return render(request, 'short_url/create.html', {"error_message":error_message, "redirect_types": ShortenedURL.REDIRECT_TYPE_CHOICES})
 
         if not original_url.startswith('http://') and not original_url.startswith('https://'):
             original_url = 'http://' + original_url
 
+        if not custom_url and dedupe_requested(request):
+            existing = ShortenedURL.find_reusable(request.user, [url_hash(original_url)], owner_only, redirect_type)
+            if existing:
+                short_key, expiration_date = next(iter(existing.values()))
+                if expiration_date is not None and expiration_date < expiry_date:
+                    extend_expiry(request.user, [short_key], expiry_date)
+                    expiration_date = expiry_date
+                context = {
+                    "existing_url": self.short_link(request, short_key),
+                    "existing_expiration_date": expiration_date,
+                    "redirect_types": ShortenedURL.REDIRECT_TYPE_CHOICES,
+                }
+                return render(request, 'short_url/create.html', context)
+
         short_key = custom_url if custom_url else self.generate_short_key()
 
-        shortened_url = ShortenedURL(original_url=original_url, short_key=short_key, user=request.user, custom_url_key=custom_url, expiration_date=expiry_date)
-        shortened_url.save()
+        shortened_url = ShortenedURL(original_url=original_url, short_key=short_key, user=request.user, custom_url_key=custom_url, expiration_date=expiry_date, owner_only=owner_only, redirect_type=redirect_type)
+        for attempt in range(GENERATED_KEY_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    shortened_url.save()
+                break
+            except IntegrityError:
+                if custom_url:
+                    # another worker took the custom key after the filter was last synced
+                    error_message = "Custom URL is already in use. Please choose a different one."
+                    return render(request, 'short_url/create.html', {"error_message":error_message, "redirect_types": ShortenedURL.REDIRECT_TYPE_CHOICES})
+                if attempt == GENERATED_KEY_ATTEMPTS - 1:
+                    raise
+                # someone chose the generated key as their custom key; take the next one
+                shortened_url.short_key = self.generate_short_key()
+
+        # Queue the QR code image for the short url; it is rendered in the background
+        enqueue_qr_code(shortened_url, self.short_link(request, shortened_url.short_key))
 
-        # Generate QR code Image for the short url
-        current_site = Site.objects.get_current()
-        domain = current_site.domain
-        scheme = request.scheme
-        data = f"{scheme}://{domain}/{shortened_url.short_key}"
-        obj = GenerateQR()
-        qr_data = obj.generate_qr_code(data)
-        qr_image_data = base64.b64decode(qr_data)
+        return redirect('short_url:url_lists')
 
-        # Save QR code
-        shortened_url.qr_code.save(f"{shortened_url.short_key}.png", ContentFile(qr_image_data))
+    def short_link(self, request, short_key):
+        """
+        Returns the absolute short link of a short key, as encoded in its QR code.
 
-        return redirect('short_url:url_lists')
+        Args:
+            request: The HTTP request object.
+            short_key (str): The short key.
+
+        Returns:
+            str: The short link.
+        """
+
+        return f"{request.scheme}://{Site.objects.get_current().domain}/{short_key}"
 
     def generate_short_key(self):
         """
         Generate a unique short key for the shortened URL.
 
+        Keys come from a block of sequence numbers reserved by this process,
+        so they never collide with each other. A user may still have picked
+        one as a custom key, in which case post() retries with the next key.
+
         Returns:
             str: The generated short key.
         """
 
-        characters = string.ascii_letters + string.digits
-        short_key = ''.join(random.choice(characters) for _ in range(6))
-        return short_key
+        return key_allocator.next_key()
+
 
+class BulkShortenView(LoginRequiredMixin, View):
+    """
+    View for shortening many URLs in one request.
+
+    The request body is a JSON array (``Content-Type: application/json``) of
+    URLs or ``{"long_url": ..., "custom_url": ...}`` objects, or a CSV file
+    (``Content-Type: text/csv``) with a ``long_url`` and optional
+    ``custom_url`` header. Rows are read, inserted and reported a chunk at a
+    time, so neither the input nor the output is ever held in memory whole.
+    URLs the user already has a link to are reported as "existing" with that
+    link, unless the request has ``?dedupe=0``.
 
-class RedirectOriginalURLView(LoginRequiredMixin, View):
+    Attributes:
+        chunk_size: Number of rows inserted per bulk_create.
+    """
+
+    chunk_size = 500
+
+    def post(self, request):
+        """
+        Handle POST requests to shorten a batch of URLs.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            StreamingHttpResponse: One NDJSON result line per input row.
+            HttpResponse: A 415 response for an unsupported content type.
+        """
+
+        if request.content_type not in ("application/json", "text/csv"):
+            return HttpResponse("Send a JSON array or a CSV file.", status=415)
+
+        base_url = f"{request.scheme}://{Site.objects.get_current().domain}"
+        shortener = BulkShortener(request.user, base_url, chunk_size=self.chunk_size, dedupe=dedupe_requested(request))
+        rows = parse_rows(request, request.content_type)
+        return StreamingHttpResponse(streaming_content(request, iter_ndjson(shortener, rows)), content_type="application/x-ndjson")
+
+
+class ExportURLsView(LoginRequiredMixin, View):
+    """
+    View streaming the authenticated user's URLs as a CSV or NDJSON download.
+
+    Query parameters pick the ``format`` (csv or ndjson), the ``fields`` to
+    include (comma separated), a creation date range (``from`` and ``to``,
+    inclusive, YYYY-MM-DD) and the expiry ``status`` (all, active or
+    expired). Rows are streamed from the database as they are read, see
+    LinkExport.
+    """
+
+    def get(self, request):
+        """
+        Handle GET requests to download the user's URLs.
+
+        Args:
+            request: The HTTP request object.
+
+        Returns:
+            StreamingHttpResponse: The export, as an attachment.
+            HttpResponseBadRequest: If a query parameter is invalid.
+        """
+
+        queryset = ShortenedURL.objects.filter(user=request.user)
+        try:
+            export = LinkExport.from_query(queryset, request.GET)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+
+        # the rows are read after the view returns, outside the request's routing state,
+        # so pick the database now, while a recent write can still pin it to the primary
+        with replica_reads():
+            export.queryset = queryset.using(router.db_for_read(ShortenedURL))
+
+        response = StreamingHttpResponse(streaming_content(request, export), content_type=export.content_type)
+        response["Content-Disposition"] = f'attachment; filename="{export.filename}"'
+        return response
+
+
+class RedirectOriginalURLView(View):
     """
     View for redirecting to the original URL associated with a short key.
 
+    Anyone may follow a shortened URL unless it is marked owner_only, in which
+    case the visitor must be logged in as its owner. PublicRedirectMiddleware
+    serves the public links before the session and auth middleware run, so
+    this view only sees them when that middleware is not installed.
+
     Attributes:
         model: The model representing a shortened URL.
     """
@@ -130,23 +370,76 @@ class RedirectOriginalURLView(LoginRequiredMixin, View):
             short_key: The short key associated with the shortened URL.
 
         Returns:
-            HttpResponseRedirect: Redirects to the original URL upon successful retrieval.
+            HttpResponseRedirect: Redirects to the original URL with the link's status and caching headers.
+            HttpResponseNotModified: If the client's cached redirect is still current.
             HttpResponseNotFound: Returns a 404 response if the shortened URL is not found.
         """
 
-        try:
-            shortened_url = ShortenedURL.objects.get(short_key=short_key)
+        resolved = resolve_short_key(short_key)
+        if resolved is None:
+            return HttpResponseNotFound("Shortened URL not found.")
 
-            if shortened_url.expiration_date and shortened_url.expiration_date < datetime.now():
-                error_message = "Shorted URL has been expired."
-                return redirect("short_url:url_lists")
+        if resolved.owner_only:
+            if not request.user.is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            if request.user.pk != resolved.user_id:
+                return HttpResponseNotFound("Shortened URL not found.")
 
-            shortened_url.increase_click_count()
+        if resolved.is_expired:
+            error_message = "Shorted URL has been expired."
+            return redirect(getattr(settings, "SHORT_URL_EXPIRED_URL", "short_url:url_lists"))
+
+        click_buffer.add(short_key)
+        click_events.record(short_key, request)
+
+        return redirect_response(request, resolved)
+
+
+class AsyncRedirectOriginalURLView(View):
+    """
+    Async variant of RedirectOriginalURLView for ASGI deployments.
+
+    The lookup goes through the async ORM and the click is recorded without
+    leaving the event loop, so a cache hit is served with no thread hop.
+    Only owner_only links, which need the session user, run a check in a thread.
+
+    Attributes:
+        model: The model representing a shortened URL.
+    """
+
+    async def get(self, request, short_key):
+        """
+        Handle GET requests to redirect to the original URL.
+
+        Args:
+            request: The HTTP request object.
+            short_key: The short key associated with the shortened URL.
+
+        Returns:
+            HttpResponseRedirect: Redirects to the original URL with the link's status and caching headers.
+            HttpResponseNotModified: If the client's cached redirect is still current.
+            HttpResponseNotFound: Returns a 404 response if the shortened URL is not found.
+        """
+
+        resolved = await aresolve_short_key(short_key)
+        if resolved is None:
+            return HttpResponseNotFound("Shortened URL not found.")
+
+        if resolved.owner_only:
+            user_id = await sync_to_async(lambda: request.user.pk)()
+            if user_id is None:
+                return redirect_to_login(request.get_full_path())
+            if user_id != resolved.user_id:
+                return HttpResponseNotFound("Shortened URL not found.")
+
+        if resolved.is_expired:
+            return redirect(getattr(settings, "SHORT_URL_EXPIRED_URL", "short_url:url_lists"))
+
+        await click_buffer.aadd(short_key)
+        click_events.record(short_key, request)
+
+        return redirect_response(request, resolved)
 
-            return redirect(shortened_url.original_url)
-        except ShortenedURL.DoesNotExist:
-            return HttpResponseNotFound("Shortened URL not found.")     
-           
 
 class UpdateShortenedURLView(LoginRequiredMixin, View):
     """
@@ -171,7 +464,8 @@ class UpdateShortenedURLView(LoginRequiredMixin, View):
 
         try:
             shortened_url = ShortenedURL.objects.get(short_key=short_key)
-            return render(request, "short_url/update.html", {"shortened_url": shortened_url})
+            context = {"shortened_url": shortened_url, "redirect_types": ShortenedURL.REDIRECT_TYPE_CHOICES}
+            return render(request, "short_url/update.html", context)
         except ShortenedURL.DoesNotExist:
             return HttpResponseNotFound("Shortened URL not found.")
         
@@ -191,6 +485,7 @@ class UpdateShortenedURLView(LoginRequiredMixin, View):
         try:
             shortened_url = ShortenedURL.objects.get(short_key=short_key)
             shortened_url.original_url = request.POST.get("long_url")
+            shortened_url.redirect_type = parse_redirect_type(request.POST.get("redirect_type"), shortened_url.redirect_type)
             shortened_url.save()
             return redirect("short_url:url_lists")
         except ShortenedURL.DoesNotExist:
@@ -3,6 +3,9 @@ ASGI config for url_shorter project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Redirects are served by the native async view under ASGI; set
+SHORT_URL_ASYNC_REDIRECT=0 to fall back to the sync view.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -12,5 +15,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'url_shorter.settings')
+os.environ.setdefault('SHORT_URL_ASYNC_REDIRECT', '1')
 
 application = get_asgi_application()
+
+# build the per-process short key filter in a background thread; querying here would fail under
+# ASGI servers, which import the application inside a running event loop
+from short_url.bloom import key_filter  # noqa: E402
+
+key_filter.warm_in_background()
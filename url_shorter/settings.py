@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -59,9 +61,28 @@ SITE_ID = 1
 
 AUTH_USER_MODEL = "user.User"
 
+# the user of each authenticated request is read from a per-process cache of USER_CACHE_SIZE users,
+# dropped when the user is saved or deleted in this process and after USER_CACHE_TTL seconds elsewhere
+AUTHENTICATION_BACKENDS = ["user.backends.CachedModelBackend"]
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 60
+
+# sessions are read from the "default" cache and only fall back to the database on a miss. The
+# default cache is per process; point CACHES at a shared Redis or Memcached to share hits between
+# workers, or use "django.contrib.sessions.backends.signed_cookies" to keep sessions out of the server
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # request counts, latency and database work per view, exposed at /metrics
+    'utils.metrics.MetricsMiddleware',
+    # keeps a client's reads on the primary database for a while after it writes
+    'utils.routers.ReplicaPinningMiddleware',
+    # rejects clients over their RATE_LIMITS with a 429, before any lookup or session load
+    'utils.ratelimit.RateLimitMiddleware',
+    # serves public short key redirects without sessions, CSRF, auth or messages
+    'short_url.middleware.PublicRedirectMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,6 +122,15 @@ DATABASES = {
     }
 }
 
+# redirect lookups, URL listings and short key existence checks may read from the replica
+# aliases listed in DATABASE_REPLICAS; every other query, and every read following a write,
+# uses "default". Replicas need "TEST": {"MIRROR": "default"} so tests run against one database.
+DATABASE_ROUTERS = ["utils.routers.ReplicaRouter"]
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_POLICY = "utils.routers.RoundRobinPolicy"
+DATABASE_REPLICA_CHECK_INTERVAL = 5.0
+DATABASE_PIN_SECONDS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -158,3 +188,104 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 LOGIN_URL = "user:user_login"
 LOGIN_REDIRECT_URL = 'short_url:url_lists'
+
+
+# "default" holds cached sessions; "template_fragments" holds the rendered rows of the URL list, keyed
+# on (id, updated_at, click_count) so a changed row misses. Both are per process; use Redis or
+# Memcached to share them between workers
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "template_fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "template_fragments",
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+}
+# seconds a rendered list row is kept; rows that changed are re-rendered right away anyway
+SHORT_URL_ROW_CACHE_TTL = 24 * 3600
+
+# short url redirect resolution
+SHORT_URL_RESOLVE_CACHE_SIZE = 10000
+SHORT_URL_RESOLVE_CACHE_TTL = 60
+
+# click counts are buffered in memory and flushed in batches; 0 writes every click through
+SHORT_URL_CLICK_FLUSH_INTERVAL = 5
+SHORT_URL_CLICK_FLUSH_THRESHOLD = 1000
+
+# serve redirects from the async view; url_shorter/asgi.py turns this on
+SHORT_URL_ASYNC_REDIRECT = os.environ.get("SHORT_URL_ASYNC_REDIRECT", "0") == "1"
+
+# generated short keys: sequence values reserved per DB round trip, shortest key, scrambled or sequential
+SHORT_URL_KEY_BLOCK_SIZE = 100
+SHORT_URL_KEY_MIN_LENGTH = 6
+SHORT_URL_KEY_PERMUTE = True
+
+# process-local Bloom filter answering "short key does not exist" without a query
+SHORT_URL_BLOOM_ENABLED = True
+SHORT_URL_BLOOM_ERROR_RATE = 0.01
+SHORT_URL_BLOOM_SYNC_INTERVAL = 1.0
+SHORT_URL_BLOOM_MIN_CAPACITY = 100000
+
+# QR codes are rendered from a persistent job queue: "thread" drains it in-process after each create,
+# "command" leaves it to `manage.py process_qr_jobs`
+SHORT_URL_QR_WORKER = "thread"
+SHORT_URL_QR_MAX_ATTEMPTS = 5
+SHORT_URL_QR_RETRY_DELAY = 30
+SHORT_URL_QR_LEASE = 300
+# "png" or "svg"; images are stored under a hash of their inputs and reused
+SHORT_URL_QR_FORMAT = "png"
+
+# per-click analytics events, buffered in memory and written in batches; events are dropped
+# (and counted) when the buffer is full. Sink "db" inserts ClickEvent rows, "file" appends JSON lines
+SHORT_URL_CLICK_EVENTS_ENABLED = True
+SHORT_URL_CLICK_EVENT_BUFFER_SIZE = 10000
+SHORT_URL_CLICK_EVENT_FLUSH_INTERVAL = 5
+SHORT_URL_CLICK_EVENT_BATCH_SIZE = 500
+SHORT_URL_CLICK_EVENT_SINK = "db"
+SHORT_URL_CLICK_EVENT_LOG = BASE_DIR / "logs" / "clicks.log"
+SHORT_URL_CLICK_EVENT_LOG_MAX_BYTES = 50 * 1024 * 1024
+SHORT_URL_CLICK_EVENT_LOG_BACKUPS = 10
+
+# per-view request metrics served at /metrics in the Prometheus text format. With several worker
+# processes, point METRICS_DIR at a directory they share: each writes its counters there every
+# METRICS_FLUSH_INTERVAL seconds and /metrics sums them; files of exited workers on this host are
+# deleted. /metrics requires "Authorization: Bearer <METRICS_AUTH_TOKEN>"; without a token it is
+# only served with DEBUG on.
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = 10
+METRICS_AUTH_TOKEN = os.environ.get("METRICS_AUTH_TOKEN") or None
+
+# redirect snapshot compiled by `manage.py compile_redirect_snapshot` for the edge server
+SHORT_URL_SNAPSHOT_PATH = BASE_DIR / "var" / "redirects.snapshot"
+
+# how long browsers and proxies may reuse a redirect before revalidating it with its ETag; the
+# temporary one also bounds how long an edited link keeps sending cached visitors to the old target.
+# Neither outlives the link's expiration date. Redirects served from a cache are not counted as clicks.
+SHORT_URL_REDIRECT_MAX_AGE = 300
+SHORT_URL_PERMANENT_REDIRECT_MAX_AGE = 365 * 24 * 3600
+
+# where expired short links send visitors: a URL name or a path
+SHORT_URL_EXPIRED_URL = "short_url:url_lists"
+
+# token bucket rate limits per URL name: "ip" and "user" rates such as "10/m" (s, m, h or d), an
+# optional "burst" (bucket size, defaults to the rate's count) and the "methods" they apply to.
+# LocalBackend keeps buckets per process; utils.ratelimit.CacheBackend shares them through a cache
+# (RATE_LIMIT_BACKEND_OPTIONS = {"alias": ...}) so limits hold across workers. Behind a proxy, set
+# RATE_LIMIT_IP_HEADER to the request.META key it fills with the client address, e.g. "HTTP_X_REAL_IP"
+# or "HTTP_X_FORWARDED_FOR", and RATE_LIMIT_TRUSTED_PROXIES to the number of proxies appending to it:
+# the client is the entry that many places from the right, since the entries left of it are client-sent.
+# Click events record the client address read the same way.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_BACKEND = "utils.ratelimit.LocalBackend"
+RATE_LIMIT_BACKEND_OPTIONS = {}
+RATE_LIMIT_IP_HEADER = None
+RATE_LIMIT_TRUSTED_PROXIES = 1
+RATE_LIMITS = {
+    "short_url:url_create": {"methods": ["POST"], "user": "30/m", "ip": "60/m", "burst": 10},
+    "short_url:bulk_create": {"methods": ["POST"], "user": "20/h", "ip": "60/h", "burst": 5},
+    "short_url:redirect_original_url": {"ip": "20/s", "burst": 100},
+    "user:user_login": {"methods": ["POST"], "ip": "10/m"},
+    "user:user_register": {"methods": ["POST"], "ip": "10/h"},
+}
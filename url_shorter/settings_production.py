@@ -0,0 +1,78 @@
+"""
+Production settings for url_shorter.
+
+Select them with DJANGO_SETTINGS_MODULE=url_shorter.settings_production.
+They extend url_shorter.settings with a tuned SQLite profile:
+
+- WAL journal, so redirect reads no longer wait behind writers
+- synchronous=NORMAL, which is durable across application crashes in WAL mode
+- a larger page cache, memory-mapped reads and a busy timeout instead of
+  immediate "database is locked" errors
+- persistent connections, so requests stop paying for a reconnect
+- optional read-only replicas for redirect lookups and listings
+- templates compiled once per process by the cached template loader
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, TEMPLATES
+
+
+DEBUG = False
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+
+ALLOWED_HOSTS = [host for host in os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",") if host]
+
+# Django already caches compiled templates when "loaders" is unset; spell it out so the profile
+# keeps it if the loaders are ever customised. APP_DIRS must be off when "loaders" is given.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            **TEMPLATES[0]["OPTIONS"],
+            "loaders": [
+                ("django.template.loaders.cached.Loader", [
+                    "django.template.loaders.filesystem.Loader",
+                    "django.template.loaders.app_directories.Loader",
+                ]),
+            ],
+        },
+    }
+]
+
+DATABASES = {
+    "default": {
+        **DATABASES["default"],
+        "NAME": os.environ.get("DJANGO_DB_PATH", BASE_DIR / "db.sqlite3"),
+        # keep connections open between requests, checking them before reuse
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# read-only SQLite replicas, comma separated file paths kept up to date with
+# `manage.py sync_sqlite_replicas`
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get("DJANGO_REPLICA_DB_PATHS", "").split(",")), start=1):
+    alias = f"replica{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": f"file:{path}?mode=ro",
+        "OPTIONS": {"uri": True},
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# applied to every new SQLite connection by utils.db.apply_sqlite_pragmas
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    # negative values are KiB: 64 MiB of page cache per connection
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
@@ -0,0 +1,51 @@
+"""
+Settings for redirect-only workers.
+
+Select them with DJANGO_SETTINGS_MODULE=url_shorter.settings_redirect on the
+workers that only serve /<short_key>/, with a proxy routing every other path
+to workers running url_shorter.settings_production. They extend the
+production settings and load only what resolving a short key needs:
+
+- no admin, messages, static files or crispy forms
+- no templates
+- a URLconf with just the redirect view and /metrics
+
+Sessions and auth stay installed so owner-only links can still check their
+owner. Logins and expired links are sent to the main workers by path.
+"""
+
+from .settings_production import *  # noqa: F401,F403
+
+
+INSTALLED_APPS = [
+    'django.contrib.sites',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+
+    'user.apps.UserConfig',
+    'short_url.apps.ShortUrlConfig',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'utils.metrics.MetricsMiddleware',
+    'utils.routers.ReplicaPinningMiddleware',
+    'utils.ratelimit.RateLimitMiddleware',
+    'short_url.middleware.PublicRedirectMiddleware',
+    # only owner-only links get past PublicRedirectMiddleware, and they need the session user
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+]
+
+ROOT_URLCONF = 'url_shorter.urls_redirect'
+
+TEMPLATES = []
+
+# the URL names of the main app are not loaded here, so point at its paths
+LOGIN_URL = "/"
+SHORT_URL_EXPIRED_URL = "/list"
+
+# redirect workers never create links, so never render QR codes
+SHORT_URL_QR_WORKER = "command"
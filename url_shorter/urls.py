@@ -3,8 +3,11 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from utils.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("",  include("user.urls", namespace='user')),
     path("",  include("short_url.urls", namespace='short_url')),
 ]
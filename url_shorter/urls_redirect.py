@@ -0,0 +1,17 @@
+"""
+URLconf of the redirect-only workers, see url_shorter/settings_redirect.py.
+"""
+
+from django.urls import include, path
+
+from short_url.urls import redirect_view
+from utils.metrics import metrics_view
+
+redirect_patterns = [
+    path('<str:short_key>/', redirect_view.as_view(), name='redirect_original_url'),
+]
+
+urlpatterns = [
+    path("metrics", metrics_view, name="metrics"),
+    path("", include((redirect_patterns, "short_url"), namespace="short_url")),
+]
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'url_shorter.settings')
 
 application = get_wsgi_application()
+
+# build the per-process short key filter in a background thread, so a worker starts serving at
+# once instead of waiting for a scan of the whole table; early lookups wait for the scan
+from short_url.bloom import key_filter  # noqa: E402
+
+key_filter.warm_in_background()
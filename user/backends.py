@@ -0,0 +1,133 @@
+import copy
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class UserCache:
+    """
+    Bounded in-process LRU cache of user id -> User.
+
+    Entries live for at most ``ttl`` seconds. Saving or deleting a user
+    drops its entry in the saving process (see user.signals); other workers
+    keep theirs until it times out, so ``ttl`` bounds how long a change made
+    elsewhere, such as a deactivation or a new password, takes to apply.
+    Callers get a copy of the cached instance, never the shared one.
+
+    Attributes:
+        max_size (int): Maximum number of users kept before evicting the least recently used.
+        ttl (int): Maximum lifetime of an entry in seconds.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that had to go to the database.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        Return a copy of the cached user.
+
+        Args:
+            user_id: The primary key of the user.
+
+        Returns:
+            User: The cached user, or None on a miss.
+        """
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                user, deadline = entry
+                if deadline > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return copy.copy(user)
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def set(self, user):
+        """
+        Store a copy of a user, evicting the least recently used entry if full.
+
+        Args:
+            user (User): The user loaded from the database.
+        """
+
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[user.pk] = (copy.copy(user), time.time() + self.ttl)
+            self._entries.move_to_end(user.pk)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """
+        Drop the entry for a user, if any.
+
+        Args:
+            user_id: The primary key of the user.
+        """
+
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+user_cache = UserCache(
+    max_size=getattr(settings, "USER_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "USER_CACHE_TTL", 60),
+)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend loading the user of each authenticated request through user_cache.
+
+    AuthenticationMiddleware calls get_user() on every request with a
+    session, so with a cached session the common case makes no query at all.
+    Logging in still checks the password against the database.
+    """
+
+    def get_user(self, user_id):
+        """
+        Return the active user with the given id, from the cache when possible.
+
+        Args:
+            user_id: The primary key stored in the session, already converted by django.contrib.auth.
+
+        Returns:
+            User: The user, or None if it does not exist or may not log in.
+        """
+
+        UserModel = get_user_model()
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            user_cache.set(user)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,33 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Drop the cached user whenever it is saved or deleted.
+
+    The entry is dropped again once the transaction commits, in case a
+    concurrent request cached the old row in between.
+    """
+
+    # deleting clears instance.pk, so keep the id for the commit hook
+    user_id = instance.pk
+    user_cache.invalidate(user_id)
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+@receiver(user_logged_in)
+def cache_logged_in_user(sender, request, user, **kwargs):
+    """
+    Cache the user just authenticated, so the next request does not load it again.
+    """
+
+    if isinstance(user, User):
+        user_cache.set(user)
@@ -1,3 +1,88 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .backends import CachedModelBackend, UserCache, user_cache
+from .models import User
+
+
+class UserCacheTests(TestCase):
+    """
+    The bounded LRU cache behind CachedModelBackend.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("Cached", "cached@example.com", "pw-Cached-123")
+
+    def test_returns_copies(self):
+        cache = UserCache()
+        cache.set(self.user)
+
+        cached = cache.get(self.user.pk)
+        cached.full_name = "Changed"
+        self.assertEqual(cache.get(self.user.pk).full_name, "Cached")
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+
+    def test_entries_expire_after_ttl(self):
+        cache = UserCache(ttl=0)
+        cache.set(self.user)
+
+        self.assertIsNone(cache.get(self.user.pk))
+        self.assertEqual(cache.misses, 1)
+
+    def test_evicts_the_least_recently_used(self):
+        other = User.objects.create_user("Other", "other@example.com", "pw-Other-123")
+        third = User.objects.create_user("Third", "third@example.com", "pw-Third-123")
+        cache = UserCache(max_size=2)
+        cache.set(self.user)
+        cache.set(other)
+        cache.get(self.user.pk)
+        cache.set(third)
+
+        self.assertIsNotNone(cache.get(self.user.pk))
+        self.assertIsNone(cache.get(other.pk))
+        self.assertIsNotNone(cache.get(third.pk))
+
+
+class CachedModelBackendTests(TestCase):
+    """
+    Loading the session user through user_cache.
+    """
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user("Cached", "cached@example.com", "pw-Cached-123")
+        self.user.is_active = True
+        self.user.save()
+        self.backend = CachedModelBackend()
+
+    def tearDown(self):
+        user_cache.clear()
+
+    def test_cache_hit_makes_no_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        self.backend.get_user(self.user.pk)
+        self.user.full_name = "Renamed"
+        self.user.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.user.pk).full_name, "Renamed")
+
+    def test_inactive_user_is_rejected(self):
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_missing_user_is_rejected(self):
+        self.assertIsNone(self.backend.get_user(self.user.pk + 1))
+
+    def test_login_caches_the_user(self):
+        self.client.force_login(self.user)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
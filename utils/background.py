@@ -0,0 +1,77 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    """
+    Runs a flush callable on a daemon thread every ``interval`` seconds.
+
+    The thread is started lazily on first use (and restarted after a fork),
+    can be woken early with ``wake()``, and runs the callable one last time
+    when the interpreter exits so buffered work is not lost on shutdown.
+
+    Attributes:
+        func (callable): The flush callable, invoked with no arguments.
+        interval (float): Seconds between two scheduled flushes.
+        name (str): Name given to the background thread.
+    """
+
+    def __init__(self, func, interval, name):
+        self.func = func
+        self.interval = interval
+        self.name = name
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+    def start(self):
+        """
+        Start the background thread if it is not already running in this process.
+        """
+
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.run_once)
+                self._atexit_registered = True
+
+    def wake(self):
+        """
+        Ask the background thread to flush now instead of waiting for the interval.
+        """
+
+        self._wakeup.set()
+
+    def run_once(self):
+        """
+        Run the flush callable, logging instead of raising on failure.
+        """
+
+        try:
+            self.func()
+        except Exception:
+            logger.exception("%s flush failed", self.name)
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.run_once()
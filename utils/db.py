@@ -0,0 +1,39 @@
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Run the SQLITE_PRAGMAS setting on every new SQLite connection.
+
+    Connected to ``connection_created`` in ShortUrlConfig.ready(). Journal mode
+    is stored in the database file, the other pragmas only last as long as
+    the connection, so they are applied each time one is opened.
+
+    Args:
+        sender: The database backend class.
+        connection: The new database connection wrapper.
+    """
+
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", None) or {}
+    if connection.alias in getattr(settings, "DATABASE_REPLICAS", []):
+        # replicas are read-only copies; their journal mode is set when they are synced
+        pragmas = {name: value for name, value in pragmas.items() if name != "journal_mode"}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def database_path(name):
+    """
+    Returns the file path of an SQLite database NAME, which may be a file: URI.
+
+    Args:
+        name: The NAME of the database settings.
+
+    Returns:
+        str: The file path.
+    """
+
+    return str(name).removeprefix("file:").split("?", 1)[0]
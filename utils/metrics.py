@@ -0,0 +1,429 @@
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .background import PeriodicFlusher
+
+
+logger = logging.getLogger(__name__)
+
+# upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+KNOWN_METHODS = frozenset(["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# [query count, query seconds] of the request being served, shared with the threads it runs queries on
+_current_request = ContextVar("metrics_current_request", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding each query and its duration to the current request.
+    """
+
+    counter = _current_request.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter[0] += 1
+        counter[1] += perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Install count_query on every new database connection.
+    """
+
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def escape(value):
+    """
+    Escape a Prometheus label value.
+
+    Args:
+        value (str): The label value.
+
+    Returns:
+        str: The escaped value.
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def sample(name, **labels):
+    """
+    Returns the Prometheus sample name with its labels, e.g. ``name{view="x"}``.
+    """
+
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class RequestMetrics:
+    """
+    Request counters and latency histograms, aggregated without a shared lock.
+
+    Every thread records into its own shard, which only that thread ever
+    writes, so observing a request is a handful of dict and list updates.
+    A snapshot sums the shards. Snapshots are plain dicts of Prometheus
+    families and can be summed across worker processes: with METRICS_DIR set,
+    each process writes its snapshot to that directory every
+    METRICS_FLUSH_INTERVAL seconds and the metrics endpoint merges the files.
+    Files are named after the host and pid of their process; collecting
+    deletes the files of processes on this host that are no longer running,
+    so a dead worker's counters drop out of the sum (a counter reset, which
+    Prometheus' rate() and increase() account for).
+
+    Attributes:
+        directory (str): Directory shared by the worker processes, or None.
+        collectors (list): Callables returning extra (name, type, help, value) samples.
+    """
+
+    def __init__(self, directory=None, flush_interval=10):
+        self.directory = directory
+        self.collectors = []
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_pid = None
+        self._flusher = PeriodicFlusher(self.write_snapshot, flush_interval, "metrics-writer")
+
+    def shard(self):
+        """
+        Returns the calling thread's shard, creating it on first use.
+
+        Returns:
+            dict: requests, latency and db counters of this thread.
+        """
+
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {"requests": {}, "latency": {}, "db": {}}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, view, method, status, seconds, queries, query_seconds):
+        """
+        Record one served request.
+
+        Args:
+            view (str): The URL name of the view.
+            method (str): The HTTP method.
+            status (int): The response status code.
+            seconds (float): Time spent producing the response.
+            queries (int): Number of database queries run.
+            query_seconds (float): Time spent in those queries.
+        """
+
+        shard = self.shard()
+        requests = shard["requests"]
+        key = (view, method if method in KNOWN_METHODS else "other", status)
+        requests[key] = requests.get(key, 0) + 1
+
+        latency = shard["latency"].get(view)
+        if latency is None:
+            # one count per bucket, then +Inf, then the sum
+            latency = shard["latency"][view] = [0] * (len(LATENCY_BUCKETS) + 2)
+        latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        latency[-1] += seconds
+
+        db = shard["db"].get(view)
+        if db is None:
+            db = shard["db"][view] = [0, 0.0]
+        db[0] += queries
+        db[1] += query_seconds
+
+        if self.directory:
+            self._flusher.start()
+
+    def register_collector(self, collector):
+        """
+        Add a callable returning extra samples to every snapshot.
+
+        Samples are summed across worker processes. A value that must not be,
+        such as a ratio, is returned under a sample name labelled per worker,
+        built with sample(); it is added to the family named before the labels.
+
+        Args:
+            collector (callable): Returns an iterable of (name, type, help, value).
+        """
+
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        """
+        Sum the shards of this process into Prometheus families.
+
+        Returns:
+            dict: Family name -> {"type", "help", "samples": {sample name: value}}.
+        """
+
+        requests, latency, db = {}, {}, {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, count in shard["requests"].copy().items():
+                requests[key] = requests.get(key, 0) + count
+            for view, counts in shard["latency"].copy().items():
+                total = latency.setdefault(view, [0] * len(counts))
+                for index, value in enumerate(list(counts)):
+                    total[index] += value
+            for view, (queries, seconds) in shard["db"].copy().items():
+                total = db.setdefault(view, [0, 0.0])
+                total[0] += queries
+                total[1] += seconds
+
+        families = {
+            "http_requests_total": self.family("counter", "Requests served, by view, method and status.", {
+                sample("http_requests_total", view=view, method=method, status=status): count
+                for (view, method, status), count in requests.items()
+            }),
+            "http_request_duration_seconds": self.family("histogram", "Time spent producing the response.", {}),
+            "db_queries_total": self.family("counter", "Database queries run while serving requests.", {
+                sample("db_queries_total", view=view): queries for view, (queries, _) in db.items()
+            }),
+            "db_query_duration_seconds_total": self.family("counter", "Time spent in database queries.", {
+                sample("db_query_duration_seconds_total", view=view): seconds for view, (_, seconds) in db.items()
+            }),
+        }
+
+        histogram = families["http_request_duration_seconds"]["samples"]
+        for view, counts in latency.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                histogram[sample("http_request_duration_seconds_bucket", view=view, le=bound)] = cumulative
+            histogram[sample("http_request_duration_seconds_sum", view=view)] = counts[-1]
+            histogram[sample("http_request_duration_seconds_count", view=view)] = cumulative
+
+        for collector in self.collectors:
+            try:
+                for name, kind, help_text, value in collector():
+                    family_name = name.split("{", 1)[0]
+                    families.setdefault(family_name, self.family(kind, help_text, {}))["samples"][name] = value
+            except Exception:
+                logger.exception("Metrics collector %r failed", collector)
+        return families
+
+    def family(self, kind, help_text, samples):
+        return {"type": kind, "help": help_text, "samples": samples}
+
+    def write_snapshot(self):
+        """
+        Write this process's snapshot to the shared directory, atomically.
+        """
+
+        if not self.directory:
+            return
+        if self._file_pid != os.getpid():
+            # a unique name per process, so a reused pid never overwrites the counters of a dead worker
+            self._file_pid = os.getpid()
+            name = f"{socket.gethostname()}-{self._file_pid}-{uuid.uuid4().hex[:8]}.json"
+            self._file = os.path.join(self.directory, name)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{self._file}.tmp"
+        with open(temporary, "w", encoding="utf-8") as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(temporary, self._file)
+
+    def collect(self):
+        """
+        Returns the families of every worker process, summed.
+
+        Returns:
+            dict: The merged families; this process is read live, the others from their files.
+        """
+
+        merged = self.snapshot()
+        if not self.directory or not os.path.isdir(self.directory):
+            return merged
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json") or entry.path == self._file:
+                continue
+            if is_dead_worker_file(entry.name):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as snapshot_file:
+                    families = json.load(snapshot_file)
+            except (OSError, ValueError):
+                continue
+            merge(merged, families)
+        return merged
+
+
+def is_dead_worker_file(name):
+    """
+    Tell whether a snapshot file was written by a process of this host that has exited.
+
+    Files of other hosts sharing the directory are never considered dead,
+    since their pids cannot be checked from here. Files named before the
+    host was recorded ("<pid>-<suffix>.json") are taken to be from this host.
+
+    Args:
+        name (str): The file name, "<host>-<pid>-<suffix>.json".
+
+    Returns:
+        bool: True if the file can be deleted.
+    """
+
+    parts = name[:-len(".json")].rsplit("-", 2)
+    if len(parts) == 2:
+        parts.insert(0, socket.gethostname())
+    if len(parts) != 3 or parts[0] != socket.gethostname() or not parts[1].isdigit():
+        return False
+    pid = parts[1]
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # e.g. PermissionError: the pid exists but belongs to another user
+        return False
+    return False
+
+
+def merge(target, families):
+    """
+    Add the samples of a snapshot to another snapshot.
+
+    Args:
+        target (dict): The families to add to.
+        families (dict): The families to add.
+    """
+
+    for name, family in families.items():
+        existing = target.setdefault(name, {"type": family["type"], "help": family["help"], "samples": {}})
+        samples = existing["samples"]
+        for key, value in family["samples"].items():
+            samples[key] = samples.get(key, 0) + value
+
+
+def render(families):
+    """
+    Render families in the Prometheus text exposition format.
+
+    Args:
+        families (dict): The families returned by collect().
+
+    Returns:
+        str: The exposition text.
+    """
+
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for key, value in family["samples"].items():
+            lines.append(f"{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics(
+    directory=getattr(settings, "METRICS_DIR", None),
+    flush_interval=getattr(settings, "METRICS_FLUSH_INTERVAL", 10),
+)
+
+
+class MetricsMiddleware:
+    """
+    Record the count, latency, status and database work of every request.
+
+    Placed first in MIDDLEWARE, so it also times requests that
+    PublicRedirectMiddleware answers early. Queries are counted by a
+    database execute wrapper that reads the current request from a context
+    variable, so queries that an async view runs in worker threads are
+    counted as well. Requests are labelled with their URL name.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(instrument_connection, dispatch_uid="utils.metrics.instrument_connection")
+        for connection in connections.all(initialized_only=True):
+            if connection.connection is not None:
+                instrument_connection(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        counter = [0, 0.0]
+        token = _current_request.set(counter)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.record(request, response, perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = [0, 0.0]
+        token = _current_request.set(counter)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.record(request, response, perf_counter() - started, counter)
+        return response
+
+    def record(self, request, response, seconds, counter):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else "<unresolved>"
+        request_metrics.observe(view, request.method, response.status_code, seconds, counter[0], counter[1])
+
+
+def metrics_view(request):
+    """
+    Expose the request metrics in the Prometheus text format.
+
+    The request must send METRICS_AUTH_TOKEN as a bearer token. Without a
+    token configured the endpoint is only open with DEBUG on.
+
+    Args:
+        request: The HTTP request object.
+
+    Returns:
+        HttpResponse: The exposition text, or 403 without a valid token.
+    """
+
+    token = getattr(settings, "METRICS_AUTH_TOKEN", None)
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden("Set METRICS_AUTH_TOKEN to enable /metrics.")
+    return HttpResponse(render(request_metrics.collect()), content_type=CONTENT_TYPE)
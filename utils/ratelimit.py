@@ -0,0 +1,322 @@
+import math
+import threading
+import time
+
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.module_loading import import_string
+
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def client_ip(request, ip_header=None, trusted_proxies=1):
+    """
+    Returns the address of the client, as seen by the outermost trusted proxy.
+
+    Each proxy appends the address it received the request from to
+    ip_header, so only the last ``trusted_proxies`` entries can be
+    trusted; anything to their left was sent by the client and may be
+    forged.
+
+    Args:
+        request: The HTTP request object.
+        ip_header (str): request.META key holding the client address, or None for REMOTE_ADDR.
+        trusted_proxies (int): Number of proxies in front of the app that append to ip_header.
+
+    Returns:
+        str: The client address, or "" if unknown.
+    """
+
+    if ip_header:
+        forwarded = [entry.strip() for entry in request.META.get(ip_header, "").split(",") if entry.strip()]
+        if forwarded:
+            return forwarded[-min(max(1, trusted_proxies), len(forwarded))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class Limit:
+    """
+    A token bucket: ``count`` requests per ``period`` seconds, with room for ``burst`` at once.
+
+    Buckets are tracked with the generic cell rate algorithm, which behaves
+    exactly like a token bucket refilled one token every ``interval``
+    seconds but stores a single timestamp per bucket: the time at which it
+    will be full again.
+
+    Attributes:
+        count (int): Requests allowed per period.
+        period (int): Length of the period in seconds.
+        burst (int): Bucket capacity, the number of requests allowed back to back.
+        interval (float): Seconds needed to refill one token.
+    """
+
+    def __init__(self, count, period, burst=None):
+        self.count = count
+        self.period = period
+        self.burst = burst or count
+        self.interval = period / count
+
+    @classmethod
+    def parse(cls, rate, burst=None):
+        """
+        Build a limit from a rate such as "10/m" (per second, minute, hour or day).
+
+        Raises:
+            ValueError: If the rate is malformed.
+        """
+
+        count, _, unit = rate.partition("/")
+        if unit not in PERIODS or not count.isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid rate {rate!r}, expected e.g. '10/m'.")
+        return cls(int(count), PERIODS[unit], burst)
+
+
+class LocalBackend:
+    """
+    Token buckets kept in process memory.
+
+    Checking a bucket is one dictionary lookup and update under a lock.
+    Each worker process has its own buckets, so the effective limit is
+    multiplied by the number of workers. At most ``max_keys`` buckets are
+    kept; the least recently used ones are forgotten, which only ever lets
+    their clients through.
+
+    Attributes:
+        max_keys (int): Maximum number of buckets held.
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, limit):
+        """
+        Take a token from a bucket.
+
+        Args:
+            key (str): The bucket key.
+            limit (Limit): The bucket's rate and capacity.
+
+        Returns:
+            float: 0 if the request is allowed, else the seconds until a token is available.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            full_at = max(self._buckets.get(key, now), now) + limit.interval
+            excess = full_at - now - limit.burst * limit.interval
+            if excess > 0:
+                return excess
+            self._buckets[key] = full_at
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0
+
+
+class CacheBackend:
+    """
+    Token buckets kept in a Django cache shared by all workers.
+
+    Each check is one atomic ``incr`` of the bucket's full-at time, in
+    milliseconds, plus a ``decr`` when the request is rejected. Only an idle
+    bucket is reset with a plain ``set``, so concurrent first requests may
+    let a few extra requests through, never fewer.
+
+    Attributes:
+        cache: The cache holding the buckets.
+        prefix (str): Prefix of the bucket keys.
+    """
+
+    blocking = True
+
+    def __init__(self, alias="default", prefix="ratelimit"):
+        self.cache = caches[alias]
+        self.prefix = prefix
+
+    def take(self, key, limit):
+        now = int(time.time() * 1000)
+        step = max(1, int(limit.interval * 1000))
+        key = f"{self.prefix}:{key}"
+        # a bucket left alone this long is full again
+        timeout = math.ceil(limit.burst * limit.interval) + 1
+
+        try:
+            full_at = self.cache.incr(key, step)
+        except ValueError:
+            if self.cache.add(key, now + step, timeout):
+                return 0.0
+            full_at = self.cache.incr(key, step)
+        if full_at - step < now:
+            full_at = now + step
+            self.cache.set(key, full_at, timeout)
+
+        excess = full_at - now - limit.burst * step
+        if excess > 0:
+            self.cache.decr(key, step)
+            return excess / 1000
+        return 0.0
+
+
+class RateLimiter:
+    """
+    Apply the RATE_LIMITS token buckets to requests.
+
+    RATE_LIMITS maps URL names to a rule: the ``methods`` it applies to (all
+    by default), a rate per ``ip`` and/or per ``user`` (e.g. "10/m") and an
+    optional ``burst``. Each scope has its own bucket per client and URL
+    name, and a request must get a token from all of them.
+
+    Attributes:
+        backend: Where the buckets are kept, LocalBackend or CacheBackend.
+        rules (dict): URL name -> (methods or None, {scope: Limit}).
+        ip_header (str): request.META key holding the client address, or None for REMOTE_ADDR.
+        trusted_proxies (int): Number of proxies in front of the app that append to ip_header.
+    """
+
+    scopes = ("ip", "user")
+
+    def __init__(self, backend, limits, ip_header=None, trusted_proxies=1):
+        self.backend = backend
+        self.ip_header = ip_header
+        self.trusted_proxies = max(1, trusted_proxies)
+        self.rules = {}
+        for view_name, rule in limits.items():
+            methods = rule.get("methods")
+            bucket_limits = {scope: Limit.parse(rule[scope], rule.get("burst")) for scope in self.scopes if rule.get(scope)}
+            self.rules[view_name] = (frozenset(methods) if methods else None, bucket_limits)
+
+    @classmethod
+    def from_settings(cls):
+        backend_path = getattr(settings, "RATE_LIMIT_BACKEND", "utils.ratelimit.LocalBackend")
+        options = getattr(settings, "RATE_LIMIT_BACKEND_OPTIONS", {})
+        return cls(
+            import_string(backend_path)(**options),
+            getattr(settings, "RATE_LIMITS", {}),
+            getattr(settings, "RATE_LIMIT_IP_HEADER", None),
+            getattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 1),
+        )
+
+    def client_ip(self, request):
+        """
+        Returns the address of the client, as seen by the outermost trusted proxy.
+
+        Forged entries left of the trusted ones would otherwise get a fresh
+        bucket on every request; see client_ip().
+        """
+
+        return client_ip(request, self.ip_header, self.trusted_proxies)
+
+    def limit_for(self, request, view_name, scope):
+        """
+        Returns the Limit applying to a request for a scope, or None.
+        """
+
+        rule = self.rules.get(view_name)
+        if rule is None:
+            return None
+        methods, limits = rule
+        if methods is not None and request.method not in methods:
+            return None
+        return limits.get(scope)
+
+    def check(self, request, view_name, scope, client):
+        """
+        Take a token from the bucket of a client for a view.
+
+        Args:
+            request: The HTTP request object.
+            view_name (str): The URL name of the requested view.
+            scope (str): "ip" or "user".
+            client (str): The client address or user id.
+
+        Returns:
+            HttpResponse: A 429 response if the bucket is empty, else None.
+        """
+
+        limit = self.limit_for(request, view_name, scope)
+        if limit is None or client is None:
+            return None
+
+        retry_after = self.backend.take(f"{view_name}:{scope}:{client}", limit)
+        if not retry_after:
+            return None
+        response = HttpResponse("Too many requests, try again later.", status=429, content_type="text/plain")
+        response["Retry-After"] = str(math.ceil(retry_after))
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Reject requests over their RATE_LIMITS buckets with a 429 and a Retry-After header.
+
+    Placed before PublicRedirectMiddleware and SessionMiddleware, so per-IP
+    buckets are checked before a short key lookup or a session load. Per-user
+    buckets are checked in process_view, once the session is available but
+    before the view runs; the user id is read from the session, without
+    loading the user. Requests to URLs without a rule are only resolved.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "RATE_LIMIT_ENABLED", True)
+        self.limiter = RateLimiter.from_settings()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        view_name = self.view_name(request)
+        if view_name is not None:
+            rejected = self.limiter.check(request, view_name, "ip", self.limiter.client_ip(request))
+            if rejected is not None:
+                return rejected
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        view_name = self.view_name(request)
+        if view_name is not None:
+            client = self.limiter.client_ip(request)
+            if self.limiter.backend.blocking:
+                rejected = await sync_to_async(self.limiter.check)(request, view_name, "ip", client)
+            else:
+                rejected = self.limiter.check(request, view_name, "ip", client)
+            if rejected is not None:
+                return rejected
+        return await self.get_response(request)
+
+    def view_name(self, request):
+        """
+        Returns the URL name of the request if a rate limit rule covers it, else None.
+        """
+
+        if not self.enabled or not self.limiter.rules:
+            return None
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        return view_name if view_name in self.limiter.rules else None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.enabled or not hasattr(request, "session"):
+            return None
+        view_name = request.resolver_match.view_name
+        if self.limiter.limit_for(request, view_name, "user") is None:
+            return None
+        return self.limiter.check(request, view_name, "user", request.session.get(SESSION_KEY))
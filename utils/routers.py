@@ -0,0 +1,246 @@
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.module_loading import import_string
+
+from .db import database_path
+
+
+logger = logging.getLogger(__name__)
+
+# cookie telling the router that this client wrote recently and must read from the primary
+PIN_COOKIE = "db_pin"
+
+# routing state of the current request: "replica" when reads may use a replica, "pinned" when they
+# must use the primary, "wrote" once the request has written
+_routing = ContextVar("db_routing", default=None)
+
+
+def replica_aliases():
+    """
+    Returns the database aliases configured as read replicas.
+
+    Returns:
+        list: The DATABASE_REPLICAS aliases.
+    """
+
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+@contextmanager
+def replica_reads():
+    """
+    Allow the reads made inside the block to be served by a replica.
+
+    Reads stay on the primary unless they run in this block, and even then
+    they stay on the primary once the request has written, or when the client
+    carries the pin cookie of a recent write.
+    """
+
+    state = _routing.get()
+    token = None
+    if state is None:
+        token = _routing.set(state := {"replica": False, "pinned": False, "wrote": False})
+    previous = state["replica"]
+    state["replica"] = True
+    try:
+        yield
+    finally:
+        state["replica"] = previous
+        if token is not None:
+            _routing.reset(token)
+
+
+class RoundRobinPolicy:
+    """
+    Replica selection policy cycling through the healthy replicas.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, aliases):
+        """
+        Pick the replica serving the next read.
+
+        Args:
+            aliases (list): The healthy replica aliases, never empty.
+
+        Returns:
+            str: The chosen alias.
+        """
+
+        return aliases[next(self._counter) % len(aliases)]
+
+
+class RandomPolicy:
+    """
+    Replica selection policy picking a healthy replica at random.
+    """
+
+    def choose(self, aliases):
+        return random.choice(aliases)
+
+
+class ReplicaHealth:
+    """
+    Track which replicas can be connected to.
+
+    A replica is probed at most once every ``check_interval`` seconds per
+    process; a failed probe keeps it out of rotation until the next probe.
+    SQLite replicas are also considered down while their file is missing,
+    since connecting would silently create an empty database.
+
+    Attributes:
+        check_interval (float): Seconds between two probes of a replica.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        """
+        Returns whether a replica is in rotation, probing it when its status is stale.
+
+        Args:
+            alias (str): The replica alias.
+
+        Returns:
+            bool: True if reads may be sent to the replica.
+        """
+
+        now = time.monotonic()
+        healthy, checked_at = self._status.get(alias, (True, None))
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return healthy
+
+        healthy = self.probe(alias)
+        with self._lock:
+            self._status[alias] = (healthy, now)
+        if not healthy:
+            logger.warning("Database replica %s is unavailable, reading from the primary", alias)
+        return healthy
+
+    def probe(self, alias):
+        """
+        Check that a replica accepts connections.
+
+        Args:
+            alias (str): The replica alias.
+
+        Returns:
+            bool: True if the replica is reachable.
+        """
+
+        connection = connections[alias]
+        if connection.vendor == "sqlite":
+            path = database_path(connection.settings_dict["NAME"])
+            if not connection.is_in_memory_db() and not os.path.exists(path):
+                return False
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            return False
+        return True
+
+
+class ReplicaRouter:
+    """
+    Database router sending opted-in reads to read replicas.
+
+    Writes always go to the primary. Reads go to a replica only inside
+    replica_reads() and only while the request has not written and is not
+    pinned by ReplicaPinningMiddleware, so a read that follows a write sees
+    it. Replicas are chosen by DATABASE_REPLICA_POLICY among the healthy
+    ones; with none healthy, or none configured, reads use the primary.
+    """
+
+    def __init__(self):
+        self.policy = import_string(getattr(settings, "DATABASE_REPLICA_POLICY", "utils.routers.RoundRobinPolicy"))()
+        self.health = ReplicaHealth(getattr(settings, "DATABASE_REPLICA_CHECK_INTERVAL", 5.0))
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state["replica"] or state["pinned"]:
+            return None
+        healthy = [alias for alias in replica_aliases() if self.health.is_healthy(alias)]
+        if not healthy:
+            return None
+        return self.policy.choose(healthy)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state["pinned"] = True
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keep a client's reads on the primary for a while after it writes.
+
+    A request that writes sets a short-lived cookie; requests carrying it are
+    pinned to the primary, so a create followed by a redirect to the list
+    shows the new link even when the replicas lag behind. The pin lasts
+    DATABASE_PIN_SECONDS.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "DATABASE_PIN_SECONDS", 15)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = {"replica": False, "pinned": PIN_COOKIE in request.COOKIES, "wrote": False}
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        state = {"replica": False, "pinned": PIN_COOKIE in request.COOKIES, "wrote": False}
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(response, state)
+
+    def pin(self, response, state):
+        if state["wrote"] and replica_aliases():
+            response.set_cookie(PIN_COOKIE, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax")
+        return response
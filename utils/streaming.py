@@ -0,0 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+_EXHAUSTED = object()
+
+
+async def aiterate(iterator):
+    """
+    Async iterator over a sync iterator, advancing it one item at a time in a worker thread.
+
+    Each step runs in Django's thread-sensitive executor, the thread sync
+    views run in, so an iterator reading or writing through the ORM keeps
+    using the same connection from start to end.
+
+    Args:
+        iterator: A sync iterable.
+
+    Yields:
+        The items of the iterable.
+    """
+
+    iterator = iter(iterator)
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await step(iterator, _EXHAUSTED)
+        if item is _EXHAUSTED:
+            return
+        yield item
+
+
+def streaming_content(request, iterator):
+    """
+    Returns the content to give StreamingHttpResponse for a request.
+
+    Under ASGI, Django 4.2 reads a sync iterator to the end before sending
+    anything, so the whole response would be held in memory. There the
+    iterator is wrapped with aiterate() so each chunk is sent as it is
+    produced. Under WSGI it is returned as is.
+
+    Args:
+        request: The HTTP request object.
+        iterator: A sync iterable of bytes or str chunks.
+
+    Returns:
+        The iterator, or an async iterator under ASGI.
+    """
+
+    if isinstance(request, ASGIRequest):
+        return aiterate(iterator)
+    return iterator